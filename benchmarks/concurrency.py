@@ -0,0 +1,136 @@
+"""Measures the throughput of the matching API under parallel clients.
+
+Seeds a temporary SQLite database with synthetic notices and profiles, then issues uncached
+`GET /profiles/{id}/matches` requests from an increasing number of concurrent clients through
+the ASGI app on a single event loop. With blocking database access the throughput stays flat
+as clients are added; with async access it should grow until the CPU is saturated.
+
+    python benchmarks/concurrency.py --notices 20000 --profiles 200 --clients 1 8 32
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+from sqlalchemy import insert
+from sqlalchemy.pool import NullPool
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from tendara_ai_challenge.matching.app import app
+from tendara_ai_challenge.matching.cache import match_cache
+from tendara_ai_challenge.matching.database import create_async_db_engine, create_db_engine
+from tendara_ai_challenge.matching.entity import (
+    Category, Location, Notice, NoticeCategory, NoticeLocation, Profile, get_async_session, get_session,
+)
+from tendara_ai_challenge.matching.index import rebuild_token_index
+
+WORDS = ("solar", "panel", "python", "software", "construction", "bridge", "cleaning", "catering",
+         "consulting", "hospital", "road", "energy", "maintenance", "security", "training", "network")
+
+
+def seed(url: str, notices: int, profiles: int, categories: int = 20, locations: int = 20, seed: int = 7):
+    rng = random.Random(seed)
+    engine = create_engine(url)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as db:
+        connection = db.connection()
+        connection.execute(insert(Category.__table__), [{"id": i, "name": f"category {i}"} for i in range(1, categories + 1)])
+        connection.execute(insert(Location.__table__), [
+            {"id": i, "city": f"city {i}", "country": "country"} for i in range(1, locations + 1)
+        ])
+        connection.execute(insert(Notice.__table__), [{
+            "id": i,
+            "title": " ".join(rng.choices(WORDS, k=5)),
+            "description": " ".join(rng.choices(WORDS, k=40)),
+        } for i in range(1, notices + 1)])
+        connection.execute(insert(NoticeCategory.__table__), [
+            {"notice_id": i, "category_id": rng.randint(1, categories)} for i in range(1, notices + 1)
+        ])
+        connection.execute(insert(NoticeLocation.__table__), [
+            {"notice_id": i, "location_id": rng.randint(1, locations)} for i in range(1, notices + 1)
+        ])
+        connection.execute(insert(Profile.__table__), [{
+            "id": i,
+            "category_id": rng.randint(1, categories),
+            "location_id": rng.randint(1, locations),
+            "tags": ",".join(rng.sample(WORDS, k=3)),
+        } for i in range(1, profiles + 1)])
+        db.commit()
+        rebuild_token_index(db)
+    engine.dispose()
+
+
+async def run_clients(client: httpx.AsyncClient, clients: int, requests: int, profiles: int) -> dict:
+    match_cache.clear()
+    profile_ids = iter(random.Random(clients).choices(range(1, profiles + 1), k=requests))
+    latencies = []
+
+    async def worker():
+        for profile_id in profile_ids:
+            match_cache.invalidate(profile_id)
+            start = time.perf_counter()
+            response = await client.get(f"/profiles/{profile_id}/matches", params={"limit": 20})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(clients)))
+    seconds = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "clients": clients,
+        "requests_per_second": len(latencies) / seconds,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+
+
+async def benchmark(url: str, client_counts, requests: int, profiles: int):
+    async_engine = create_async_db_engine(url, poolclass=NullPool)
+    engine = create_db_engine(url)
+
+    async def get_async_session_override():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+
+    def get_session_override():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_async_session] = get_async_session_override
+    app.dependency_overrides[get_session] = get_session_override
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for clients in client_counts:
+                result = await run_clients(client, clients, requests, profiles)
+                print(f"{result['clients']:>4} clients: {result['requests_per_second']:8.1f} req/s, "
+                      f"p50 {result['p50_ms']:7.1f} ms, p99 {result['p99_ms']:7.1f} ms")
+    finally:
+        app.dependency_overrides.clear()
+        await async_engine.dispose()
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures matching API throughput under parallel clients.")
+    parser.add_argument("--notices", type=int, default=20000, help="Number of synthetic notices.")
+    parser.add_argument("--profiles", type=int, default=200, help="Number of synthetic profiles.")
+    parser.add_argument("--requests", type=int, default=400, help="Requests issued per concurrency level.")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32], help="Concurrency levels.")
+    arguments = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        url = f"sqlite:///{Path(directory) / 'benchmark.db'}"
+        seed(url, arguments.notices, arguments.profiles)
+        asyncio.run(benchmark(url, arguments.clients, arguments.requests, arguments.profiles))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""Measures ingest and matching performance at growing corpus sizes, against stored baselines.
+
+For every scale, synthetic notices are written as NDJSON and ingested through the streaming
+extract and transform strategies into `DataProcessorService`, with an analyzer that derives
+categories and locations from the notices instead of calling the LLM. Then the ingested corpus is
+queried with `find_relevant_notices` and through the matching endpoint.
+
+Each scale runs in a fresh interpreter, so its peak RSS is its own. Results are written as JSON
+and compared with `benchmarks/baselines.json`; the command fails when a metric regressed beyond
+the tolerance. Baselines are machine-specific: refresh them with `--update-baselines` on the
+machine that runs the comparison.
+
+    PYTHONPATH=. python benchmarks/suite.py --scales 10000 100000 1000000 --output results.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+BASELINES_PATH = Path(__file__).parent / "baselines.json"
+
+# Whether a higher value of the metric is better.
+METRICS: Dict[str, bool] = {
+    "extract_records_per_second": True,
+    "transform_records_per_second": True,
+    "persist_records_per_second": True,
+    "ingest_records_per_second": True,
+    "match_p50_ms": False,
+    "match_p99_ms": False,
+    "endpoint_requests_per_second": True,
+    "peak_rss_mb": False,
+}
+
+
+def timed(items: Iterable, timings: Dict[str, float], stage: str) -> Iterator:
+    """Yields from `items`, adding the time spent producing each item to `timings[stage]`.
+
+    Stages wrap each other, so the time of a stage includes the stages upstream of it.
+    """
+    iterator = iter(items)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            timings[stage] += time.perf_counter() - started
+            return
+        timings[stage] += time.perf_counter() - started
+        yield item
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_scale(scale: int, queries: int, requests: int, batch_size: int, seed: int) -> Dict[str, float]:
+    # Imported here, so that the driver process stays small and only measures its children.
+    from fastapi.testclient import TestClient
+    from sqlalchemy import insert
+    from sqlalchemy.pool import NullPool
+    from sqlmodel import Session, SQLModel
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+    from tendara_ai_challenge.etl.dto import RelatedIds
+    from tendara_ai_challenge.etl.extractor import StreamingJSONDataExtractStrategy
+    from tendara_ai_challenge.etl.processor import Analyzer, DataProcessorService
+    from tendara_ai_challenge.etl.transformer import JSONDataTransformStrategy
+    from tendara_ai_challenge.matching.app import app
+    from tendara_ai_challenge.matching.cache import match_cache
+    from tendara_ai_challenge.matching.database import create_async_db_engine, create_db_engine
+    from tendara_ai_challenge.matching.entity import Category, Location, Profile, get_async_session, get_session
+    from tendara_ai_challenge.matching.matching import find_relevant_notices
+    from tendara_ai_challenge.matching.synthetic import CITIES, DIVISIONS, synthetic_records
+
+    divisions = {division: category_id for category_id, (division, _, _) in enumerate(DIVISIONS, start=1)}
+    cities = {f"{city}, {country}": location_id for location_id, (city, country) in enumerate(CITIES, start=1)}
+
+    class SyntheticAnalyzer(Analyzer):
+        """Classifies synthetic notices by the division of their first CPV code and by their city."""
+
+        def fetch_related_ids(self, categories, locations, notice) -> Optional[RelatedIds]:
+            return RelatedIds(categoryIds=[divisions[notice.cpv_codes[0][:2]]], locationIds=[cities[notice.location]])
+
+    with tempfile.TemporaryDirectory() as directory:
+        data_path = Path(directory) / "notices.ndjson"
+        with open(data_path, "w", encoding="utf-8") as f:
+            for record in synthetic_records(scale, seed):
+                f.write(json.dumps(record) + "\n")
+
+        url = f"sqlite:///{Path(directory) / 'benchmark.db'}"
+        engine = create_db_engine(url)
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as db:
+            connection = db.connection()
+            connection.execute(insert(Category.__table__), [
+                {"id": category_id, "name": name} for category_id, (_, name, _) in enumerate(DIVISIONS, start=1)
+            ])
+            connection.execute(insert(Location.__table__), [
+                {"id": location_id, "city": city, "country": country} for location_id, (city, country) in enumerate(CITIES, start=1)
+            ])
+            db.commit()
+
+            timings = defaultdict(float)
+            records = timed(StreamingJSONDataExtractStrategy().stream_data(str(data_path)), timings, "extract")
+            notices = timed(JSONDataTransformStrategy().transform_stream(records), timings, "transform")
+            started = time.perf_counter()
+            deque(DataProcessorService(SyntheticAnalyzer(db), batch_size=batch_size).process_stream(notices), maxlen=0)
+            ingest_seconds = time.perf_counter() - started
+
+            rng = random.Random(seed)
+            profiles = []
+            for _ in range(max(queries, requests)):
+                category_id = rng.randint(1, len(DIVISIONS))
+                subjects = DIVISIONS[category_id - 1][2]
+                profiles.append(Profile(
+                    category_id=category_id,
+                    location_id=rng.randint(1, len(CITIES)),
+                    tags=",".join(word for subject in rng.sample(subjects, 2) for word in subject.split()[-1:]),
+                ))
+
+            latencies = []
+            for profile in profiles[:queries]:
+                started = time.perf_counter()
+                find_relevant_notices(profile, db, limit=20)
+                latencies.append(time.perf_counter() - started)
+
+            db.add_all(Profile(category_id=profile.category_id, location_id=profile.location_id, tags=profile.tags) for profile in profiles[:requests])
+            db.commit()
+
+        async_engine = create_async_db_engine(url, poolclass=NullPool)
+
+        async def get_async_session_override():
+            async with AsyncSession(async_engine, expire_on_commit=False) as session:
+                yield session
+
+        def get_session_override():
+            with Session(engine) as session:
+                yield session
+
+        app.dependency_overrides[get_async_session] = get_async_session_override
+        app.dependency_overrides[get_session] = get_session_override
+        client = TestClient(app)
+        try:
+            started = time.perf_counter()
+            for profile_id in range(1, requests + 1):
+                # Every request is scored, not answered from the match cache.
+                match_cache.invalidate(profile_id)
+                client.get(f"/profiles/{profile_id}/matches", params={"limit": 20}).raise_for_status()
+            endpoint_seconds = time.perf_counter() - started
+        finally:
+            app.dependency_overrides.clear()
+            client.close()
+            engine.dispose()
+
+    persist_seconds = ingest_seconds - timings["transform"]
+    return {
+        "extract_records_per_second": scale / timings["extract"],
+        "transform_records_per_second": scale / (timings["transform"] - timings["extract"]),
+        "persist_records_per_second": scale / persist_seconds,
+        "ingest_records_per_second": scale / ingest_seconds,
+        "match_p50_ms": statistics.median(latencies) * 1000,
+        "match_p99_ms": percentile(latencies, 0.99) * 1000,
+        "endpoint_requests_per_second": requests / endpoint_seconds,
+        # ru_maxrss is in KiB on Linux and in bytes on macOS.
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 ** 2 if sys.platform == "darwin" else 1024),
+    }
+
+
+def compare(results: Dict[str, Dict[str, float]], baselines: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    """Prints every metric next to its baseline, returning the regressions beyond `tolerance`."""
+    regressions = []
+    for scale, metrics in results.items():
+        baseline = baselines.get(scale, {})
+        print(f"\n{int(scale):,} notices")
+        for metric, value in metrics.items():
+            expected = baseline.get(metric)
+            if expected is None:
+                print(f"  {metric:<32} {value:12.1f}   (no baseline)")
+                continue
+            change = (value - expected) / expected if expected else 0.0
+            regressed = change < -tolerance if METRICS[metric] else change > tolerance
+            print(f"  {metric:<32} {value:12.1f}   baseline {expected:12.1f}   {change:+7.1%}{'   REGRESSION' if regressed else ''}")
+            if regressed:
+                regressions.append(f"{metric} at {scale} notices: {value:.1f} vs {expected:.1f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks ingestion and matching at several corpus sizes.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[10_000], help="Numbers of synthetic notices, e.g. 10000 100000 1000000.")
+    parser.add_argument("--queries", type=int, default=200, help="find_relevant_notices calls timed per scale.")
+    parser.add_argument("--requests", type=int, default=200, help="Matching endpoint requests timed per scale.")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Batch size of the DataProcessorService.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic notices and profiles.")
+    parser.add_argument("--output", help="Where to write the results as JSON.")
+    parser.add_argument("--baselines", default=str(BASELINES_PATH), help="Baselines to compare the results with.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Relative change of a metric tolerated before failing.")
+    parser.add_argument("--update-baselines", action="store_true", help="Store the results as the new baselines.")
+    parser.add_argument("--run-scale", type=int, help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.run_scale is not None:
+        metrics = run_scale(arguments.run_scale, arguments.queries, arguments.requests, arguments.batch_size, arguments.seed)
+        print(json.dumps(metrics))
+        return
+
+    results = {}
+    for scale in arguments.scales:
+        print(f"Benchmarking {scale:,} notices...", file=sys.stderr)
+        completed = subprocess.run(
+            [sys.executable, __file__, "--run-scale", str(scale), "--queries", str(arguments.queries),
+             "--requests", str(arguments.requests), "--batch-size", str(arguments.batch_size), "--seed", str(arguments.seed)],
+            check=True, stdout=subprocess.PIPE, text=True,
+        )
+        results[str(scale)] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+    if arguments.output:
+        Path(arguments.output).write_text(json.dumps(report, indent=2) + "\n")
+
+    baselines_path = Path(arguments.baselines)
+    baselines = json.loads(baselines_path.read_text()) if baselines_path.exists() else {"results": {}}
+    if arguments.update_baselines:
+        baselines = {**report, "results": {**baselines["results"], **results}}
+        baselines_path.write_text(json.dumps(baselines, indent=2) + "\n")
+        print(f"Stored the baselines of {', '.join(results)} notices in {baselines_path}")
+        return
+
+    regressions = compare(results, baselines["results"], arguments.tolerance)
+    if regressions:
+        print("\nRegressed beyond {:.0%}:\n  ".format(arguments.tolerance) + "\n  ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+from contextlib import asynccontextmanager
+
+from fastapi import APIRouter, FastAPI, Response
+from sqlmodel import Session
+
+from tendara_ai_challenge.matching.database import get_async_engine, get_engine
+from tendara_ai_challenge.matching.entity import create_db_and_tables
+from tendara_ai_challenge.matching.index import ensure_token_index
+from tendara_ai_challenge.metrics import CONTENT_TYPE, metrics
+from tendara_ai_challenge.settings import get_settings
+
+
+def create_app(*routers: APIRouter) -> FastAPI:
+    """Builds an app serving `routers` and `/metrics`; its database engines are the process-wide ones."""
+    app = FastAPI(lifespan=lifespan)
+    for router in routers:
+        app.include_router(router)
+    app.add_api_route("/metrics", get_metrics, include_in_schema=False)
+    return app
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if get_settings().metrics_enabled:
+        metrics.enabled = True
+    create_db_and_tables()
+    with Session(get_engine()) as db:
+        ensure_token_index(db)
+    yield
+    # Only dispose of the engines the app actually created.
+    if get_async_engine.cache_info().currsize:
+        await get_async_engine().dispose()
+    if get_engine.cache_info().currsize:
+        get_engine().dispose()
+
+
+def get_metrics():
+    return Response(metrics.render(), media_type=CONTENT_TYPE)
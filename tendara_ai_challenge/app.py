@@ -0,0 +1,9 @@
+"""Serves the profile and matching APIs from one process, sharing its database engines.
+
+    uvicorn tendara_ai_challenge.app:app
+"""
+from tendara_ai_challenge.api import create_app
+from tendara_ai_challenge.matching.app import router as matching_router
+from tendara_ai_challenge.profile.app import router as profile_router
+
+app = create_app(profile_router, matching_router)
@@ -0,0 +1,85 @@
+import logging
+from typing import Dict, List, Optional
+
+from pydantic import ValidationError
+
+from tendara_ai_challenge.etl.dto import BatchRelatedIds, RelatedIds
+from tendara_ai_challenge.etl.processor import OpenAIAnalyzer
+from tendara_ai_challenge.matching.dto import NoticeModel
+from tendara_ai_challenge.matching.entity import Category, Location
+
+
+class BatchOpenAIAnalyzer(OpenAIAnalyzer):
+    """Classifies up to `notices_per_request` notices per OpenAI request.
+
+    The Category/Location catalog is sent once per request instead of once per notice. Each answer
+    is validated against the request (known index, ids from the catalog); notices whose answer is
+    missing or invalid are classified again with a single-notice request.
+    """
+
+    batch_prompt = """
+    Given the following numbered notices, predict the category (ies) and location(s) that best match each notice:
+    Categories: %s
+    Locations: %s
+    Notices:
+    %s
+    return, for every notice, its number as index and the ids of the categories and locations that best match it.
+    """
+
+    def __init__(self, database, notices_per_request: int = 10, **kwargs):
+        super().__init__(database, **kwargs)
+        self.notices_per_request = notices_per_request
+
+    def fetch_related_ids_batch(self, categories: List[Category], locations: List[Location], notices: List[NoticeModel]) -> List[Optional[RelatedIds]]:
+        results = []
+        for start in range(0, len(notices), self.notices_per_request):
+            chunk = notices[start:start + self.notices_per_request]
+            answers = self._fetch_chunk(categories, locations, chunk) if len(chunk) > 1 else {}
+            for index, notice in enumerate(chunk):
+                if index not in answers:
+                    logging.warning("No valid batch answer for notice %d, falling back to a single request", start + index)
+                    answers[index] = self.fetch_related_ids(categories, locations, notice)
+                results.append(answers[index])
+        return results
+
+    def estimate_tokens(self, categories: List[Category], locations: List[Location], notices: List[NoticeModel]) -> int:
+        requests = -(-len(notices) // self.notices_per_request)
+        catalog_size = len(repr(categories)) + len(repr(locations))
+        text_size = sum(len(notice.title) + len(notice.description) for notice in notices)
+        return (catalog_size * requests + text_size) // 4
+
+    def fingerprint(self) -> str:
+        # Results must not depend on whether a notice was classified alone or in a batch, so both prompts count.
+        return f"{super().fingerprint()}:{self.batch_prompt}"
+
+    def _fetch_chunk(self, categories: List[Category], locations: List[Location], notices: List[NoticeModel]) -> Dict[int, RelatedIds]:
+        # Imported here, like the client sending the request, to keep openai out of the import of the ETL.
+        from openai import ContentFilterFinishReasonError, LengthFinishReasonError
+
+        numbered_notices = "\n".join(
+            f"[{index}] {notice.description} {notice.title}" for index, notice in enumerate(notices)
+        )
+        try:
+            response = self.parse(self.batch_prompt % (categories, locations, numbered_notices), BatchRelatedIds)
+        except (ValidationError, LengthFinishReasonError, ContentFilterFinishReasonError) as error:
+            logging.error("AI returned an unparseable batch analysis: %s", error)
+            return {}
+
+        analysis_result_message = response.choices[0].message
+        if analysis_result_message.refusal or analysis_result_message.parsed is None:
+            logging.error("AI refused to provide the batch analysis")
+            return {}
+
+        category_ids = {category.id for category in categories}
+        location_ids = {location.id for location in locations}
+        answers = {}
+        for result in analysis_result_message.parsed.results:
+            if (
+                    0 <= result.index < len(notices)
+                    and result.index not in answers
+                    and set(result.categoryIds) <= category_ids
+                    and set(result.locationIds) <= location_ids
+            ):
+                answers[result.index] = RelatedIds(categoryIds=result.categoryIds, locationIds=result.locationIds)
+        logging.info("AI provided the batch analysis for %d of %d notices", len(answers), len(notices))
+        return answers
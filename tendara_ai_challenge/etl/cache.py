@@ -0,0 +1,132 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from tendara_ai_challenge.etl.dto import CacheStats, RelatedIds
+from tendara_ai_challenge.etl.processor import Analyzer
+from tendara_ai_challenge.matching.dto import NoticeModel
+from tendara_ai_challenge.matching.entity import Category, Location
+
+
+class AnalysisCache:
+    """Persistent SQLite store of `RelatedIds` keyed by content hash, evicting the least recently used entries."""
+
+    def __init__(self, path: str = ":memory:", max_entries: int = 100_000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS analysis_cache ("
+            "key TEXT PRIMARY KEY, related_ids TEXT NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS ix_analysis_cache_accessed_at ON analysis_cache (accessed_at)"
+        )
+        self._connection.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, RelatedIds]:
+        if not keys:
+            return {}
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT key, related_ids FROM analysis_cache WHERE key IN ({placeholders})", keys
+            ).fetchall()
+            self._connection.execute(
+                f"UPDATE analysis_cache SET accessed_at = ? WHERE key IN ({placeholders})", [time.time(), *keys]
+            )
+            self._connection.commit()
+        return {key: RelatedIds.model_validate_json(related_ids) for key, related_ids in rows}
+
+    def put_many(self, entries: Dict[str, RelatedIds]):
+        if not entries:
+            return
+        now = time.time()
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO analysis_cache (key, related_ids, accessed_at) VALUES (?, ?, ?)",
+                [(key, related_ids.model_dump_json(), now) for key, related_ids in entries.items()]
+            )
+            self._connection.execute(
+                "DELETE FROM analysis_cache WHERE key IN ("
+                "SELECT key FROM analysis_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._connection.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()[0]
+
+    def close(self):
+        self._connection.close()
+
+
+class CachedAnalyzer(Analyzer):
+    """Serves classification results from an `AnalysisCache` and only asks the wrapped analyzer on a miss.
+
+    Entries are keyed by the notice title and description, the analyzer fingerprint (model and prompt)
+    and a version of the Category/Location catalog, so changing any of them invalidates old results.
+    """
+
+    def __init__(self, analyzer: Analyzer, cache: AnalysisCache):
+        super().__init__(analyzer.database)
+        self.analyzer = analyzer
+        self.cache = cache
+        self.stats = CacheStats()
+        self._miss_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def fetch_related_ids(self, categories: List[Category], locations: List[Location], notice: NoticeModel) -> Optional[RelatedIds]:
+        return self.fetch_related_ids_batch(categories, locations, [notice])[0]
+
+    def fetch_related_ids_batch(self, categories: List[Category], locations: List[Location], notices: List[NoticeModel]) -> List[Optional[RelatedIds]]:
+        catalog_version = self.catalog_version(categories, locations)
+        keys = [self.cache_key(catalog_version, notice) for notice in notices]
+        cached = self.cache.get_many(keys)
+
+        missed = [index for index, key in enumerate(keys) if key not in cached]
+        hit_notices = [notice for key, notice in zip(keys, notices) if key in cached]
+        started = time.perf_counter()
+        fetched = self.analyzer.fetch_related_ids_batch(categories, locations, [notices[index] for index in missed]) if missed else []
+        elapsed = time.perf_counter() - started
+
+        self.cache.put_many({
+            keys[index]: related_ids for index, related_ids in zip(missed, fetched) if related_ids is not None
+        })
+        self._record(categories, locations, hit_notices, len(missed), elapsed)
+
+        results = [cached.get(key) for key in keys]
+        for index, related_ids in zip(missed, fetched):
+            results[index] = related_ids
+        return results
+
+    def estimate_tokens(self, categories: List[Category], locations: List[Location], notices: List[NoticeModel]) -> int:
+        return self.analyzer.estimate_tokens(categories, locations, notices)
+
+    def fingerprint(self) -> str:
+        return self.analyzer.fingerprint()
+
+    def cache_key(self, catalog_version: str, notice: NoticeModel) -> str:
+        content = json.dumps([self.analyzer.fingerprint(), catalog_version, notice.title, notice.description])
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    @staticmethod
+    def catalog_version(categories: List[Category], locations: List[Location]) -> str:
+        catalog = json.dumps([
+            sorted((category.id, category.name) for category in categories),
+            sorted((location.id, location.city, location.country) for location in locations),
+        ])
+        return hashlib.sha256(catalog.encode()).hexdigest()
+
+    def _record(self, categories: List[Category], locations: List[Location], hit_notices: List[NoticeModel], misses: int, miss_seconds: float):
+        with self._lock:
+            self.stats.hits += len(hit_notices)
+            self.stats.misses += misses
+            self.stats.saved_tokens += self.estimate_tokens(categories, locations, hit_notices) if hit_notices else 0
+            self._miss_seconds += miss_seconds
+            average_miss_seconds = self._miss_seconds / self.stats.misses if self.stats.misses else 0.0
+            self.stats.saved_seconds = self.stats.hits * average_miss_seconds
@@ -0,0 +1,130 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Optional, Tuple, Type
+
+from tendara_ai_challenge.etl.dto import RelatedIds
+from tendara_ai_challenge.etl.processor import Analyzer
+from tendara_ai_challenge.matching.dto import NoticeModel
+from tendara_ai_challenge.matching.entity import Category, Location
+
+@lru_cache
+def retryable_errors() -> Tuple[Type[BaseException], ...]:
+    """The transient errors of the OpenAI API, imported on first use like its client, see `get_openai_client`."""
+    import openai
+    return openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError
+
+
+class RateLimiter:
+    """Thread-safe token-bucket limiter for requests-per-minute and tokens-per-minute quotas.
+
+    Both buckets start full and refill continuously; `acquire` blocks until both can cover the call.
+    """
+
+    def __init__(self, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._available_requests = float(requests_per_minute or 0)
+        self._available_tokens = float(tokens_per_minute or 0)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int = 0):
+        if self.tokens_per_minute is not None:
+            # A single call larger than the whole quota can never fit, so it waits for a full bucket instead.
+            tokens = min(tokens, self.tokens_per_minute)
+
+        while True:
+            with self._lock:
+                self._refill()
+                wait = max(
+                    self._wait_time(self._available_requests, 1, self.requests_per_minute),
+                    self._wait_time(self._available_tokens, tokens, self.tokens_per_minute),
+                )
+                if wait == 0:
+                    self._available_requests -= 1
+                    self._available_tokens -= tokens
+                    return
+            time.sleep(wait)
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        if self.requests_per_minute is not None:
+            self._available_requests = min(
+                self.requests_per_minute, self._available_requests + elapsed * self.requests_per_minute / 60
+            )
+        if self.tokens_per_minute is not None:
+            self._available_tokens = min(
+                self.tokens_per_minute, self._available_tokens + elapsed * self.tokens_per_minute / 60
+            )
+
+    @staticmethod
+    def _wait_time(available: float, needed: int, per_minute: Optional[int]) -> float:
+        if per_minute is None or available >= needed:
+            return 0
+        return (needed - available) * 60 / per_minute
+
+
+class ConcurrentAnalyzer(Analyzer):
+    """Runs the calls of another `Analyzer` on a bounded thread pool.
+
+    Notices are classified in chunks of `chunk_size` (one call of the wrapped analyzer's
+    `fetch_related_ids_batch` each), throttled by an optional `RateLimiter` and retried with
+    jittered exponential backoff on transient errors, `retryable_errors()` unless `retry_on` is given.
+    Results keep the order of the input.
+    """
+
+    def __init__(
+            self,
+            analyzer: Analyzer,
+            max_workers: int = 8,
+            chunk_size: int = 1,
+            rate_limiter: Optional[RateLimiter] = None,
+            max_retries: int = 3,
+            backoff_seconds: float = 1.0,
+            max_backoff_seconds: float = 30.0,
+            retry_on: Optional[Tuple[Type[BaseException], ...]] = None,
+    ):
+        super().__init__(analyzer.database)
+        self.analyzer = analyzer
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.retry_on = retry_on
+
+    def fetch_related_ids(self, categories: List[Category], locations: List[Location], notice: NoticeModel) -> Optional[RelatedIds]:
+        return self._fetch_with_retry(categories, locations, [notice])[0]
+
+    def fetch_related_ids_batch(self, categories: List[Category], locations: List[Location], notices: List[NoticeModel]) -> List[Optional[RelatedIds]]:
+        chunks = [notices[i:i + self.chunk_size] for i in range(0, len(notices), self.chunk_size)]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = executor.map(lambda chunk: self._fetch_with_retry(categories, locations, chunk), chunks)
+            return [related_ids for chunk_results in results for related_ids in chunk_results]
+
+    def estimate_tokens(self, categories: List[Category], locations: List[Location], notices: List[NoticeModel]) -> int:
+        return self.analyzer.estimate_tokens(categories, locations, notices)
+
+    def fingerprint(self) -> str:
+        return self.analyzer.fingerprint()
+
+    def _fetch_with_retry(self, categories: List[Category], locations: List[Location], notices: List[NoticeModel]) -> List[Optional[RelatedIds]]:
+        retry_on = retryable_errors() if self.retry_on is None else self.retry_on
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(self.estimate_tokens(categories, locations, notices))
+            try:
+                return self.analyzer.fetch_related_ids_batch(categories, locations, notices)
+            except retry_on as error:
+                if attempt == self.max_retries:
+                    raise
+                delay = random.uniform(0, min(self.max_backoff_seconds, self.backoff_seconds * 2 ** attempt))
+                logging.warning("Analyzer call failed (%s), retrying in %.2fs", error, delay)
+                time.sleep(delay)
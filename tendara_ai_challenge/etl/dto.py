@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel
 
@@ -6,3 +6,99 @@ from pydantic import BaseModel
 class RelatedIds(BaseModel):
     categoryIds: List[int]
     locationIds: List[int]
+
+
+class ProcessingStats(BaseModel):
+    """Throughput counters of a `DataProcessorService` run, used to tune its batch size.
+
+    `notices` counts the stored notices, split into `new` and `changed` ones; `skipped` notices were already stored unchanged.
+    """
+
+    notices: int = 0
+    new: int = 0
+    changed: int = 0
+    skipped: int = 0
+    rows: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+class TransformStats(BaseModel):
+    """Throughput and rejection counters of a validating transform."""
+
+    records: int = 0
+    rejected: int = 0
+    seconds: float = 0.0
+
+    @property
+    def records_per_second(self) -> float:
+        return self.records / self.seconds if self.seconds else 0.0
+
+    @property
+    def reject_rate(self) -> float:
+        return self.rejected / self.records if self.records else 0.0
+
+
+class CacheStats(BaseModel):
+    """Hit/miss counters of a `CachedAnalyzer`, with estimates of the LLM usage the hits avoided."""
+
+    hits: int = 0
+    misses: int = 0
+    saved_tokens: int = 0
+    saved_seconds: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class IndexedRelatedIds(RelatedIds):
+    index: int
+
+
+class BatchRelatedIds(BaseModel):
+    results: List[IndexedRelatedIds]
+
+
+class PreClassificationStats(BaseModel):
+    """Share of notices a `RuleBasedAnalyzer` resolved locally, without calling the LLM."""
+
+    notices: int = 0
+    resolved: int = 0
+
+    @property
+    def skip_rate(self) -> float:
+        return self.resolved / self.notices if self.notices else 0.0
+
+
+class PortalConfig(BaseModel):
+    """A procurement portal crawled by the `PortalFetcher`.
+
+    Every feed in `urls` is paginated by passing the `cursor_field` of a page back as the `cursor_param`
+    of the next request; a page is either a list of notices or an object holding them in `records_field`.
+    """
+
+    name: str
+    urls: List[str]
+    records_field: str = "notices"
+    cursor_field: str = "next_cursor"
+    cursor_param: str = "cursor"
+    concurrency: int = 2
+    requests_per_minute: Optional[int] = None
+    headers: Dict[str, str] = {}
+
+
+class FetchStats(BaseModel):
+    """Counters of a `PortalFetcher` run."""
+
+    requests: int = 0
+    pages: int = 0
+    records: int = 0
+    not_modified: int = 0
+    retries: int = 0
+    failed_portals: List[str] = []
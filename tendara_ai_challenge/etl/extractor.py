@@ -1,6 +1,19 @@
+import asyncio
+import gzip
 import json
+import queue
+import re
+import threading
 from abc import ABC, abstractmethod
-from typing import List
+from contextlib import aclosing
+from typing import IO, Iterator, List, Optional, Tuple
+
+from tendara_ai_challenge.etl.dto import PortalConfig
+from tendara_ai_challenge.etl.fetcher import PortalFetcher
+from tendara_ai_challenge.etl.instrumentation import ETL_BATCH_SECONDS, ETL_RECORD_SECONDS, ETL_RECORDS
+from tendara_ai_challenge.metrics import timed_stream
+
+_WHITESPACE = re.compile(r"\s*")
 
 
 class DataExtractStrategy(ABC):
@@ -8,6 +21,14 @@ class DataExtractStrategy(ABC):
     def load_data(self, data_source: str) -> List[dict]:
         pass
 
+    def stream_data(self, data_source: str) -> Iterator[dict]:
+        """Yields the records of the data source one at a time.
+
+        Strategies that can read their source incrementally should override this; the default
+        falls back to the fully materialized `load_data`.
+        """
+        yield from self.load_data(data_source)
+
 
 class JSONDataExtractStrategy(DataExtractStrategy):
     def load_data(self, data_path: str) -> List[dict]:
@@ -16,10 +37,159 @@ class JSONDataExtractStrategy(DataExtractStrategy):
         return data
 
 
+class StreamingJSONDataExtractStrategy(DataExtractStrategy):
+    """Reads a JSON array or an NDJSON file (optionally gzip-compressed) one notice at a time.
+
+    The file is decoded in fixed-size chunks, so memory usage is bounded by the size of the
+    largest single notice rather than by the size of the file.
+    """
+
+    GZIP_MAGIC = b"\x1f\x8b"
+
+    def __init__(self, chunk_size: int = 1 << 16):
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+
+    def load_data(self, data_path: str) -> List[dict]:
+        return list(self.stream_data(data_path))
+
+    def stream_data(self, data_path: str) -> Iterator[dict]:
+        with self._open(data_path) as f:
+            buffer = self._read_until_content(f, "")
+            if buffer.startswith("["):
+                yield from self._iter_array(f, buffer[1:])
+            else:
+                yield from self._iter_lines(f, buffer)
+
+    def _open(self, data_path: str) -> IO[str]:
+        with open(data_path, "rb") as f:
+            is_gzip = f.read(2) == self.GZIP_MAGIC
+        if is_gzip:
+            return gzip.open(data_path, "rt", encoding="utf-8")
+        return open(data_path, "r", encoding="utf-8")
+
+    def _read_until_content(self, f: IO[str], buffer: str) -> str:
+        """Skips leading whitespace, reading more chunks until content (or EOF) is reached."""
+        buffer = buffer.lstrip()
+        while not buffer:
+            chunk = f.read(self.chunk_size)
+            if not chunk:
+                return ""
+            buffer = chunk.lstrip()
+        return buffer
+
+    def _iter_array(self, f: IO[str], buffer: str) -> Iterator[dict]:
+        """Decodes the values of a JSON array from `position` on, never decoding consumed content again."""
+        position = 0
+        expect_value = True
+        while True:
+            buffer, position = self._skip_whitespace(f, buffer, position)
+            if position == len(buffer):
+                raise ValueError("Unexpected end of file while reading JSON array")
+
+            if buffer[position] == "]":
+                return
+            if not expect_value:
+                if buffer[position] != ",":
+                    raise ValueError(f"Expected ',' or ']' in JSON array, got {buffer[position]!r}")
+                position += 1
+                expect_value = True
+                continue
+
+            read_size = self.chunk_size
+            while True:
+                try:
+                    record, position = self.decoder.raw_decode(buffer, position)
+                    break
+                except json.JSONDecodeError:
+                    chunk = f.read(read_size)
+                    if not chunk:
+                        raise
+                    # Drop the consumed content, and read twice as much on every retry, so a record
+                    # spanning many chunks is decoded a logarithmic number of times, not once per chunk.
+                    buffer = buffer[position:] + chunk
+                    position = 0
+                    read_size *= 2
+            yield record
+            expect_value = False
+
+    def _skip_whitespace(self, f: IO[str], buffer: str, position: int) -> Tuple[str, int]:
+        """Moves `position` past whitespace, reading more chunks if needed; at EOF it equals `len(buffer)`."""
+        while True:
+            position = _WHITESPACE.match(buffer, position).end()
+            if position < len(buffer):
+                return buffer, position
+            chunk = f.read(self.chunk_size)
+            if not chunk:
+                return buffer, position
+            buffer, position = chunk, 0
+
+    def _iter_lines(self, f: IO[str], buffer: str) -> Iterator[dict]:
+        for line in _prepend(buffer, f):
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _prepend(head: str, f: IO[str]) -> Iterator[str]:
+    """Iterates over the lines of `f`, treating `head` as already-read content of its first line."""
+    first_line = head + f.readline() if not head.endswith("\n") else head
+    yield from first_line.splitlines()
+    yield from f
+
+
 class APIDataExtractStrategy(DataExtractStrategy):
-    def load_data(self, api_url: str) -> List[dict]:
-        # TODO("Implement API data extraction logic if needed")
-        pass
+    """Fetches notices from procurement portal APIs with a `PortalFetcher`.
+
+    The fetcher's event loop runs on a background thread and hands over pages through a bounded queue,
+    so the notices can be consumed by the synchronous streaming transform as they arrive.
+    """
+
+    def __init__(self, portals: Optional[List[PortalConfig]] = None, fetcher: Optional[PortalFetcher] = None):
+        self.portals = portals or []
+        self.fetcher = fetcher or PortalFetcher()
+
+    def load_data(self, api_url: Optional[str] = None) -> List[dict]:
+        return list(self.stream_data(api_url))
+
+    def stream_data(self, api_url: Optional[str] = None) -> Iterator[dict]:
+        """Yields the notices of the configured portals, or of the single feed at `api_url` if given."""
+        portals = [PortalConfig(name=api_url, urls=[api_url])] if api_url else self.portals
+        pages: queue.Queue = queue.Queue(maxsize=self.fetcher.max_buffered_pages)
+        stopped = threading.Event()
+
+        async def produce():
+            async with aclosing(self.fetcher.pages(portals)) as fetched:
+                async for page in fetched:
+                    await asyncio.to_thread(pages.put, page)
+                    if stopped.is_set():
+                        break
+
+        def run():
+            try:
+                asyncio.run(produce())
+            except Exception as error:
+                pages.put(error)
+            pages.put(_END_OF_PAGES)
+
+        producer = threading.Thread(target=run, name="portal-fetcher", daemon=True)
+        producer.start()
+        try:
+            while (page := pages.get()) is not _END_OF_PAGES:
+                if isinstance(page, Exception):
+                    raise page
+                yield from page
+        finally:
+            stopped.set()
+            # Unblocks a producer waiting on a full queue, so it can notice the consumer is gone.
+            while producer.is_alive():
+                try:
+                    pages.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+
+
+_END_OF_PAGES = object()
 
 
 class DataExtractService:
@@ -27,6 +197,12 @@ class DataExtractService:
         self.strategy = strategy
 
     def load(self, data_source) -> List[dict]:
-        notices = self.strategy.load_data(data_source)
-        # TODO: Add data validation logic here and ignore invalid data
-        return notices
+        # Records are validated by the transform stage, see `ParallelJSONDataTransformStrategy` for quarantining.
+        with ETL_BATCH_SECONDS.time(stage="extract"):
+            data = self.strategy.load_data(data_source)
+        ETL_RECORDS.inc(len(data), stage="extract")
+        return data
+
+    def stream(self, data_source) -> Iterator[dict]:
+        """Yields the notices of the data source one at a time instead of materializing them."""
+        return timed_stream(lambda _: self.strategy.stream_data(data_source), (), ETL_RECORD_SECONDS, ETL_RECORDS, stage="extract")
@@ -0,0 +1,233 @@
+import asyncio
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Dict, List, MutableMapping, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from tendara_ai_challenge.etl.dto import FetchStats, PortalConfig
+
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+# ETag and Last-Modified of the first page of a feed, as returned by the last complete crawl.
+Validators = Tuple[Optional[str], Optional[str]]
+
+
+async def _gather_or_cancel(*coroutines):
+    """Runs the coroutines concurrently; if one raises, cancels the others and re-raises its error once they stopped.
+
+    A stand-in for `asyncio.TaskGroup`, which needs Python 3.11.
+    """
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class AsyncRateLimiter:
+    """Token-bucket limiter of requests per minute for coroutines; the bucket starts full."""
+
+    def __init__(self, requests_per_minute: Optional[int] = None):
+        self.requests_per_minute = requests_per_minute
+        self._available = float(requests_per_minute or 0)
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.requests_per_minute is None:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._available = min(
+                    self.requests_per_minute,
+                    self._available + (now - self._updated_at) * self.requests_per_minute / 60
+                )
+                self._updated_at = now
+                if self._available >= 1:
+                    self._available -= 1
+                    return
+                await asyncio.sleep((1 - self._available) * 60 / self.requests_per_minute)
+
+
+class PortalFetcher:
+    """Crawls many procurement portals concurrently, yielding their notices page by page.
+
+    Requests share one connection pool per host, bounded by `max_connections_per_host`; each portal
+    additionally has its own concurrency and rate limits. Transport errors, timeouts, 429 and 5xx answers
+    are retried with jittered exponential backoff (or after the server's Retry-After).
+
+    The first page of every feed is requested conditionally with the validators of the last complete
+    crawl, kept in `validators` (pass a persistent mapping to keep them across runs); a 304 answer
+    skips the whole feed. A portal that still fails after the retries is logged and recorded in
+    `stats.failed_portals`, without interrupting the other portals.
+    """
+
+    def __init__(
+            self,
+            max_connections_per_host: int = 10,
+            timeout_seconds: float = 30.0,
+            max_retries: int = 3,
+            backoff_seconds: float = 0.5,
+            max_backoff_seconds: float = 30.0,
+            validators: Optional[MutableMapping[str, Validators]] = None,
+            max_buffered_pages: int = 64,
+    ):
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout_seconds = timeout_seconds
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.validators = {} if validators is None else validators
+        self.max_buffered_pages = max_buffered_pages
+        self.stats = FetchStats()
+
+    async def fetch(self, portals: List[PortalConfig]) -> AsyncIterator[dict]:
+        """Yields the notices of every portal, in the order their pages arrive."""
+        async for page in self.pages(portals):
+            for record in page:
+                yield record
+
+    async def pages(self, portals: List[PortalConfig]) -> AsyncIterator[List[dict]]:
+        """Yields the records of every fetched page, in the order the pages arrive.
+
+        At most `max_buffered_pages` pages are held while the consumer is busy, so slow consumers
+        slow the crawl down instead of growing memory. Closing the iterator cancels the crawl.
+        """
+        self.stats = FetchStats()
+        clients: Dict[str, httpx.AsyncClient] = {}
+        buffer: asyncio.Queue = asyncio.Queue(maxsize=self.max_buffered_pages)
+
+        async def crawl():
+            try:
+                await _gather_or_cancel(*(self._crawl_portal(portal, clients, buffer) for portal in portals))
+            except Exception as error:
+                await buffer.put(error)
+            else:
+                await buffer.put(None)
+
+        crawler = asyncio.create_task(crawl())
+        try:
+            while (page := await buffer.get()) is not None:
+                if isinstance(page, Exception):
+                    raise page
+                yield page
+        finally:
+            crawler.cancel()
+            await asyncio.gather(crawler, return_exceptions=True)
+            await asyncio.gather(*(client.aclose() for client in clients.values()))
+
+    async def _crawl_portal(self, portal: PortalConfig, clients: Dict[str, httpx.AsyncClient], buffer: asyncio.Queue):
+        limits = (asyncio.Semaphore(portal.concurrency), AsyncRateLimiter(portal.requests_per_minute))
+        try:
+            # A failed feed fails its portal, so its sibling feeds are cancelled instead of buffering pages of a failed crawl.
+            await _gather_or_cancel(*(self._crawl_feed(portal, url, clients, buffer, limits) for url in portal.urls))
+        except (httpx.HTTPError, ValueError) as error:
+            logging.error("Fetching portal %s failed: %s", portal.name, error)
+            self.stats.failed_portals.append(portal.name)
+
+    async def _crawl_feed(
+            self,
+            portal: PortalConfig,
+            url: str,
+            clients: Dict[str, httpx.AsyncClient],
+            buffer: asyncio.Queue,
+            limits: Tuple[asyncio.Semaphore, AsyncRateLimiter],
+    ):
+        etag, last_modified = self.validators.get(url, (None, None))
+        headers = {**portal.headers}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        client = self._client(clients, url)
+        cursor = None
+        validators = None
+        while True:
+            params = {portal.cursor_param: cursor} if cursor is not None else {}
+            response = await self._get(client, url, params, headers, limits)
+            if response.status_code == 304:
+                self.stats.not_modified += 1
+                return
+            if validators is None:
+                validators = (response.headers.get("ETag"), response.headers.get("Last-Modified"))
+                headers = {**portal.headers}
+
+            payload = response.json()
+            records = payload if isinstance(payload, list) else payload.get(portal.records_field, [])
+            self.stats.pages += 1
+            self.stats.records += len(records)
+            await buffer.put(records)
+
+            cursor = None if isinstance(payload, list) else payload.get(portal.cursor_field)
+            if not cursor:
+                break
+
+        # Only a complete crawl may make the next run skip the feed.
+        self.validators[url] = validators
+
+    def _client(self, clients: Dict[str, httpx.AsyncClient], url: str) -> httpx.AsyncClient:
+        host = urlsplit(url).netloc
+        if host not in clients:
+            clients[host] = httpx.AsyncClient(
+                timeout=self.timeout_seconds,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections_per_host,
+                    max_keepalive_connections=self.max_connections_per_host,
+                ),
+            )
+        return clients[host]
+
+    async def _get(
+            self,
+            client: httpx.AsyncClient,
+            url: str,
+            params: dict,
+            headers: dict,
+            limits: Tuple[asyncio.Semaphore, AsyncRateLimiter],
+    ) -> httpx.Response:
+        semaphore, rate_limiter = limits
+        for attempt in range(self.max_retries + 1):
+            response = None
+            async with semaphore:
+                await rate_limiter.acquire()
+                self.stats.requests += 1
+                try:
+                    response = await client.get(url, params=params, headers=headers)
+                    if response.status_code not in RETRYABLE_STATUS_CODES:
+                        if response.is_error:
+                            response.raise_for_status()
+                        return response
+                    error: Exception = httpx.HTTPStatusError(
+                        f"Server answered {response.status_code}", request=response.request, response=response
+                    )
+                except httpx.TransportError as transport_error:
+                    error = transport_error
+
+            if attempt == self.max_retries:
+                raise error
+            self.stats.retries += 1
+            delay = _retry_after(response)
+            if delay is None:
+                delay = random.uniform(0, min(self.max_backoff_seconds, self.backoff_seconds * 2 ** attempt))
+            logging.warning("Request to %s failed (%s), retrying in %.2fs", url, error, delay)
+            await asyncio.sleep(min(delay, self.max_backoff_seconds))
+
+
+def _retry_after(response: Optional[httpx.Response]) -> Optional[float]:
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
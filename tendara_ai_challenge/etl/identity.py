@@ -0,0 +1,21 @@
+import hashlib
+import json
+
+from tendara_ai_challenge.matching.dto import NoticeModel
+
+
+def notice_external_id(notice: NoticeModel) -> str:
+    """Returns the identity of a notice across ETL runs.
+
+    That is the portal's own id when there is one, and otherwise a hash of the buyer, title and
+    publication date; a notice without an id whose title gets corrected is thus seen as a new notice.
+    """
+    if notice.external_id:
+        return notice.external_id
+    natural_key = json.dumps([notice.buyer, notice.title, notice.publication_deadline.isoformat()])
+    return "sha256:" + hashlib.sha256(natural_key.encode()).hexdigest()
+
+
+def notice_content_hash(notice: NoticeModel) -> str:
+    """Hashes every field of a notice, so that any change to it is detected."""
+    return hashlib.sha256(notice.model_dump_json(exclude={"external_id"}).encode()).hexdigest()
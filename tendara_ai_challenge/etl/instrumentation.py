@@ -0,0 +1,12 @@
+from tendara_ai_challenge.metrics import metrics
+
+ETL_RECORD_SECONDS = metrics.histogram(
+    "etl_record_seconds", "Time spent by a streaming ETL stage on one record, excluding the stages upstream.", ["stage"]
+)
+ETL_BATCH_SECONDS = metrics.histogram(
+    "etl_batch_seconds", "Time spent by an ETL stage on a whole input or batch of notices.", ["stage"]
+)
+ETL_RECORDS = metrics.counter("etl_records_total", "Records processed by an ETL stage.", ["stage"])
+
+LLM_REQUEST_SECONDS = metrics.histogram("llm_request_seconds", "Latency of the LLM classification requests.", ["model"])
+LLM_TOKENS = metrics.counter("llm_tokens_total", "Tokens used by the LLM classification requests.", ["model", "kind"])
@@ -0,0 +1,200 @@
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, case, func, insert, or_, update
+from sqlalchemy.engine import Connection, Engine
+from sqlmodel import Session, select
+
+from tendara_ai_challenge.matching.entity import EtlJob, EtlTask
+
+# Downstream tasks run first, so a job drains its chunks instead of extracting its whole source up front.
+TASK_PRIORITIES = {"persist": 0, "classify": 1, "extract": 2}
+
+# (kind, payload, records) of a task to create.
+FollowUp = Tuple[str, dict, int]
+
+
+class LeaseLost(Exception):
+    """The lease of a task expired and another worker took the task over."""
+
+
+class JobQueue:
+    """SQLite-backed queue of ETL jobs, whose extract, classify and persist tasks are leased by workers.
+
+    A leased task belongs to its worker until `lease_seconds` pass without a checkpoint; then another
+    worker may lease it again, so the tasks of a crashed worker resume after a restart. Failed tasks
+    are retried after an exponential backoff, up to `max_attempts` leases in total.
+
+    Checkpoints and completions run on the caller's connection, in the transaction of the work they
+    record, and only while the caller still holds the lease (or `LeaseLost` is raised).
+    """
+
+    def __init__(self, engine: Engine, lease_seconds: float = 300.0, max_attempts: int = 3, backoff_seconds: float = 5.0):
+        self.engine = engine
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+
+    def enqueue(self, source: str, chunk_size: int = 100, incremental: bool = False) -> int:
+        """Creates a job extracting `source` in chunks of `chunk_size` records; returns its id."""
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be a positive integer")
+        with Session(self.engine) as db:
+            job = EtlJob(source=source, chunk_size=chunk_size, incremental=incremental, created_at=_now())
+            db.add(job)
+            db.flush()
+            self._add_tasks(db.connection(), job.id, [("extract", {"source": source, "offset": 0}, 0)])
+            db.commit()
+            return job.id
+
+    def lease(self, owner: str) -> Optional[EtlTask]:
+        """Leases the next runnable task to `owner`, or returns None when there is none right now."""
+        now = _now()
+        with self.engine.begin() as connection:
+            # A task whose worker died on its last attempt must not be leased again.
+            connection.execute(
+                update(EtlTask)
+                .where(EtlTask.status == "leased", EtlTask.lease_expires_at < now, EtlTask.attempts >= self.max_attempts)
+                .values(status="failed", error="Lease expired on the last attempt", finished_at=now)
+            )
+            self._fail_jobs(connection)
+            runnable = (
+                select(EtlTask.id)
+                .where(or_(
+                    and_(EtlTask.status == "pending", or_(EtlTask.not_before.is_(None), EtlTask.not_before <= now)),
+                    and_(EtlTask.status == "leased", EtlTask.lease_expires_at < now),
+                ))
+                .order_by(EtlTask.priority, EtlTask.id)
+                .limit(1)
+                .scalar_subquery()
+            )
+            task_id = connection.execute(
+                update(EtlTask)
+                .where(EtlTask.id == runnable)
+                .values(
+                    status="leased",
+                    lease_owner=owner,
+                    lease_expires_at=now + timedelta(seconds=self.lease_seconds),
+                    attempts=EtlTask.attempts + 1,
+                )
+                .returning(EtlTask.id)
+            ).scalar()
+        if task_id is None:
+            return None
+        with Session(self.engine, expire_on_commit=False) as db:
+            return db.get(EtlTask, task_id)
+
+    def checkpoint(self, connection: Connection, task: EtlTask, owner: str, payload: dict, follow_ups: Iterable[FollowUp] = ()):
+        """Records the progress of a task still running, with the tasks it spawned so far, and renews its lease."""
+        self._update_leased(connection, task, owner, payload=json.dumps(payload), lease_expires_at=_now() + timedelta(seconds=self.lease_seconds))
+        self._add_tasks(connection, task.job_id, follow_ups)
+
+    def complete(self, connection: Connection, task: EtlTask, owner: str, records: int = 0, follow_ups: Iterable[FollowUp] = ()):
+        """Marks a task done with the tasks it spawned, and its job done once none of its tasks remains."""
+        now = _now()
+        self._update_leased(connection, task, owner, status="done", records=records, finished_at=now, lease_expires_at=None)
+        self._add_tasks(connection, task.job_id, follow_ups)
+        remaining = connection.execute(
+            select(func.count(EtlTask.id)).where(EtlTask.job_id == task.job_id, EtlTask.status != "done")
+        ).scalar()
+        if not remaining:
+            connection.execute(update(EtlJob).where(EtlJob.id == task.job_id).values(status="done", finished_at=now))
+
+    def fail(self, task: EtlTask, owner: str, error: str):
+        """Schedules a retry of a failed task, or fails it and its job after its last attempt."""
+        now = _now()
+        with self.engine.begin() as connection:
+            if task.attempts >= self.max_attempts:
+                values = {"status": "failed", "finished_at": now}
+            else:
+                delay = self.backoff_seconds * 2 ** (task.attempts - 1)
+                values = {"status": "pending", "not_before": now + timedelta(seconds=delay)}
+            try:
+                self._update_leased(connection, task, owner, error=error, lease_owner=None, lease_expires_at=None, **values)
+            except LeaseLost:
+                logging.warning("Task %d failed after its lease was lost: %s", task.id, error)
+                return
+            self._fail_jobs(connection)
+
+    def job(self, job_id: int) -> Optional[EtlJob]:
+        with Session(self.engine) as db:
+            return db.get(EtlJob, job_id)
+
+    def is_idle(self) -> bool:
+        """Whether no task is pending or running, so no task can appear without a new job."""
+        with Session(self.engine) as db:
+            return not db.exec(select(func.count(EtlTask.id)).where(EtlTask.status.in_(["pending", "leased"]))).one()
+
+    def depth(self) -> Dict[Tuple[str, str], int]:
+        """Number of tasks by (kind, status)."""
+        with Session(self.engine) as db:
+            return {
+                (kind, status): count
+                for kind, status, count in db.exec(
+                    select(EtlTask.kind, EtlTask.status, func.count(EtlTask.id)).group_by(EtlTask.kind, EtlTask.status)
+                )
+            }
+
+    def throughput(self, window_seconds: float = 60.0) -> float:
+        """Notices persisted per second over the last `window_seconds`."""
+        since = _now() - timedelta(seconds=window_seconds)
+        with Session(self.engine) as db:
+            persisted = db.exec(
+                select(func.coalesce(func.sum(EtlTask.records), 0))
+                .where(EtlTask.kind == "persist", EtlTask.status == "done", EtlTask.finished_at >= since)
+            ).one()
+        return persisted / window_seconds
+
+    def jobs(self, limit: int = 20) -> List[Tuple[EtlJob, int, int, int]]:
+        """The latest jobs, with their number of tasks, done tasks and persisted notices."""
+        with Session(self.engine) as db:
+            jobs = db.exec(select(EtlJob).order_by(EtlJob.id.desc()).limit(limit)).all()
+            counts = {
+                job_id: (tasks, done, persisted)
+                for job_id, tasks, done, persisted in db.exec(
+                    select(
+                        EtlTask.job_id,
+                        func.count(EtlTask.id),
+                        func.sum(case((EtlTask.status == "done", 1), else_=0)),
+                        func.sum(case((EtlTask.kind == "persist", EtlTask.records), else_=0)),
+                    )
+                    .where(EtlTask.job_id.in_([job.id for job in jobs]))
+                    .group_by(EtlTask.job_id)
+                )
+            }
+            return [(job, *counts.get(job.id, (0, 0, 0))) for job in jobs]
+
+    def _update_leased(self, connection: Connection, task: EtlTask, owner: str, **values):
+        updated = connection.execute(
+            update(EtlTask)
+            .where(EtlTask.id == task.id, EtlTask.status == "leased", EtlTask.lease_owner == owner)
+            .values(**values)
+        ).rowcount
+        if not updated:
+            raise LeaseLost(f"Task {task.id} is no longer leased by {owner}")
+
+    @staticmethod
+    def _add_tasks(connection: Connection, job_id: int, follow_ups: Iterable[FollowUp]):
+        now = _now()
+        tasks = [
+            {
+                "job_id": job_id, "kind": kind, "priority": TASK_PRIORITIES[kind], "status": "pending",
+                "payload": json.dumps(payload), "records": records, "attempts": 0, "created_at": now,
+            }
+            for kind, payload, records in follow_ups
+        ]
+        if tasks:
+            connection.execute(insert(EtlTask.__table__), tasks)
+
+    @staticmethod
+    def _fail_jobs(connection: Connection):
+        failed_jobs = select(EtlTask.job_id).where(EtlTask.status == "failed")
+        connection.execute(
+            update(EtlJob).where(EtlJob.status == "pending", EtlJob.id.in_(failed_jobs)).values(status="failed", finished_at=_now())
+        )
+
+
+def _now() -> datetime:
+    return datetime.now()
@@ -0,0 +1,112 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import delete, insert
+from sqlalchemy.engine import Connection
+
+from tendara_ai_challenge.etl.dto import RelatedIds
+from tendara_ai_challenge.etl.processor import BatchListener
+from tendara_ai_challenge.matching.bitmap import NoticeBitmapIndex, load_notice_rows
+from tendara_ai_challenge.matching.dto import NoticeModel
+from tendara_ai_challenge.matching.embedding import Embedder
+from tendara_ai_challenge.matching.entity import ProfileMatch
+from tendara_ai_challenge.matching.index import term_frequencies
+from tendara_ai_challenge.matching.percolator import ProfilePercolator
+from tendara_ai_challenge.matching.ranking import Bm25Scorer
+from tendara_ai_challenge.matching.vector_index import VectorIndex
+from tendara_ai_challenge.matching.versions import PROFILES_VERSION_ID, read_version
+
+
+class VectorIndexListener(BatchListener):
+    """Embeds the title and description of every committed notice once and appends it to a `VectorIndex`.
+
+    Updated notices have their vector overwritten instead.
+    """
+
+    def __init__(self, index: VectorIndex, embedder: Embedder):
+        self.index = index
+        self.embedder = embedder
+        self._replaced = np.zeros(0, dtype=np.int64)
+
+    def on_replace(self, connection: Connection, notice_ids: List[int]):
+        self._replaced = np.array(notice_ids, dtype=np.int64)
+
+    def on_commit(self, notice_ids: List[int], notices: List[NoticeModel], related_ids: List[Optional[RelatedIds]]):
+        ids = np.array(notice_ids, dtype=np.int64)
+        vectors = self.embedder.embed([f"{notice.title} {notice.description}" for notice in notices])
+        replaced = np.isin(ids, self._replaced)
+        if replaced.any():
+            self.index.replace(ids[replaced], vectors[replaced])
+        if not replaced.all():
+            self.index.add(ids[~replaced], vectors[~replaced])
+        self._replaced = np.zeros(0, dtype=np.int64)
+
+
+class PercolatorListener(BatchListener):
+    """Matches every new notice against all stored profiles and appends the matches to their inbox.
+
+    Matches are scored with BM25 like those of the matches API, with the corpus statistics including the batch.
+    The inbox entries of an updated notice are replaced by those of its new version. The percolator is built on the first batch, and rebuilt whenever any process changed the profiles since.
+    """
+
+    def __init__(self):
+        self.percolator: Optional[ProfilePercolator] = None
+        self.profiles_version: Optional[int] = None
+
+    def on_replace(self, connection: Connection, notice_ids: List[int]):
+        connection.execute(delete(ProfileMatch.__table__).where(ProfileMatch.__table__.c.notice_id.in_(notice_ids)))
+
+    def on_persist(self, connection: Connection, notice_ids: List[int], notices: List[NoticeModel], related_ids: List[Optional[RelatedIds]]):
+        profiles_version = read_version(connection, PROFILES_VERSION_ID)
+        if self.percolator is None or profiles_version != self.profiles_version:
+            self.percolator = ProfilePercolator.from_database(connection)
+            self.profiles_version = profiles_version
+
+        matches = [
+            (profile_id, notice_id, notice)
+            for notice_id, notice, ids in zip(notice_ids, notices, related_ids) if ids is not None
+            for profile_id, _ in self.percolator.match(notice, ids.categoryIds, ids.locationIds)
+        ]
+        if matches:
+            scores = self._bm25_scores(connection, matches)
+            connection.execute(insert(ProfileMatch.__table__), [
+                {"profile_id": profile_id, "notice_id": notice_id, "match_score": float(score)}
+                for (profile_id, notice_id, _), score in zip(matches, scores)
+            ])
+
+    def _bm25_scores(self, connection: Connection, matches: List[Tuple[int, int, NoticeModel]]) -> np.ndarray:
+        """Scores each (profile id, notice id, notice) match, each match being a document of the scorer."""
+        scorer = Bm25Scorer(connection, {token for profile_id, _, _ in matches for token in self.percolator.tokens[profile_id]})
+        positions = {token: position for position, token in enumerate(scorer.tokens)}
+        frequencies = {notice_id: term_frequencies(notice.title, notice.description) for _, notice_id, notice in matches}
+
+        document_lengths, document_positions, token_positions, tfs = [], [], [], []
+        for match_position, (profile_id, notice_id, _) in enumerate(matches):
+            document_lengths.append(sum(frequencies[notice_id].values()))
+            for token in self.percolator.tokens[profile_id]:
+                if frequencies[notice_id][token]:
+                    document_positions.append(match_position)
+                    token_positions.append(positions[token])
+                    tfs.append(frequencies[notice_id][token])
+        return scorer.score(
+            np.array(document_lengths, dtype=np.float64),
+            np.array(document_positions, dtype=np.int64),
+            np.array(token_positions, dtype=np.int64),
+            np.array(tfs, dtype=np.float64),
+        )
+
+
+class BitmapIndexListener(BatchListener):
+    """Indexes every committed notice, as stored, in a `NoticeBitmapIndex`; updated notices are re-indexed."""
+
+    def __init__(self, index: NoticeBitmapIndex):
+        self.index = index
+        self._pending = None
+
+    def on_persist(self, connection: Connection, notice_ids: List[int], notices: List[NoticeModel], related_ids: List[Optional[RelatedIds]]):
+        self._pending = load_notice_rows(connection, notice_ids)
+
+    def on_commit(self, notice_ids: List[int], notices: List[NoticeModel], related_ids: List[Optional[RelatedIds]]):
+        if self._pending is not None:
+            self.index.add(*self._pending)
+            self._pending = None
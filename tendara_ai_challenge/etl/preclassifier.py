@@ -0,0 +1,161 @@
+import json
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Union
+
+from tendara_ai_challenge.etl.dto import PreClassificationStats, RelatedIds
+from tendara_ai_challenge.etl.processor import Analyzer
+from tendara_ai_challenge.matching.dto import NoticeModel
+from tendara_ai_challenge.matching.entity import Category, Location
+
+# CPV divisions and the names of their categories, shipped with the package.
+DEFAULT_CPV_CATEGORIES = str(Path(__file__).parent.parent / "data" / "cpv_categories.json")
+
+
+def normalize(text: str) -> str:
+    """Case-folds `text`, strips accents and collapses punctuation, so "München " matches "munchen"."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    without_accents = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(re.findall(r"\w+", without_accents.casefold()))
+
+
+class CpvCategoryMapping:
+    """Maps CPV code prefixes to category ids, resolving each code by its longest known prefix."""
+
+    def __init__(self, prefixes: Dict[str, int]):
+        self.prefixes = {prefix.replace("-", ""): category_id for prefix, category_id in prefixes.items()}
+        self.prefix_lengths = sorted({len(prefix) for prefix in self.prefixes}, reverse=True)
+
+    def category_ids(self, cpv_codes: List[str]) -> Set[int]:
+        category_ids = set()
+        for cpv_code in cpv_codes:
+            digits = cpv_code.split("-")[0].strip()
+            for length in self.prefix_lengths:
+                category_id = self.prefixes.get(digits[:length])
+                if category_id is not None:
+                    category_ids.add(category_id)
+                    break
+        return category_ids
+
+
+class CpvCategoryNames:
+    """Maps CPV code prefixes to category names, resolved to the ids of the catalog they are used with."""
+
+    def __init__(self, names: Dict[str, str]):
+        self.names = names
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_CPV_CATEGORIES) -> "CpvCategoryNames":
+        """Reads a JSON object of CPV code prefixes to category names, such as the default file."""
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def mapping(self, categories: List[Category]) -> CpvCategoryMapping:
+        """Returns the mapping to the ids of `categories`; prefixes naming no category are left out."""
+        ids = {normalize(category.name or ""): category.id for category in categories}
+        return CpvCategoryMapping({
+            prefix: ids[normalize(name)] for prefix, name in self.names.items() if normalize(name) in ids
+        })
+
+
+class Gazetteer:
+    """Index of normalized city and "city, country" names to `Location` ids."""
+
+    def __init__(self, locations: List[Location]):
+        self.by_city_and_country: Dict[tuple, Set[int]] = defaultdict(set)
+        self.by_city: Dict[str, Set[int]] = defaultdict(set)
+        for location in locations:
+            city = normalize(location.city or "")
+            country = normalize(location.country or "")
+            self.by_city_and_country[(city, country)].add(location.id)
+            self.by_city[city].add(location.id)
+
+    def location_ids(self, location: str) -> Set[int]:
+        """Returns the ids matching a free-text location such as "Munich, Germany".
+
+        City-and-country matches win: the ids matching a city alone are only returned when there are none.
+        """
+        parts = [normalize(part) for part in location.split(",")]
+        parts = [part for part in parts if part]
+
+        location_ids = set()
+        for city_index, city in enumerate(parts):
+            for country in parts[city_index + 1:]:
+                location_ids |= self.by_city_and_country.get((city, country), set())
+        if location_ids:
+            return location_ids
+
+        for part in parts:
+            location_ids |= self.by_city.get(part, set())
+        return location_ids
+
+
+class RuleBasedAnalyzer(Analyzer):
+    """Classifies notices from their CPV codes and location string, asking `fallback` only when unsure.
+
+    A notice is resolved locally when at least one of its CPV codes maps to a category and its location
+    string maps to exactly one `Location`; everything else (unknown or ambiguous) goes to the fallback analyzer.
+    CPV codes map to category ids, or to category names looked up in the catalog of each call.
+    """
+
+    def __init__(self, fallback: Analyzer, cpv_mapping: Union[CpvCategoryMapping, CpvCategoryNames]):
+        super().__init__(fallback.database)
+        self.fallback = fallback
+        self.cpv_mapping = cpv_mapping
+        self.stats = PreClassificationStats()
+        self._gazetteer: Optional[Gazetteer] = None
+        self._gazetteer_locations: Optional[List[Location]] = None
+        self._mapping: Optional[CpvCategoryMapping] = None
+        self._mapping_categories: Optional[List[Category]] = None
+        self._lock = threading.Lock()
+
+    def fetch_related_ids(self, categories: List[Category], locations: List[Location], notice: NoticeModel) -> Optional[RelatedIds]:
+        return self.fetch_related_ids_batch(categories, locations, [notice])[0]
+
+    def fetch_related_ids_batch(self, categories: List[Category], locations: List[Location], notices: List[NoticeModel]) -> List[Optional[RelatedIds]]:
+        results = [self.classify(categories, locations, notice) for notice in notices]
+        unresolved = [index for index, related_ids in enumerate(results) if related_ids is None]
+        with self._lock:
+            self.stats.notices += len(notices)
+            self.stats.resolved += len(notices) - len(unresolved)
+
+        if unresolved:
+            fetched = self.fallback.fetch_related_ids_batch(categories, locations, [notices[index] for index in unresolved])
+            for index, related_ids in zip(unresolved, fetched):
+                results[index] = related_ids
+        return results
+
+    def classify(self, categories: List[Category], locations: List[Location], notice: NoticeModel) -> Optional[RelatedIds]:
+        """Returns the locally resolved ids of `notice`, or None if the rules cannot decide."""
+        category_ids = self._mapping_for(categories).category_ids(notice.cpv_codes)
+        if not category_ids:
+            return None
+        location_ids = self._gazetteer_for(locations).location_ids(notice.location)
+        if len(location_ids) != 1:
+            return None
+        return RelatedIds(categoryIds=sorted(category_ids), locationIds=sorted(location_ids))
+
+    def estimate_tokens(self, categories: List[Category], locations: List[Location], notices: List[NoticeModel]) -> int:
+        return self.fallback.estimate_tokens(categories, locations, notices)
+
+    def fingerprint(self) -> str:
+        return f"{type(self).__name__}:{self.fallback.fingerprint()}"
+
+    def _mapping_for(self, categories: List[Category]) -> CpvCategoryMapping:
+        if isinstance(self.cpv_mapping, CpvCategoryMapping):
+            return self.cpv_mapping
+        with self._lock:
+            if self._mapping is None or self._mapping_categories is not categories:
+                self._mapping = self.cpv_mapping.mapping(categories)
+                self._mapping_categories = categories
+            return self._mapping
+
+    def _gazetteer_for(self, locations: List[Location]) -> Gazetteer:
+        with self._lock:
+            if self._gazetteer is None or self._gazetteer_locations is not locations:
+                self._gazetteer = Gazetteer(locations)
+                self._gazetteer_locations = locations
+            return self._gazetteer
@@ -1,17 +1,29 @@
 import logging
-import os
+import time
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from functools import lru_cache
+from itertools import islice
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from dotenv import load_dotenv
-from openai import OpenAI
+from sqlalchemy import delete, insert
+from sqlalchemy.engine import Connection
+from sqlmodel import select
 
-from tendara_ai_challenge.etl.dto import RelatedIds
-from tendara_ai_challenge.matching.entity import Category, Notice, NoticeCategory, Location, NoticeLocation
+from tendara_ai_challenge.etl.dto import ProcessingStats, RelatedIds
+from tendara_ai_challenge.etl.identity import notice_content_hash, notice_external_id
+from tendara_ai_challenge.etl.instrumentation import ETL_BATCH_SECONDS, ETL_RECORDS, LLM_REQUEST_SECONDS, LLM_TOKENS
+from tendara_ai_challenge.etl.transformer import batched
+from tendara_ai_challenge.matching.entity import (
+    Category, Location, Notice, NoticeCategory, NoticeLocation, SourceWatermark
+)
 from tendara_ai_challenge.matching.dto import NoticeModel
+from tendara_ai_challenge.matching.index import add_to_index, remove_from_index, term_frequencies, token_postings
+from tendara_ai_challenge.matching.tokenizer import join_tags
+from tendara_ai_challenge.matching.versions import CORPUS_VERSION_ID, bump_version
+from tendara_ai_challenge.settings import get_settings
 
-load_dotenv()
-os.environ['OPENAI_API_KEY'] = os.getenv('OPENAI_API_KEY')
+if TYPE_CHECKING:
+    from openai import OpenAI
 
 
 class Analyzer(ABC):
@@ -23,9 +35,22 @@ class Analyzer(ABC):
     def fetch_related_ids(self, categories: List[Category], locations: List[Location], notice: NoticeModel) -> Optional[RelatedIds]:
         pass
 
+    def fetch_related_ids_batch(self, categories: List[Category], locations: List[Location], notices: List[NoticeModel]) -> List[Optional[RelatedIds]]:
+        """Classifies several notices, returning their related ids in the same order as `notices`."""
+        return [self.fetch_related_ids(categories, locations, notice) for notice in notices]
+
+    def estimate_tokens(self, categories: List[Category], locations: List[Location], notices: List[NoticeModel]) -> int:
+        """Roughly estimates the prompt tokens needed to classify `notices`, at ~4 characters per token."""
+        catalog_size = len(repr(categories)) + len(repr(locations))
+        text_size = sum(len(notice.title) + len(notice.description) for notice in notices)
+        return (catalog_size * len(notices) + text_size) // 4
+
+    def fingerprint(self) -> str:
+        """Identifies the model and prompt behind the analysis, so cached results can be told apart."""
+        return type(self).__name__
+
 
 class OpenAIAnalyzer(Analyzer):
-    client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
     prompt = """
     Given the following notice, predict the category (ies) and location(s) that best match the notice:
     Categories: %s
@@ -34,15 +59,37 @@ class OpenAIAnalyzer(Analyzer):
     return the ids of the categories and locations that best match the notice.
     """
 
+    def __init__(self, database, client: Optional["OpenAI"] = None, model: str = "gpt-4o-mini"):
+        super().__init__(database)
+        self._client = client
+        self.model = model
+
+    @property
+    def client(self) -> "OpenAI":
+        """The given client, or else the shared one configured by the settings."""
+        return self._client or get_openai_client()
+
+    def fingerprint(self) -> str:
+        return f"{type(self).__name__}:{self.model}:{self.prompt}"
+
+    def parse(self, content: str, response_format: type):
+        """Sends one structured-output request, recording its latency and token usage."""
+        with LLM_REQUEST_SECONDS.time(model=self.model):
+            response = self.client.beta.chat.completions.parse(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": "You are a helpful assistant."},
+                    {"role": "user", "content": content}
+                ],
+                response_format=response_format
+            )
+        if response.usage is not None:
+            LLM_TOKENS.inc(response.usage.prompt_tokens, model=self.model, kind="prompt")
+            LLM_TOKENS.inc(response.usage.completion_tokens, model=self.model, kind="completion")
+        return response
+
     def fetch_related_ids(self, categories: List[Category], locations: List[Location], notice: NoticeModel) -> Optional[RelatedIds]:
-        response = self.client.beta.chat.completions.parse(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": self.prompt % (categories, locations, notice.description + " " + notice.title)}
-            ],
-            response_format=RelatedIds
-        )
+        response = self.parse(self.prompt % (categories, locations, notice.description + " " + notice.title), RelatedIds)
         analysis_result_message = response.choices[0].message
         if not analysis_result_message.refusal:
             logging.info("AI provided the analysis, returning the ids %s", analysis_result_message.parsed)
@@ -52,44 +99,239 @@ class OpenAIAnalyzer(Analyzer):
         return None
 
 
+@lru_cache
+def get_openai_client() -> "OpenAI":
+    """Creates the OpenAI client on first use, so that importing the ETL neither loads nor configures it."""
+    from openai import OpenAI
+    return OpenAI(api_key=get_settings().openai_api_key)
+
+
+class BatchListener(ABC):
+    """Extension point notified of every batch persisted by `DataProcessorService`."""
+
+    def on_replace(self, connection: Connection, notice_ids: List[int]):
+        """Called inside the batch transaction, before `on_persist`, with the ids of the stored notices the batch
+        updates in place; their ids come again in `on_persist` and `on_commit`, so stale entries must be dropped."""
+        pass
+
+    def on_persist(self, connection: Connection, notice_ids: List[int], notices: List[NoticeModel], related_ids: List[Optional[RelatedIds]]):
+        """Called inside the batch transaction, after the notices got their ids and before the commit."""
+        pass
+
+    def on_commit(self, notice_ids: List[int], notices: List[NoticeModel], related_ids: List[Optional[RelatedIds]]):
+        """Called once the batch is committed."""
+        pass
+
+
 class DataProcessorService:
 
-    def __init__(self, analyzer: Analyzer):
+    def __init__(
+            self,
+            analyzer: Analyzer,
+            batch_size: int = 1,
+            listeners: Optional[List[BatchListener]] = None,
+            incremental: bool = False,
+    ):
+        """With `incremental`, notices already stored unchanged are skipped before classification and
+        changed notices are updated in place; otherwise every notice is inserted as a new one."""
+        if batch_size < 1:
+            raise ValueError("batch_size must be a positive integer")
         self.analyzer = analyzer
+        self.batch_size = batch_size
+        self.listeners = listeners or []
+        self.incremental = incremental
+        self.stats = ProcessingStats()
+
+    def process(self, notices: Iterable[NoticeModel], source: Optional[str] = None, resume: bool = False) -> List[Notice]:
+        return list(self.process_stream(notices, source, resume))
+
+    def process_stream(self, notices: Iterable[NoticeModel], source: Optional[str] = None, resume: bool = False) -> Iterator[Notice]:
+        """Persists the notices as they are consumed from `notices`, yielding each stored entity.
+
+        Notices are grouped in batches of `batch_size`, each persisted in a single transaction.
+        Nothing is accumulated beyond the current batch, so a streamed input is processed with flat memory usage.
+
+        When `source` names the input, its `SourceWatermark` is advanced in the transaction of every batch.
+        With `resume`, the records consumed by previous runs of an append-only source are skipped unread.
+        """
+        database = self.analyzer.database
+        categories = database.query(Category).all()
+        locations = database.query(Location).all()
+        self.stats = ProcessingStats()
+
+        watermark = None
+        records = iter(notices)
+        if source is not None:
+            watermark = database.get(SourceWatermark, source) or SourceWatermark(source=source)
+            if resume:
+                self.stats.skipped += sum(1 for _ in islice(records, watermark.offset))
+            else:
+                watermark.offset = 0
+
+        for batch in batched(records, self.batch_size):
+            if watermark is not None:
+                watermark.offset += len(batch)
+                latest = max(notice.publication_deadline for notice in batch)
+                watermark.last_publication = max(watermark.last_publication or latest, latest)
+
+            existing_ids = None
+            if self.incremental:
+                batch, existing_ids = self.changed_notices(batch)
+
+            if batch:
+                with ETL_BATCH_SECONDS.time(stage="analyze"):
+                    related_ids = self.analyzer.fetch_related_ids_batch(categories, locations, batch)
+                ETL_RECORDS.inc(len(batch), stage="analyze")
+                yield from self.persist_batch(batch, related_ids, existing_ids, watermark)
+            elif watermark is not None:
+                database.merge(watermark)
+                database.commit()
 
-    def process(self, notices: List[NoticeModel]) -> List[Notice]:
-        categories = self.analyzer.database.query(Category).all()
-        locations = self.analyzer.database.query(Location).all()
-        notice_entities = []
-
-        for notice in notices:
-            related_ids: Optional[RelatedIds] = self.analyzer.fetch_related_ids(categories, locations, notice)
-            notice_entity = Notice(
-                title=notice.title,
-                description=notice.description,
-                location=notice.location,
-                buyer=notice.buyer,
-                volume=notice.volume,
-                publication_deadline=notice.publication_deadline,
-                submission_deadline=notice.submission_deadline
+        logging.info(
+            "Persisted %d notices (%d new, %d changed, %d skipped; %d rows) in %d batches at %.1f rows/sec",
+            self.stats.notices, self.stats.new, self.stats.changed, self.stats.skipped,
+            self.stats.rows, self.stats.batches, self.stats.rows_per_second
+        )
+
+    def changed_notices(self, notices: List[NoticeModel]) -> Tuple[List[NoticeModel], List[Optional[int]]]:
+        """Drops the notices stored with the same content, returning the others with the id of their stored version.
+
+        Within the batch, only the last occurrence of a notice is kept. Notices stored before notices had an
+        external id are recognized by their buyer, title and publication date, and updated once to get one.
+        """
+        latest: Dict[str, NoticeModel] = {notice_external_id(notice): notice for notice in notices}
+        stored = {
+            external_id: (notice_id, content_hash)
+            for external_id, notice_id, content_hash in self.analyzer.database.exec(
+                select(Notice.external_id, Notice.id, Notice.content_hash).where(Notice.external_id.in_(latest))
             )
+        }
+        stored.update(self._legacy_notices({
+            external_id: notice for external_id, notice in latest.items() if external_id not in stored
+        }))
+
+        changed, existing_ids = [], []
+        for external_id, notice in latest.items():
+            notice_id, content_hash = stored.get(external_id, (None, None))
+            if notice_id is not None and content_hash == notice_content_hash(notice):
+                continue
+            changed.append(notice)
+            existing_ids.append(notice_id)
+
+        self.stats.skipped += len(notices) - len(changed)
+        return changed, existing_ids
+
+    def _legacy_notices(self, notices: Dict[str, NoticeModel]) -> Dict[str, Tuple[int, None]]:
+        """Finds the stored notices without an external id that have the buyer, title and publication date of `notices`."""
+        if not notices:
+            return {}
+        by_natural_key = {
+            (notice.buyer, notice.title, notice.publication_deadline.date()): external_id
+            for external_id, notice in notices.items()
+        }
+        legacy = {}
+        for notice_id, buyer, title, publication_deadline in self.analyzer.database.exec(
+            select(Notice.id, Notice.buyer, Notice.title, Notice.publication_deadline)
+            .where(Notice.external_id.is_(None), Notice.title.in_({notice.title for notice in notices.values()}))
+            .order_by(Notice.id)
+        ):
+            external_id = by_natural_key.get((buyer, title, publication_deadline))
+            # Duplicates stored by earlier runs are left alone: only the first one is updated.
+            if external_id is not None and external_id not in legacy:
+                legacy[external_id] = (notice_id, None)
+        return legacy
+
+    def persist_batch(
+            self,
+            notices: List[NoticeModel],
+            related_ids: List[Optional[RelatedIds]],
+            existing_ids: Optional[List[Optional[int]]] = None,
+            watermark: Optional[SourceWatermark] = None,
+    ) -> List[Notice]:
+        """Stores the notices and their category/location links in one transaction.
+
+        Notices with an id in `existing_ids` replace their stored version, links and postings included.
+        The link rows and the postings and statistics of the inverted index are bulk-inserted;
+        if anything fails the whole batch is rolled back and the error re-raised.
+        """
+        database = self.analyzer.database
+        started = time.perf_counter()
+        existing_ids = existing_ids or [None] * len(notices)
+        replaced_ids = [notice_id for notice_id in existing_ids if notice_id is not None]
+        notice_frequencies = [term_frequencies(notice.title, notice.description) for notice in notices]
+
+        try:
+            # Stamps the notices, so processes indexing them by id also find the ones updated in place.
+            corpus_version = bump_version(database.connection(), CORPUS_VERSION_ID)
+            stored = {}
+            if replaced_ids:
+                stored = {notice.id: notice for notice in database.exec(select(Notice).where(Notice.id.in_(replaced_ids)))}
+            notice_entities = []
+            for notice, frequencies, notice_id in zip(notices, notice_frequencies, existing_ids):
+                notice_entity = stored.get(notice_id) or Notice()
+                notice_entity.title = notice.title
+                notice_entity.description = notice.description
+                notice_entity.buyer = notice.buyer
+                notice_entity.volume = notice.volume
+                notice_entity.publication_deadline = notice.publication_deadline
+                notice_entity.submission_deadline = notice.submission_deadline
+                notice_entity.token_count = sum(frequencies.values())
+                notice_entity.external_id = notice_external_id(notice)
+                notice_entity.content_hash = notice_content_hash(notice)
+                notice_entity.cpv_codes = join_tags(notice.cpv_codes)
+                notice_entity.corpus_version = corpus_version
+                notice_entities.append(notice_entity)
 
-            self.analyzer.database.add(notice_entity)
-            self.analyzer.database.commit()
+            database.add_all(notice_entities)
+            database.flush()
 
-            if related_ids is not None:
-                for category_id in related_ids.categoryIds:
-                    notice_category = NoticeCategory(notice_id=notice_entity.id, category_id=category_id)
-                    notice_entity.categories.append(notice_category)
-                    self.analyzer.database.add(notice_category)
-                    self.analyzer.database.commit()
+            notice_categories = [
+                {"notice_id": notice_entity.id, "category_id": category_id}
+                for notice_entity, ids in zip(notice_entities, related_ids) if ids is not None
+                for category_id in ids.categoryIds
+            ]
+            notice_locations = [
+                {"notice_id": notice_entity.id, "location_id": location_id}
+                for notice_entity, ids in zip(notice_entities, related_ids) if ids is not None
+                for location_id in ids.locationIds
+            ]
+            notice_tokens = [
+                posting
+                for notice_entity, frequencies in zip(notice_entities, notice_frequencies)
+                for posting in token_postings(notice_entity.id, frequencies)
+            ]
+            connection = database.connection()
+            if replaced_ids:
+                connection.execute(delete(NoticeCategory.__table__).where(NoticeCategory.__table__.c.notice_id.in_(replaced_ids)))
+                connection.execute(delete(NoticeLocation.__table__).where(NoticeLocation.__table__.c.notice_id.in_(replaced_ids)))
+                remove_from_index(connection, replaced_ids)
+            if notice_categories:
+                connection.execute(insert(NoticeCategory.__table__), notice_categories)
+            if notice_locations:
+                connection.execute(insert(NoticeLocation.__table__), notice_locations)
+            add_to_index(connection, notice_tokens, sum(entity.token_count for entity in notice_entities))
+            notice_ids = [notice_entity.id for notice_entity in notice_entities]
+            for listener in self.listeners:
+                if replaced_ids:
+                    listener.on_replace(connection, replaced_ids)
+                listener.on_persist(connection, notice_ids, notices, related_ids)
+            if watermark is not None:
+                database.merge(watermark)
 
-                for location_id in related_ids.locationIds:
-                    notice_location = NoticeLocation(notice_id=notice_entity.id, location_id=location_id)
-                    notice_entity.locations.append(notice_location)
-                    self.analyzer.database.add(notice_location)
-                    self.analyzer.database.commit()
+            database.commit()
+        except Exception:
+            database.rollback()
+            raise
 
-            notice_entities.append(notice_entity)
+        for listener in self.listeners:
+            listener.on_commit(notice_ids, notices, related_ids)
 
+        self.stats.notices += len(notice_entities)
+        self.stats.changed += len(replaced_ids)
+        self.stats.new += len(notice_entities) - len(replaced_ids)
+        self.stats.rows += len(notice_entities) + len(notice_categories) + len(notice_locations) + len(notice_tokens)
+        self.stats.batches += 1
+        self.stats.seconds += time.perf_counter() - started
+        ETL_BATCH_SECONDS.observe(time.perf_counter() - started, stage="persist")
+        ETL_RECORDS.inc(len(notice_entities), stage="persist")
         return notice_entities
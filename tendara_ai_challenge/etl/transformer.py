@@ -1,8 +1,19 @@
+import json
+import logging
+import os
+import time
 from abc import ABC, abstractmethod
-from datetime import datetime
-from typing import List
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple
 
+from pydantic import ValidationError
+
+from tendara_ai_challenge.etl.dto import TransformStats
+from tendara_ai_challenge.etl.instrumentation import ETL_BATCH_SECONDS, ETL_RECORD_SECONDS, ETL_RECORDS
 from tendara_ai_challenge.matching.dto import NoticeModel
+from tendara_ai_challenge.metrics import timed_stream
 
 
 class DataTransformStrategy(ABC):
@@ -10,16 +21,110 @@ class DataTransformStrategy(ABC):
     def transform(self, data: List[dict]) -> List[NoticeModel]:
         pass
 
+    def transform_stream(self, data: Iterable[dict]) -> Iterator[NoticeModel]:
+        """Lazily transforms the records of `data`, one notice at a time."""
+        for notice_data in data:
+            yield from self.transform([notice_data])
+
 
 class JSONDataTransformStrategy(DataTransformStrategy):
     def transform(self, data: List[dict]) -> List[NoticeModel]:
-        notices = []
+        return list(self.transform_stream(data))
+
+    def transform_stream(self, data: Iterable[dict]) -> Iterator[NoticeModel]:
         for notice_data in data:
-            notice = NoticeModel(**notice_data)
-            notice.publication_deadline = datetime.fromisoformat(notice_data["publication_deadline"])
-            notice.submission_deadline = datetime.fromisoformat(notice_data["submission_deadline"])
-            notices.append(notice)
-        return notices
+            yield NoticeModel.model_validate(notice_data)
+
+
+class ParallelJSONDataTransformStrategy(DataTransformStrategy):
+    """Validates records in chunks on a process pool, quarantining the invalid ones instead of failing.
+
+    Each record is validated once by `NoticeModel.model_validate`. Rejected records are appended to the
+    NDJSON file at `quarantine_path` (if given) with the reason of the rejection. Notices keep the
+    order of the input, and at most two chunks per process are in flight, so streams stay streams.
+    """
+
+    def __init__(self, processes: Optional[int] = None, chunk_size: int = 1000, quarantine_path: Optional[str] = None):
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be a positive integer")
+        self.processes = processes or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.quarantine_path = quarantine_path
+        self.stats = TransformStats()
+
+    def transform(self, data: List[dict]) -> List[NoticeModel]:
+        return list(self.transform_stream(data))
+
+    def transform_stream(self, data: Iterable[dict]) -> Iterator[NoticeModel]:
+        self.stats = TransformStats()
+        chunks = self._validated_chunks(batched(data, self.chunk_size))
+        while True:
+            # Only the transform itself is timed, not the consumer of the notices.
+            started = time.perf_counter()
+            validated = next(chunks, None)
+            if validated is None:
+                break
+            notices, rejects = validated
+            quarantine(rejects, self.quarantine_path)
+            self.stats.records += len(notices) + len(rejects)
+            self.stats.rejected += len(rejects)
+            self.stats.seconds += time.perf_counter() - started
+            yield from notices
+
+        logging.info(
+            "Transformed %d records at %.1f records/sec, rejecting %.2f%%",
+            self.stats.records, self.stats.records_per_second, 100 * self.stats.reject_rate
+        )
+
+    def _validated_chunks(self, chunks: Iterator[list]) -> Iterator[Tuple[List[NoticeModel], List[Tuple[object, str]]]]:
+        if self.processes == 1:
+            yield from map(validate_records, chunks)
+            return
+
+        with ProcessPoolExecutor(max_workers=self.processes) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(validate_records, chunk))
+                if len(pending) >= 2 * self.processes:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+
+def quarantine(rejects: List[Tuple[object, str]], path: Optional[str]):
+    """Logs rejected records and appends them, with the reason of their rejection, to the NDJSON file at `path` (if given).
+
+    The records are appended in a single write, so that the processes sharing the file do not interleave their lines.
+    """
+    if not rejects:
+        return
+    logging.warning("Quarantined %d invalid records", len(rejects))
+    if path is None:
+        return
+    lines = "".join(json.dumps({"reason": reason, "record": record}, default=str) + "\n" for record, reason in rejects)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(lines)
+
+
+def validate_records(records: List[object]) -> Tuple[List[NoticeModel], List[Tuple[object, str]]]:
+    """Splits records into valid notices and rejected records with the reason of their rejection."""
+    notices, rejects = [], []
+    for record in records:
+        try:
+            notices.append(NoticeModel.model_validate(record))
+        except ValidationError as error:
+            reason = "; ".join(
+                f"{'.'.join(str(part) for part in detail['loc']) or 'record'}: {detail['msg']}" for detail in error.errors()
+            )
+            rejects.append((record, reason))
+    return notices, rejects
+
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    """Yields lists of `size` consecutive items, the last one possibly shorter, consuming `items` lazily."""
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
 
 
 class DataTransformService:
@@ -27,4 +132,10 @@ class DataTransformService:
         self.strategy = strategy
 
     def transform_data(self, data: List[dict]) -> List[NoticeModel]:
-        return self.strategy.transform(data)
+        with ETL_BATCH_SECONDS.time(stage="transform"):
+            notices = self.strategy.transform(data)
+        ETL_RECORDS.inc(len(notices), stage="transform")
+        return notices
+
+    def transform_stream(self, data: Iterable[dict]) -> Iterator[NoticeModel]:
+        return timed_stream(self.strategy.transform_stream, data, ETL_RECORD_SECONDS, ETL_RECORDS, stage="transform")
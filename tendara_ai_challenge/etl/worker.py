@@ -0,0 +1,410 @@
+import argparse
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import time
+from datetime import datetime
+from itertools import islice
+from typing import Callable, List, Optional, Sequence
+
+from pydantic import BaseModel
+from sqlalchemy.engine import Connection
+from sqlmodel import Session
+
+from tendara_ai_challenge.etl.cache import AnalysisCache, CachedAnalyzer
+from tendara_ai_challenge.etl.concurrency import ConcurrentAnalyzer, RateLimiter
+from tendara_ai_challenge.etl.dto import RelatedIds
+from tendara_ai_challenge.etl.extractor import (
+    APIDataExtractStrategy, DataExtractService, DataExtractStrategy, StreamingJSONDataExtractStrategy
+)
+from tendara_ai_challenge.etl.identity import notice_external_id
+from tendara_ai_challenge.etl.instrumentation import ETL_BATCH_SECONDS, ETL_RECORDS
+from tendara_ai_challenge.etl.jobs import JobQueue, LeaseLost
+from tendara_ai_challenge.etl.preclassifier import DEFAULT_CPV_CATEGORIES, CpvCategoryNames, RuleBasedAnalyzer
+from tendara_ai_challenge.etl.processor import Analyzer, BatchListener, DataProcessorService
+from tendara_ai_challenge.etl.transformer import quarantine, validate_records
+from tendara_ai_challenge.matching.database import begin_immediate, create_db_engine
+from tendara_ai_challenge.matching.dto import NoticeModel
+from tendara_ai_challenge.matching.entity import Category, EtlJob, EtlTask, Location, create_db_and_tables
+from tendara_ai_challenge.metrics import metrics, serve_metrics
+from tendara_ai_challenge.settings import get_settings
+
+DEFAULT_ANALYZER = "tendara_ai_challenge.etl.processor:OpenAIAnalyzer"
+# Fills the inboxes of the stored profiles with the notices the workers store.
+DEFAULT_LISTENERS = ("tendara_ai_challenge.etl.listeners:PercolatorListener",)
+
+
+class AnalyzerConfig(BaseModel):
+    """The analyzer of the workers: an `analyzer` class, given as `module:Class` and created with the task's
+    session, and the wrappers `build_analyzer` composes around it."""
+
+    cpv_categories: Optional[str] = DEFAULT_CPV_CATEGORIES
+    """JSON file of CPV code prefixes to category names, with which a `RuleBasedAnalyzer` classifies the notices
+    it can before asking the other analyzers; every notice goes to them without it."""
+    analyzer: str = DEFAULT_ANALYZER
+    notices_per_request: Optional[int] = None
+    """Passed to an analyzer classifying several notices per LLM request, such as `BatchOpenAIAnalyzer`."""
+    concurrency: Optional[int] = None
+    """Number of concurrent analyzer calls per task, through a `ConcurrentAnalyzer`."""
+    requests_per_minute: Optional[int] = None
+    tokens_per_minute: Optional[int] = None
+    """Quotas of the analyzer calls of a worker process, shared by its tasks."""
+    cache_path: Optional[str] = None
+    """SQLite file of an `AnalysisCache` shared by the workers, so notices analyzed before skip the analyzer."""
+
+    @property
+    def notices_per_round(self) -> int:
+        """Notices analyzed by one round of concurrent requests, between which a classify task renews its lease."""
+        return (self.notices_per_request or 1) * (self.concurrency or 1)
+
+
+class EtlWorker:
+    """Runs the tasks leased from a `JobQueue`, one at a time.
+
+    An extract task streams its source from its checkpointed offset, queueing a classify task per chunk
+    of valid notices; invalid records are appended to the NDJSON file at `quarantine_path` (if given).
+    A classify task analyzes its notices `classify_batch_size` at a time (all at once without it), checkpointing
+    the analyses made so far after each batch, and queues their persist task. A persist task stores its notices
+    and completes in the same transaction, so a chunk is never persisted twice.
+    """
+
+    def __init__(
+            self,
+            queue: JobQueue,
+            analyzer_factory: Callable[[Session], Analyzer],
+            name: Optional[str] = None,
+            listeners: Optional[List[BatchListener]] = None,
+            poll_seconds: float = 1.0,
+            quarantine_path: Optional[str] = None,
+            classify_batch_size: Optional[int] = None,
+    ):
+        self.queue = queue
+        self.analyzer_factory = analyzer_factory
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.listeners = listeners or []
+        self.poll_seconds = poll_seconds
+        self.quarantine_path = quarantine_path
+        self.classify_batch_size = classify_batch_size
+        self.handlers = {"extract": self._extract, "classify": self._classify, "persist": self._persist}
+
+    def run(self, until_empty: bool = False, max_tasks: Optional[int] = None) -> int:
+        """Runs tasks until `max_tasks` ran or, with `until_empty`, no task is left; returns the number of tasks run."""
+        ran = 0
+        while max_tasks is None or ran < max_tasks:
+            task = self.queue.lease(self.name)
+            if task is None:
+                if until_empty and self.queue.is_idle():
+                    break
+                time.sleep(self.poll_seconds)
+                continue
+            self.run_task(task)
+            ran += 1
+        return ran
+
+    def run_task(self, task: EtlTask):
+        """Runs a leased task, scheduling its retry if it fails."""
+        try:
+            with Session(self.queue.engine) as db:
+                job = db.get(EtlJob, task.job_id)
+                self.handlers[task.kind](db, job, task, json.loads(task.payload))
+        except LeaseLost as error:
+            logging.warning("Dropped task %d: %s", task.id, error)
+        except Exception as error:
+            logging.exception("Task %d (%s of job %d) failed on attempt %d", task.id, task.kind, task.job_id, task.attempts)
+            self.queue.fail(task, self.name, f"{type(error).__name__}: {error}")
+
+    def _extract(self, db: Session, job: EtlJob, task: EtlTask, payload: dict):
+        offset = payload["offset"]
+        records = islice(DataExtractService(_extract_strategy(job.source)).stream(job.source), offset, None)
+        while chunk := list(islice(records, job.chunk_size)):
+            notices, rejects = validate_records(chunk)
+            ETL_RECORDS.inc(len(notices), stage="transform")
+            # Written before the checkpoint, so a chunk extracted again after a crash may be quarantined twice.
+            quarantine(rejects, self.quarantine_path)
+            offset += len(chunk)
+            follow_ups = [("classify", {"notices": _dump(notices)}, len(notices))] if notices else []
+            self.queue.checkpoint(db.connection(), task, self.name, {"offset": offset}, follow_ups)
+            db.commit()
+        self.queue.complete(db.connection(), task, self.name, records=offset)
+        db.commit()
+
+    def _classify(self, db: Session, job: EtlJob, task: EtlTask, payload: dict):
+        notices = [NoticeModel.model_validate(notice) for notice in payload["notices"]]
+        analyzer = self.analyzer_factory(db)
+        # Resumed tasks continue after the analyses of their last checkpoint, of notices already filtered.
+        related_ids = payload.get("related_ids")
+        if related_ids is None:
+            related_ids = []
+            if job.incremental:
+                notices, _ = DataProcessorService(analyzer).changed_notices(notices)
+
+        follow_ups = []
+        if notices:
+            categories = db.query(Category).all()
+            locations = db.query(Location).all()
+            batch_size = self.classify_batch_size or len(notices)
+            for start in range(len(related_ids), len(notices), batch_size):
+                batch = notices[start:start + batch_size]
+                with ETL_BATCH_SECONDS.time(stage="analyze"):
+                    analyzed = analyzer.fetch_related_ids_batch(categories, locations, batch)
+                ETL_RECORDS.inc(len(batch), stage="analyze")
+                related_ids += [ids.model_dump() if ids else None for ids in analyzed]
+                if len(related_ids) < len(notices):
+                    # Renews the lease, which a task analyzing all its notices in one go could outlive.
+                    self.queue.checkpoint(db.connection(), task, self.name, {"notices": _dump(notices), "related_ids": related_ids})
+                    db.commit()
+            follow_ups.append(("persist", {"notices": _dump(notices), "related_ids": related_ids}, len(notices)))
+        self.queue.complete(db.connection(), task, self.name, records=len(notices), follow_ups=follow_ups)
+        db.commit()
+
+    def _persist(self, db: Session, job: EtlJob, task: EtlTask, payload: dict):
+        notices = [NoticeModel.model_validate(notice) for notice in payload["notices"]]
+        related_ids = [RelatedIds.model_validate(ids) if ids else None for ids in payload["related_ids"]]
+        processor = DataProcessorService(
+            self.analyzer_factory(db), listeners=[_TaskCompletion(self.queue, task, self.name), *self.listeners]
+        )
+
+        existing_ids = None
+        if job.incremental:
+            # Resolved again here, as another chunk may have stored the same notices since the classification;
+            # under the write lock, so no other worker stores them between this check and the commit.
+            begin_immediate(db)
+            classified = {notice_external_id(notice): ids for notice, ids in zip(notices, related_ids)}
+            notices, existing_ids = processor.changed_notices(notices)
+            related_ids = [classified[notice_external_id(notice)] for notice in notices]
+
+        if notices:
+            processor.persist_batch(notices, related_ids, existing_ids)
+        else:
+            self.queue.complete(db.connection(), task, self.name)
+            db.commit()
+
+
+class _TaskCompletion(BatchListener):
+    """Completes a persist task in the transaction storing its notices."""
+
+    def __init__(self, queue: JobQueue, task: EtlTask, owner: str):
+        self.queue = queue
+        self.task = task
+        self.owner = owner
+
+    def on_persist(self, connection: Connection, notice_ids, notices, related_ids):
+        self.queue.complete(connection, self.task, self.owner, records=len(notice_ids))
+
+
+def _extract_strategy(source: str) -> DataExtractStrategy:
+    if source.startswith(("http://", "https://")):
+        return APIDataExtractStrategy()
+    return StreamingJSONDataExtractStrategy()
+
+
+def _dump(notices: List[NoticeModel]) -> List[dict]:
+    return [notice.model_dump(mode="json") for notice in notices]
+
+
+def load_analyzer(path: str) -> Callable[[Session], Analyzer]:
+    """Resolves an analyzer class from its `module:Class` path."""
+    return _load_class(path)
+
+
+def build_analyzer(config: AnalyzerConfig) -> Callable[[Session], Analyzer]:
+    """Returns the factory of the analyzer described by `config`.
+
+    The rate limiter and the cache are created here, once per worker, so that they hold across tasks.
+    With quotas but no `concurrency`, the calls are throttled one at a time; each concurrent call classifies
+    `notices_per_request` notices, i.e. one request. Cache hits skip the throttled calls.
+    """
+    analyzer_class = load_analyzer(config.analyzer)
+    rate_limiter = None
+    if config.requests_per_minute is not None or config.tokens_per_minute is not None:
+        rate_limiter = RateLimiter(config.requests_per_minute, config.tokens_per_minute)
+    cache = AnalysisCache(config.cache_path) if config.cache_path else None
+    cpv_names = CpvCategoryNames.load(config.cpv_categories) if config.cpv_categories else None
+    options = {"notices_per_request": config.notices_per_request} if config.notices_per_request else {}
+
+    def create(database: Session) -> Analyzer:
+        analyzer = analyzer_class(database, **options)
+        if config.concurrency or rate_limiter is not None:
+            analyzer = ConcurrentAnalyzer(
+                analyzer,
+                max_workers=config.concurrency or 1,
+                chunk_size=config.notices_per_request or 1,
+                rate_limiter=rate_limiter,
+            )
+        if cache is not None:
+            analyzer = CachedAnalyzer(analyzer, cache)
+        if cpv_names is not None:
+            analyzer = RuleBasedAnalyzer(analyzer, cpv_names)
+        return analyzer
+
+    return create
+
+
+def load_listener(path: str) -> BatchListener:
+    """Creates a listener from the `module:Class` path of a class taking no arguments."""
+    return _load_class(path)()
+
+
+def _load_class(path: str) -> type:
+    module, _, name = path.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def run_workers(
+        processes: int,
+        database_url: str,
+        analyzer: Optional[AnalyzerConfig] = None,
+        lease_seconds: float = 300.0,
+        until_empty: bool = False,
+        metrics_port: Optional[int] = None,
+        listeners: Sequence[str] = DEFAULT_LISTENERS,
+        quarantine_path: Optional[str] = None,
+):
+    """Runs `processes` workers, each in its own process with its own engine, until they all exit.
+
+    Every worker builds its own analyzer from `analyzer`, the default `AnalyzerConfig` without it,
+    and creates its own `listeners`, given as `module:Class` paths; they all append to `quarantine_path`.
+    With `metrics_port`, the worker `i` serves its metrics on port `metrics_port + i`.
+    """
+    arguments = (
+        database_url, analyzer or AnalyzerConfig(), lease_seconds, until_empty, metrics_port, tuple(listeners), quarantine_path
+    )
+    if processes == 1:
+        _work(*arguments, 0)
+        return
+
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=_work, args=(*arguments, index), name=f"etl-worker-{index}")
+        for index in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    failed = [worker.name for worker in workers if worker.exitcode != 0]
+    if failed:
+        raise RuntimeError(f"ETL workers exited with an error: {', '.join(failed)}")
+
+
+def _work(
+        database_url: str,
+        analyzer: AnalyzerConfig,
+        lease_seconds: float,
+        until_empty: bool,
+        metrics_port: Optional[int],
+        listeners: Sequence[str],
+        quarantine_path: Optional[str],
+        index: int,
+):
+    logging.basicConfig(level=logging.INFO)
+    # A spawned process starts with a disabled registry, whatever its parent enabled.
+    metrics.enabled = get_settings().metrics_enabled
+    server = serve_metrics(metrics_port + index, metrics) if metrics.enabled and metrics_port is not None else None
+    engine = create_db_engine(database_url)
+    try:
+        queue = JobQueue(engine, lease_seconds=lease_seconds)
+        worker = EtlWorker(
+            queue,
+            build_analyzer(analyzer),
+            name=f"{socket.gethostname()}:{os.getpid()}:{index}",
+            listeners=[load_listener(listener) for listener in listeners],
+            quarantine_path=quarantine_path,
+            classify_batch_size=analyzer.notices_per_round,
+        )
+        ran = worker.run(until_empty=until_empty)
+        logging.info("Worker %s ran %d tasks", worker.name, ran)
+    finally:
+        engine.dispose()
+        if server is not None:
+            server.shutdown()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Queues ETL jobs and runs the workers processing them.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    enqueue = commands.add_parser("enqueue", help="Queues the ETL of a notice file or portal URL.")
+    enqueue.add_argument("source", help="JSON or NDJSON file (optionally gzipped), or portal API URL.")
+    enqueue.add_argument("--chunk-size", type=int, default=100, help="Notices per classify and persist task.")
+    enqueue.add_argument("--incremental", action="store_true", help="Skip notices stored unchanged, update changed ones.")
+    work = commands.add_parser("work", help="Runs workers processing the queued tasks.")
+    work.add_argument("--processes", type=int, default=1, help="Number of worker processes.")
+    work.add_argument(
+        "--analyzer", default=DEFAULT_ANALYZER, help="Analyzer class, as module:Class, asked about the notices "
+        "the CPV rules leave unresolved."
+    )
+    work.add_argument(
+        "--cpv-categories", default=DEFAULT_CPV_CATEGORIES, help="JSON file of CPV code prefixes to category names; "
+        "defaults to the CPV divisions shipped with the package."
+    )
+    work.add_argument("--no-rules", action="store_true", help="Send every notice to the analyzer, without CPV rules.")
+    work.add_argument(
+        "--notices-per-request", type=int, help="Notices classified per LLM request, for analyzers batching them."
+    )
+    work.add_argument("--concurrency", type=int, help="Concurrent analyzer calls per task; sequential without it.")
+    work.add_argument("--requests-per-minute", type=int, help="Quota of analyzer calls per minute and process.")
+    work.add_argument("--tokens-per-minute", type=int, help="Quota of estimated LLM tokens per minute and process.")
+    work.add_argument("--analysis-cache", help="SQLite file caching the analyses by notice content, across runs.")
+    work.add_argument(
+        "--listeners", nargs="*", default=list(DEFAULT_LISTENERS),
+        help="Listener classes taking no arguments, as module:Class; none without a value. Defaults to the percolator."
+    )
+    work.add_argument("--lease-seconds", type=float, default=300.0, help="Time after which a silent worker's task is taken over.")
+    work.add_argument("--quarantine", help="NDJSON file to which invalid records are appended, with the reason.")
+    work.add_argument("--until-empty", action="store_true", help="Exit once no task is left instead of polling.")
+    work.add_argument(
+        "--metrics-port", type=int, help="First port on which the workers serve their metrics, one port per process; "
+        "needs METRICS_ENABLED."
+    )
+    commands.add_parser("status", help="Shows the queue depth, the latest jobs and the throughput.")
+    arguments = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    database_url = get_settings().database_url
+    engine = create_db_engine(database_url)
+    try:
+        create_db_and_tables(engine)
+        queue = JobQueue(engine)
+        if arguments.command == "enqueue":
+            job_id = queue.enqueue(arguments.source, arguments.chunk_size, arguments.incremental)
+            print(f"Queued job {job_id}")
+        elif arguments.command == "work":
+            analyzer = AnalyzerConfig(
+                cpv_categories=None if arguments.no_rules else arguments.cpv_categories,
+                analyzer=arguments.analyzer,
+                notices_per_request=arguments.notices_per_request,
+                concurrency=arguments.concurrency,
+                requests_per_minute=arguments.requests_per_minute,
+                tokens_per_minute=arguments.tokens_per_minute,
+                cache_path=arguments.analysis_cache,
+            )
+            run_workers(
+                arguments.processes, database_url, analyzer, arguments.lease_seconds, arguments.until_empty,
+                arguments.metrics_port, arguments.listeners, arguments.quarantine,
+            )
+        else:
+            print_status(queue)
+    finally:
+        engine.dispose()
+
+
+def print_status(queue: JobQueue):
+    depth = queue.depth()
+    print(f"{'task':<10}{'pending':>10}{'leased':>10}{'done':>10}{'failed':>10}")
+    for kind in ("extract", "classify", "persist"):
+        print(f"{kind:<10}" + "".join(f"{depth.get((kind, status), 0):>10}" for status in ("pending", "leased", "done", "failed")))
+
+    print(f"\n{'job':<6}{'status':<9}{'tasks':>12}{'notices':>10}{'notices/sec':>13}  source")
+    for job, tasks, done, persisted in queue.jobs():
+        elapsed = ((job.finished_at or datetime.now()) - job.created_at).total_seconds()
+        rate = persisted / elapsed if elapsed > 0 else 0.0
+        print(f"{job.id:<6}{job.status:<9}{f'{done}/{tasks}':>12}{persisted:>10}{rate:>13.1f}  {job.source}")
+
+    print(f"\nPersisting {queue.throughput():.1f} notices/sec over the last minute")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+from collections import deque
+from typing import Dict, Generic, Iterator, List, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class AhoCorasick(Generic[T]):
+    """Aho-Corasick automaton finding all occurrences of many keywords in a single pass over a text."""
+
+    def __init__(self):
+        self._transitions: List[Dict[str, int]] = [{}]
+        self._failures: List[int] = [0]
+        self._outputs: List[List[Tuple[int, T]]] = [[]]
+        self._built = False
+
+    def add(self, keyword: str, value: T):
+        """Registers `keyword`; each match of it reports `value`."""
+        if not keyword:
+            raise ValueError("Keywords must not be empty")
+        state = 0
+        for char in keyword:
+            next_state = self._transitions[state].get(char)
+            if next_state is None:
+                next_state = len(self._transitions)
+                self._transitions[state][char] = next_state
+                self._transitions.append({})
+                self._failures.append(0)
+                self._outputs.append([])
+            state = next_state
+        self._outputs[state].append((len(keyword), value))
+        self._built = False
+
+    def build(self):
+        """Computes the failure links, breadth-first; called automatically before the first search."""
+        queue = deque(self._transitions[0].values())
+        for state in queue:
+            self._failures[state] = 0
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._transitions[state].items():
+                failure = self._failures[state]
+                while failure and char not in self._transitions[failure]:
+                    failure = self._failures[failure]
+                self._failures[next_state] = self._transitions[failure].get(char, 0)
+                self._outputs[next_state] = self._outputs[next_state] + self._outputs[self._failures[next_state]]
+                queue.append(next_state)
+        self._built = True
+
+    def iter(self, text: str) -> Iterator[Tuple[int, int, T]]:
+        """Yields `(start, end, value)` for every keyword occurrence, `text[start:end]` being the keyword."""
+        if not self._built:
+            self.build()
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self._transitions[state]:
+                state = self._failures[state]
+            state = self._transitions[state].get(char, 0)
+            for length, value in self._outputs[state]:
+                yield position + 1 - length, position + 1, value
@@ -1,19 +1,241 @@
-from fastapi import Depends, FastAPI, HTTPException
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from tendara_ai_challenge.api import create_app
+from tendara_ai_challenge.matching.batch import match_all_profiles
+from tendara_ai_challenge.matching.bitmap import notice_bitmaps, profile_criteria
+from tendara_ai_challenge.matching.cache import match_cache
+from tendara_ai_challenge.matching.dto import BatchMatchingStats, FeedbackModel, FeedbackRequest, MatchingNoticesResponse
+from tendara_ai_challenge.matching.entity import DigestMatch, Feedback, Notice, Profile, ProfileMatch, get_async_session, get_session
+from tendara_ai_challenge.matching.embedding import Embedder, HashingEmbedder
+from tendara_ai_challenge.matching.matching import load_matched_notices, rank_semantic_notices, score_relevant_notices
+from tendara_ai_challenge.matching.pagination import InvalidPageRequest, decode_cursor, encode_cursor, parse_fields
+from tendara_ai_challenge.matching.reranker import Reranker, load_reranker, probability
+from tendara_ai_challenge.matching.vector_index import VectorIndex
+from tendara_ai_challenge.matching.versions import CORPUS_VERSION_ID, PROFILES_VERSION_ID, read_versions
+from tendara_ai_challenge.metrics import metrics
+from tendara_ai_challenge.settings import get_settings
+
+router = APIRouter()
+
+
+MATCH_QUERY_SECONDS = metrics.histogram("match_query_seconds", "Time to score the candidate notices of a profile.", ["filter"])
+MATCH_RESULTS = metrics.histogram(
+    "match_results", "Number of notices matching a profile.", buckets=(0, 1, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+)
+MATCH_REQUESTS = metrics.counter("match_requests_total", "Requests for the matches of a profile, by how the match cache served them.", ["cache"])
+
+
+@lru_cache
+def get_embedder() -> Embedder:
+    return HashingEmbedder()
+
+
+@lru_cache
+def get_vector_index() -> Optional[VectorIndex]:
+    """The index of notice vectors at `Settings.vector_index_path`, or None when it is not configured."""
+    path = get_settings().vector_index_path
+    return VectorIndex(path, get_embedder().dimension) if path else None
+
+
+def score_profile(session: Session, profile: Profile, reranker: Optional[Reranker] = None):
+    """Scores a profile's candidates; criteria beyond one category and location are filtered on the bitmap index.
+
+    With the profile's `reranker`, they are ranked by its log-odds instead.
+    """
+    if profile_criteria(profile).is_single_category_and_location:
+        with MATCH_QUERY_SECONDS.time(filter="sql"):
+            scored = score_relevant_notices(profile, session, reranker=reranker)
+    else:
+        with MATCH_QUERY_SECONDS.time(filter="bitmap"):
+            notice_bitmaps.refresh(session)
+            scored = score_relevant_notices(profile, session, bitmaps=notice_bitmaps, reranker=reranker)
+    MATCH_RESULTS.observe(len(scored))
+    return scored
+
+
+@router.get("/profiles/{profile_id}/matches", response_model=MatchingNoticesResponse, response_model_exclude_unset=True)
+async def get_matches(
+        profile_id: int,
+        response: Response,
+        limit: int = Query(50, ge=1, le=500),
+        cursor: Optional[str] = None,
+        fields: Optional[str] = None,
+        if_none_match: Optional[str] = Header(default=None),
+        db: AsyncSession = Depends(get_async_session),
+        session: Session = Depends(get_session),
+):
+    try:
+        after = decode_cursor(cursor)
+        projection = parse_fields(fields)
+    except InvalidPageRequest as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+    # A cached ranking is still current, so an unchanged page is answered from a single version lookup.
+    corpus_version, profiles_version = await db.run_sync(read_versions, CORPUS_VERSION_ID, PROFILES_VERSION_ID)
+    cached = match_cache.get(profile_id, corpus_version, profiles_version)
+    if cached is not None and if_none_match == cached.page_etag(limit, cursor, projection):
+        MATCH_REQUESTS.inc(cache="not_modified")
+        return Response(status_code=304, headers={"ETag": if_none_match})
+    MATCH_REQUESTS.inc(cache="miss" if cached is None else "hit")
+
+    if cached is None:
+        profile = await db.get(Profile, profile_id)
+
+        if profile is None:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        # Scoring is CPU-bound: run it in the threadpool, on a sync session, to keep the event loop free.
+        reranker = await run_in_threadpool(load_reranker, session, profile)
+        scored = await run_in_threadpool(score_profile, session, profile, reranker)
+        cached = match_cache.put(profile_id, scored, corpus_version, profiles_version, reranked=reranker is not None)
+
+    # Take one extra match to know whether another page follows, but only load the page itself.
+    ranked_ids = cached.page(after, limit + 1)
+    page = ranked_ids[:limit]
+    next_cursor = None
+    if len(ranked_ids) > limit:
+        last_id, last_score = page[-1]
+        next_cursor = encode_cursor(last_score, last_id)
 
-from tendara_ai_challenge.matching.dto import MatchingNoticesResponse
-from tendara_ai_challenge.matching.entity import Profile, get_session
-from tendara_ai_challenge.matching.matching import find_relevant_notices
+    etag = cached.page_etag(limit, cursor, projection)
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
 
-app = FastAPI()
+    response.headers["ETag"] = etag
+    if cached.reranked:
+        # Ranked and paged by log-odds, shown as the probability of a thumbs up.
+        probabilities = probability([score for _, score in page])
+        page = [(notice_id, float(match_probability)) for (notice_id, _), match_probability in zip(page, probabilities)]
+    notices = await db.run_sync(load_matched_notices, page, projection)
+    return MatchingNoticesResponse(notices=notices, next_cursor=next_cursor)
 
 
-@app.get("/profiles/{profile_id}/matches", response_model=MatchingNoticesResponse)
-async def get_matches(profile_id: int, db: Session = Depends(get_session)):
-    profile = db.query(Profile).get(profile_id)
+@router.get("/profiles/{profile_id}/semantic-matches", response_model=MatchingNoticesResponse, response_model_exclude_unset=True)
+def get_semantic_matches(
+        profile_id: int,
+        limit: int = Query(10, ge=1, le=500),
+        n_probe: Optional[int] = Query(default=None, ge=1, description="Clusters to scan; all notices by default"),
+        fields: Optional[str] = None,
+        db: Session = Depends(get_session),
+        index: Optional[VectorIndex] = Depends(get_vector_index),
+        embedder: Embedder = Depends(get_embedder),
+):
+    """Returns the notices of the profile's category and location whose text is closest in meaning to its tags.
 
+    Embedding and scanning the vectors are CPU-bound, so this keeps the sync session and runs in the threadpool.
+    """
+    if index is None:
+        raise HTTPException(status_code=503, detail="Semantic matching is not configured")
+    try:
+        projection = parse_fields(fields)
+    except InvalidPageRequest as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+    profile = db.get(Profile, profile_id)
     if profile is None:
         raise HTTPException(status_code=404, detail="User not found")
 
-    matching_notices = find_relevant_notices(profile, db)
-    return MatchingNoticesResponse(notices=matching_notices)
+    ranked_ids = rank_semantic_notices(profile, db, index, embedder, limit, n_probe)
+    return MatchingNoticesResponse(notices=load_matched_notices(db, ranked_ids, projection))
+
+
+@router.post("/profiles/{profile_id}/feedback", response_model=FeedbackModel)
+async def give_feedback(profile_id: int, feedback: FeedbackRequest, db: AsyncSession = Depends(get_async_session)):
+    """Records a thumbs up or down for a notice, replacing an earlier rating of it.
+
+    Ratings take effect once the rerankers are trained again, see `tendara_ai_challenge.matching.reranker`.
+    """
+    if await db.get(Profile, profile_id) is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if await db.get(Notice, feedback.notice_id) is None:
+        raise HTTPException(status_code=404, detail="Notice not found")
+
+    db_feedback = (await db.exec(
+        select(Feedback).where(Feedback.profile_id == profile_id, Feedback.notice_id == feedback.notice_id)
+    )).first() or Feedback(profile_id=profile_id, notice_id=feedback.notice_id)
+    db_feedback.feedback_rating = feedback.feedback_rating
+    db_feedback.feedback_text = feedback.feedback_text
+    db_feedback.created_at = datetime.now()
+    db.add(db_feedback)
+    await db.commit()
+    await db.refresh(db_feedback)
+
+    return FeedbackModel(
+        feedback_id=db_feedback.id,
+        profile_id=profile_id,
+        notice_id=db_feedback.notice_id,
+        feedback_rating=db_feedback.feedback_rating,
+        feedback_text=db_feedback.feedback_text,
+    )
+
+
+@router.post("/matches/digest", response_model=BatchMatchingStats)
+def run_digest(limit: int = Query(50, ge=1, le=500), db: Session = Depends(get_session)):
+    """Ranks the matches of every profile in one bulk job and stores them for the nightly digest.
+
+    The job is CPU-bound, so it keeps the sync session and runs in the threadpool instead of on the event loop.
+    """
+    return match_all_profiles(db, limit)
+
+
+@router.get("/profiles/{profile_id}/digest", response_model=MatchingNoticesResponse, response_model_exclude_unset=True)
+async def get_digest(profile_id: int, fields: Optional[str] = None, db: AsyncSession = Depends(get_async_session)):
+    """Returns the profile's matches as ranked by the last bulk matching job, best first."""
+    try:
+        projection = parse_fields(fields)
+    except InvalidPageRequest as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    if await db.get(Profile, profile_id) is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    ranked_ids = (await db.exec(
+        select(DigestMatch.notice_id, DigestMatch.match_score)
+        .where(DigestMatch.profile_id == profile_id)
+        .order_by(DigestMatch.rank)
+    )).all()
+    notices = await db.run_sync(load_matched_notices, [tuple(match) for match in ranked_ids], projection)
+    return MatchingNoticesResponse(notices=notices)
+
+
+@router.get("/profiles/{profile_id}/inbox", response_model=MatchingNoticesResponse, response_model_exclude_unset=True)
+async def get_inbox(
+        profile_id: int,
+        limit: int = Query(50, ge=1, le=500),
+        cursor: Optional[int] = Query(default=None, description="next_cursor of the previous call"),
+        fields: Optional[str] = None,
+        db: AsyncSession = Depends(get_async_session),
+):
+    """Returns the notices matched against the profile at ingest, oldest first.
+
+    The inbox is append-only: polling with the last `next_cursor` returns only notices ingested since.
+    """
+    try:
+        projection = parse_fields(fields)
+    except InvalidPageRequest as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    if await db.get(Profile, profile_id) is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    entries = (await db.exec(
+        select(ProfileMatch.id, ProfileMatch.notice_id, ProfileMatch.match_score)
+        .where(ProfileMatch.profile_id == profile_id, ProfileMatch.id > (cursor or 0))
+        .order_by(ProfileMatch.id)
+        .limit(limit)
+    )).all()
+
+    ranked_ids = [(notice_id, match_score) for _, notice_id, match_score in entries]
+    notices = await db.run_sync(load_matched_notices, ranked_ids, projection)
+    next_cursor = str(entries[-1][0]) if entries else (str(cursor) if cursor else None)
+    return MatchingNoticesResponse(notices=notices, next_cursor=next_cursor)
+
+
+# Serves this API alone; `tendara_ai_challenge.app` serves it together with the other one.
+app = create_app(router)
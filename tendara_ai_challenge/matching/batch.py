@@ -0,0 +1,124 @@
+import argparse
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import numpy as np
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import Session
+from sqlmodel import select
+
+from tendara_ai_challenge.matching.bitmap import notice_bitmaps, profile_criteria
+from tendara_ai_challenge.matching.dto import BatchMatchingStats
+from tendara_ai_challenge.matching.entity import DigestMatch, Profile, get_session
+from tendara_ai_challenge.matching.matching import candidate_notices, candidate_postings, score_relevant_notices
+from tendara_ai_challenge.matching.ranking import Bm25Scorer, top_k
+from tendara_ai_challenge.matching.tokenizer import tag_tokens
+
+
+def match_all_profiles(db: Session, limit: int = 50) -> BatchMatchingStats:
+    """Ranks the best `limit` notices of every profile and replaces the stored `DigestMatch` rows.
+
+    Profiles sharing a category and location share one candidate query and one postings query, whose
+    BM25 weights are computed once; each profile then sums the weights of the postings of its own tags.
+    Profiles with criteria beyond one category and location are ranked alone, from the bitmap index.
+    """
+    started = time.perf_counter()
+    profiles = db.exec(select(Profile)).all()
+    groups: Dict[Tuple[int, int], List[Profile]] = defaultdict(list)
+    filtered = []
+    for profile in profiles:
+        if profile_criteria(profile).is_single_category_and_location:
+            groups[(profile.category_id, profile.location_id)].append(profile)
+        else:
+            filtered.append(profile)
+
+    profile_tokens = {profile.id: tag_tokens(profile.tags) for profile in profiles}
+    scorer = Bm25Scorer(db, set().union(*profile_tokens.values()))
+
+    digest = []
+    for (category_id, location_id), group in groups.items():
+        ranked = _rank_group(db, scorer, category_id, location_id, group, profile_tokens, limit)
+        digest.extend(
+            {"profile_id": profile_id, "notice_id": notice_id, "rank": rank, "match_score": score}
+            for profile_id, matches in ranked.items()
+            for rank, (notice_id, score) in enumerate(matches, 1)
+        )
+    if filtered:
+        notice_bitmaps.refresh(db)
+    for profile in filtered:
+        digest.extend(
+            {"profile_id": profile.id, "notice_id": notice_id, "rank": rank, "match_score": score}
+            for rank, (notice_id, score) in enumerate(score_relevant_notices(profile, db, limit, bitmaps=notice_bitmaps), 1)
+        )
+
+    connection = db.connection()
+    connection.execute(delete(DigestMatch.__table__))
+    if digest:
+        connection.execute(insert(DigestMatch.__table__), digest)
+    db.commit()
+
+    stats = BatchMatchingStats(
+        profiles=len(profiles), groups=len(groups) + len(filtered), matches=len(digest), seconds=time.perf_counter() - started
+    )
+    logging.info(
+        "Matched %d profiles in %d groups (%d matches) at %.1f profiles/sec",
+        stats.profiles, stats.groups, stats.matches, stats.profiles_per_second
+    )
+    return stats
+
+
+def _rank_group(
+        db: Session,
+        scorer: Bm25Scorer,
+        category_id: int,
+        location_id: int,
+        profiles: List[Profile],
+        profile_tokens: Dict[int, set],
+        limit: int,
+) -> Dict[int, List[Tuple[int, float]]]:
+    candidates = candidate_notices(db, category_id, location_id)
+    notice_ids = np.array([notice_id for notice_id, _ in candidates], dtype=np.int64)
+    document_lengths = np.array([token_count or 0 for _, token_count in candidates], dtype=np.float64)
+
+    tokens = sorted(set().union(*(profile_tokens[profile.id] for profile in profiles)))
+    postings = candidate_postings(db, category_id, location_id, tokens) if len(notice_ids) else []
+
+    # BM25 weight of every posting, and the postings of each token as a slice of the token-sorted order
+    group_positions = {token: position for position, token in enumerate(tokens)}
+    document_positions = np.searchsorted(notice_ids, np.array([notice_id for notice_id, _, _ in postings], dtype=np.int64))
+    weights = scorer.term_weights(
+        document_lengths,
+        document_positions,
+        scorer.token_positions(token for _, token, _ in postings),
+        np.array([term_frequency for _, _, term_frequency in postings], dtype=np.float64),
+    ) if postings else np.zeros(0, dtype=np.float64)
+    posting_tokens = np.array([group_positions[token] for _, token, _ in postings], dtype=np.int64)
+    order = np.argsort(posting_tokens, kind="stable")
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(posting_tokens, minlength=len(tokens)))])
+
+    ranked = {}
+    for profile in profiles:
+        token_positions = [group_positions[token] for token in profile_tokens[profile.id]]
+        selected = np.concatenate(
+            [order[offsets[position]:offsets[position + 1]] for position in token_positions]
+        ) if token_positions else np.zeros(0, dtype=np.int64)
+        scores = np.bincount(document_positions[selected], weights=weights[selected], minlength=len(notice_ids))
+        ranked[profile.id] = top_k(notice_ids, scores, limit)
+    return ranked
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ranks the matches of every profile for the nightly digest.")
+    parser.add_argument("--limit", type=int, default=50, help="Number of matches kept per profile.")
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    for session in get_session():
+        stats = match_all_profiles(session, arguments.limit)
+        print(f"{stats.profiles} profiles, {stats.matches} matches, {stats.profiles_per_second:.1f} profiles/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+import threading
+from collections import defaultdict
+from dataclasses import dataclass, field, replace
+from datetime import date, datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from sqlmodel import select
+
+from tendara_ai_challenge.matching.dto import ProfileCriteria
+from tendara_ai_challenge.matching.entity import Notice, NoticeCategory, NoticeLocation, Profile
+from tendara_ai_challenge.matching.tokenizer import parse_tags
+from tendara_ai_challenge.matching.versions import CORPUS_VERSION_ID, read_version
+
+MISSING = np.iinfo(np.int64).min
+EPOCH = date(1970, 1, 1)
+
+# (id, volume, token count, publication deadline, submission deadline, cpv codes) of a stored notice.
+NoticeRow = Tuple[int, Optional[int], Optional[int], Optional[date], Optional[date], Optional[str]]
+
+
+def profile_criteria(profile: Profile) -> ProfileCriteria:
+    """Collects the structured criteria of a profile; its category and location join the multi-valued ones."""
+    category_ids = {int(category_id) for category_id in parse_tags(profile.category_ids)}
+    location_ids = {int(location_id) for location_id in parse_tags(profile.location_ids)}
+    if profile.category_id is not None:
+        category_ids.add(profile.category_id)
+    if profile.location_id is not None:
+        location_ids.add(profile.location_id)
+    return ProfileCriteria(
+        category_ids=sorted(category_ids),
+        location_ids=sorted(location_ids),
+        cpv_prefixes=parse_tags(profile.cpv_prefixes),
+        min_volume=profile.min_volume,
+        max_volume=profile.max_volume,
+        published_after=profile.published_after,
+        published_before=profile.published_before,
+        submission_after=profile.submission_after,
+        submission_before=profile.submission_before,
+    )
+
+
+def cpv_prefix(code: str) -> str:
+    """Reduces a CPV code like "72200000-7" to its significant digits, "722"; divisions keep two digits."""
+    digits = code.split("-")[0].strip().rstrip("0")
+    return digits.ljust(2, "0")
+
+
+@dataclass(eq=False)
+class NoticeBitmaps:
+    """One consistent state of a `NoticeBitmapIndex`, never modified once the index published it.
+
+    Categories, locations and CPV prefixes each map to the bitmap of their notices; volume and deadline
+    ranges are compiled into a bitmap from dense columns indexed by notice id.
+    """
+
+    notices: int = 0
+    version: int = 0  # Corpus version of the last refresh.
+    categories: Dict[int, int] = field(default_factory=dict)
+    locations: Dict[int, int] = field(default_factory=dict)
+    cpv_prefixes: Dict[str, int] = field(default_factory=dict)
+    volumes: np.ndarray = field(default_factory=lambda: np.full(1, MISSING, dtype=np.int64))
+    publication_days: np.ndarray = field(default_factory=lambda: np.full(1, MISSING, dtype=np.int64))
+    submission_days: np.ndarray = field(default_factory=lambda: np.full(1, MISSING, dtype=np.int64))
+    token_counts: np.ndarray = field(default_factory=lambda: np.zeros(1, dtype=np.int64))
+
+    def __len__(self) -> int:
+        return self.notices.bit_count()
+
+    @property
+    def max_id(self) -> int:
+        return self.notices.bit_length() - 1 if self.notices else 0
+
+    def copy(self) -> "NoticeBitmaps":
+        return replace(
+            self,
+            categories=dict(self.categories),
+            locations=dict(self.locations),
+            cpv_prefixes=dict(self.cpv_prefixes),
+            volumes=self.volumes.copy(),
+            publication_days=self.publication_days.copy(),
+            submission_days=self.submission_days.copy(),
+            token_counts=self.token_counts.copy(),
+        )
+
+    def add(self, notices: Sequence[NoticeRow], category_links: Iterable[Tuple[int, int]], location_links: Iterable[Tuple[int, int]]):
+        """Indexes notices and their (notice id, category/location id) links in place, replacing notices indexed before.
+
+        Only for a state that is not published yet, see `NoticeBitmapIndex.add`.
+        """
+        ids = np.array([notice[0] for notice in notices], dtype=np.int64)
+        added = to_bitmap(ids)
+        if self.notices & added:
+            kept = ~added
+            for bitmaps in (self.categories, self.locations, self.cpv_prefixes):
+                for key in bitmaps:
+                    bitmaps[key] &= kept
+
+        self._grow(int(ids.max()) + 1)
+        self.volumes[ids] = [_number(notice[1]) for notice in notices]
+        self.token_counts[ids] = [notice[2] or 0 for notice in notices]
+        self.publication_days[ids] = [day_number(notice[3]) for notice in notices]
+        self.submission_days[ids] = [day_number(notice[4]) for notice in notices]
+        self.notices |= added
+
+        for bitmaps, links in (
+                (self.categories, category_links),
+                (self.locations, location_links),
+                (self.cpv_prefixes, (
+                    (notice[0], prefix) for notice in notices for code in parse_tags(notice[5])
+                    for prefix in _prefixes(cpv_prefix(code))
+                )),
+        ):
+            grouped = defaultdict(list)
+            for notice_id, key in links:
+                grouped[key].append(notice_id)
+            for key, notice_ids in grouped.items():
+                bitmaps[key] = bitmaps.get(key, 0) | to_bitmap(notice_ids)
+
+    def match(self, criteria: ProfileCriteria) -> int:
+        """Returns the bitmap of the notices satisfying every criterion, with any value of multi-valued ones."""
+        bitmap = self.notices
+        if criteria.category_ids:
+            bitmap &= self._any(self.categories, criteria.category_ids)
+        if criteria.location_ids:
+            bitmap &= self._any(self.locations, criteria.location_ids)
+        if criteria.cpv_prefixes:
+            bitmap &= self._any(self.cpv_prefixes, (cpv_prefix(prefix) for prefix in criteria.cpv_prefixes))
+        if criteria.min_volume is not None or criteria.max_volume is not None:
+            bitmap &= self._between(self.volumes, criteria.min_volume, criteria.max_volume)
+        if criteria.published_after is not None or criteria.published_before is not None:
+            bitmap &= self._between(
+                self.publication_days, day_number(criteria.published_after, None), day_number(criteria.published_before, None)
+            )
+        if criteria.submission_after is not None or criteria.submission_before is not None:
+            bitmap &= self._between(
+                self.submission_days, day_number(criteria.submission_after, None), day_number(criteria.submission_before, None)
+            )
+        return bitmap
+
+    @staticmethod
+    def _any(bitmaps: Dict, keys: Iterable) -> int:
+        bitmap = 0
+        for key in keys:
+            bitmap |= bitmaps.get(key, 0)
+        return bitmap
+
+    @staticmethod
+    def _between(column: np.ndarray, minimum: Optional[int], maximum: Optional[int]) -> int:
+        mask = column != MISSING
+        if minimum is not None:
+            mask &= column >= minimum
+        if maximum is not None:
+            mask &= column <= maximum
+        return int.from_bytes(np.packbits(mask, bitorder="little").tobytes(), "little")
+
+    def _grow(self, size: int):
+        if size <= len(self.volumes):
+            return
+        capacity = max(size, 2 * len(self.volumes))
+        for name, fill in (("volumes", MISSING), ("publication_days", MISSING), ("submission_days", MISSING), ("token_counts", 0)):
+            column = getattr(self, name)
+            grown = np.full(capacity, fill, dtype=np.int64)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+
+class NoticeBitmapIndex:
+    """Per-attribute bitmap indexes over notice ids, as Python ints in which bit `i` stands for notice `i`.
+
+    A profile's criteria are evaluated with `|` over the values of a criterion and `&` across criteria,
+    whatever their combination. Readers use `current`, a consistent `NoticeBitmaps`: writers build the next
+    state on a copy, one at a time, and publish it with a single assignment, so threads match during a refresh.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.current = NoticeBitmaps()
+
+    def clear(self):
+        with self._lock:
+            self.current = NoticeBitmaps()
+
+    def __len__(self) -> int:
+        return len(self.current)
+
+    @property
+    def max_id(self) -> int:
+        return self.current.max_id
+
+    @property
+    def version(self) -> int:
+        return self.current.version
+
+    def add(self, notices: Sequence[NoticeRow], category_links: Iterable[Tuple[int, int]], location_links: Iterable[Tuple[int, int]]):
+        """Indexes notices and their (notice id, category/location id) links, replacing notices indexed before."""
+        if not notices:
+            return
+        with self._lock:
+            bitmaps = self.current.copy()
+            bitmaps.add(notices, category_links, location_links)
+            self.current = bitmaps
+
+    def refresh(self, db: Session, batch_size: int = 10_000) -> int:
+        """Indexes the notices stored or updated since the last refresh, or everything again if notices were deleted.
+
+        Notices updated in place keep their id, and are found by the corpus version stamped on them.
+        The state is only copied when there is something to index. Returns the number of (re-)indexed notices.
+        """
+        with self._lock:
+            current = self.current
+            # Read first: a batch committing meanwhile has a later version, so it is re-indexed next time.
+            version = read_version(db, CORPUS_VERSION_ID)
+            max_id, count = db.exec(select(func.max(Notice.id), func.count(Notice.id))).one()
+            bitmaps = NoticeBitmaps() if count < len(current) or (max_id or 0) < current.max_id else None
+
+            indexed = 0
+            base = current if bitmaps is None else bitmaps
+            for notice_ids in updated_notice_ids(db, base.version, base.max_id, batch_size):
+                bitmaps = current.copy() if bitmaps is None else bitmaps
+                bitmaps.add(*load_notice_rows(db.connection(), notice_ids))
+                indexed += len(notice_ids)
+            while True:
+                notice_ids = db.exec(
+                    select(Notice.id).where(Notice.id > (current if bitmaps is None else bitmaps).max_id)
+                    .order_by(Notice.id).limit(batch_size)
+                ).all()
+                if not notice_ids:
+                    break
+                bitmaps = current.copy() if bitmaps is None else bitmaps
+                bitmaps.add(*load_notice_rows(db.connection(), notice_ids))
+                indexed += len(notice_ids)
+
+            # Published states are never modified, so an unchanged one is shared by the next.
+            self.current = replace(current if bitmaps is None else bitmaps, version=version)
+            return indexed
+
+    def match(self, criteria: ProfileCriteria) -> int:
+        """Returns the bitmap of the notices satisfying every criterion, with any value of multi-valued ones."""
+        return self.current.match(criteria)
+
+
+def to_bitmap(notice_ids: Iterable[int]) -> int:
+    notice_ids = np.asarray(notice_ids, dtype=np.int64)
+    if not len(notice_ids):
+        return 0
+    mask = np.zeros(int(notice_ids.max()) + 1, dtype=bool)
+    mask[notice_ids] = True
+    return int.from_bytes(np.packbits(mask, bitorder="little").tobytes(), "little")
+
+
+def to_ids(bitmap: int) -> np.ndarray:
+    """Returns the sorted notice ids set in `bitmap`."""
+    data = np.frombuffer(bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little"), dtype=np.uint8)
+    return np.flatnonzero(np.unpackbits(data, bitorder="little")).astype(np.int64)
+
+
+def updated_notice_ids(db: Session, version: int, max_id: int, batch_size: int) -> Iterator[List[int]]:
+    """Yields, in batches, the ids up to `max_id` of the notices stored by a batch of a corpus version after `version`."""
+    last_id = 0
+    while True:
+        notice_ids = db.exec(
+            select(Notice.id)
+            .where(Notice.corpus_version > version, Notice.id > last_id, Notice.id <= max_id)
+            .order_by(Notice.id)
+            .limit(batch_size)
+        ).all()
+        if not notice_ids:
+            return
+        yield notice_ids
+        last_id = notice_ids[-1]
+
+
+def load_notice_rows(connection: Connection, notice_ids: List[int]) -> Tuple[List[NoticeRow], List[Tuple[int, int]], List[Tuple[int, int]]]:
+    """Reads what the bitmap index needs of stored notices and their links."""
+    return (
+        connection.execute(
+            select(
+                Notice.id, Notice.volume, Notice.token_count,
+                Notice.publication_deadline, Notice.submission_deadline, Notice.cpv_codes
+            ).where(Notice.id.in_(notice_ids))
+        ).all(),
+        connection.execute(select(NoticeCategory.notice_id, NoticeCategory.category_id).where(NoticeCategory.notice_id.in_(notice_ids))).all(),
+        connection.execute(select(NoticeLocation.notice_id, NoticeLocation.location_id).where(NoticeLocation.notice_id.in_(notice_ids))).all(),
+    )
+
+
+def _prefixes(prefix: str) -> List[str]:
+    """Every coarser CPV prefix of `prefix`, down to its division, so a profile can match at any level."""
+    return [prefix[:length] for length in range(2, len(prefix) + 1)]
+
+
+def _number(value: Optional[int]) -> int:
+    return MISSING if value is None else value
+
+
+def day_number(value: Optional[date], missing: Optional[int] = MISSING) -> Optional[int]:
+    """The number of days from `EPOCH` to a date or datetime, `missing` for None."""
+    if value is None:
+        return missing
+    if isinstance(value, datetime):
+        value = value.date()
+    return (value - EPOCH).days
+
+
+# Shared by the API process, like the match cache; refreshed before rich profiles are matched.
+notice_bitmaps = NoticeBitmapIndex()
@@ -0,0 +1,92 @@
+import hashlib
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+
+@dataclass
+class CachedMatches:
+    """The full ranking of a profile's matches, as (notice id, score) pairs, best first."""
+
+    ranked_ids: List[Tuple[int, float]]
+    corpus_version: int
+    profiles_version: int
+    etag: str
+    reranked: bool = False  # Whether the scores are a reranker's log-odds, shown as probabilities.
+    created_at: float = field(default_factory=time.monotonic)
+
+    def page(self, after: Optional[Tuple[float, int]], limit: int) -> List[Tuple[int, float]]:
+        """Returns the `limit` matches ranked after the (score, id) key `after`."""
+        start = 0
+        if after is not None:
+            after_score, after_id = after
+            start = bisect_right(self.ranked_ids, (-after_score, after_id), key=lambda match: (-match[1], match[0]))
+        return self.ranked_ids[start:start + limit]
+
+    def page_etag(self, *request_parts) -> str:
+        """Derives the ETag of one page of this ranking, e.g. from its limit, cursor and projection."""
+        return '"' + hashlib.sha1(repr((self.etag, request_parts)).encode()).hexdigest() + '"'
+
+
+class MatchResultCache:
+    """In-process LRU cache of ranked matches per profile, with a TTL and version invalidation.
+
+    Entries are only served at the corpus and profiles versions they were ranked at, which callers read
+    from the database (`CORPUS_VERSION_ID`, `PROFILES_VERSION_ID`), so ingests, rerankers trained and
+    profiles changed by other processes invalidate them.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, CachedMatches]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, profile_id: int, corpus_version: int, profiles_version: int) -> Optional[CachedMatches]:
+        """Returns the ranking cached for the profile at the current versions, if any."""
+        with self._lock:
+            entry = self._entries.get(profile_id)
+            if entry is None:
+                return None
+            if (
+                    (entry.corpus_version, entry.profiles_version) != (corpus_version, profiles_version)
+                    or time.monotonic() - entry.created_at > self.ttl_seconds
+            ):
+                del self._entries[profile_id]
+                return None
+            self._entries.move_to_end(profile_id)
+            return entry
+
+    def put(
+            self,
+            profile_id: int,
+            ranked_ids: List[Tuple[int, float]],
+            corpus_version: int,
+            profiles_version: int,
+            reranked: bool = False,
+    ) -> CachedMatches:
+        """Caches a ranking computed at the given versions (read before ranking)."""
+        etag = hashlib.sha1(
+            repr((profile_id, corpus_version, profiles_version, ranked_ids, reranked)).encode()
+        ).hexdigest()
+        entry = CachedMatches(ranked_ids, corpus_version, profiles_version, etag, reranked)
+        with self._lock:
+            self._entries[profile_id] = entry
+            self._entries.move_to_end(profile_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, profile_id: int):
+        with self._lock:
+            self._entries.pop(profile_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+match_cache = MatchResultCache()
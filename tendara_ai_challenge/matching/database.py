@@ -0,0 +1,80 @@
+from functools import lru_cache
+from typing import Dict, Optional, Union
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel import Session, create_engine
+
+from tendara_ai_challenge.settings import get_settings
+
+# Suited to a read-heavy API with a single writer: readers never block on the ETL thanks to WAL,
+# and hot pages are served from the memory map and a 64 MiB page cache.
+SQLITE_PRAGMAS: Dict[str, Union[int, str]] = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+
+
+def create_db_engine(url: str, echo: bool = False, pragmas: Optional[Dict[str, Union[int, str]]] = None, **kwargs) -> Engine:
+    """Creates the database engine, applying `pragmas` (by default `SQLITE_PRAGMAS`) to every SQLite connection."""
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+    if url.startswith("sqlite"):
+        kwargs.setdefault("connect_args", {"check_same_thread": False})
+    engine = create_engine(url, echo=echo, **kwargs)
+
+    if engine.dialect.name == "sqlite" and pragmas:
+        _apply_pragmas_on_connect(engine, pragmas)
+
+    return engine
+
+
+def create_async_db_engine(url: str, echo: bool = False, pragmas: Optional[Dict[str, Union[int, str]]] = None, **kwargs) -> AsyncEngine:
+    """Creates the asyncio counterpart of `create_db_engine`; plain SQLite URLs are served by the aiosqlite driver."""
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+    url = make_url(url)
+    if url.drivername == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    engine = create_async_engine(url, echo=echo, **kwargs)
+
+    if engine.dialect.name == "sqlite" and pragmas:
+        _apply_pragmas_on_connect(engine.sync_engine, pragmas)
+
+    return engine
+
+
+def begin_immediate(db: Session) -> None:
+    """Takes the SQLite write lock for the session's transaction now, instead of at its first write.
+
+    Reads deciding what the transaction writes then see no concurrent writer between them and the commit.
+    """
+    connection = db.connection()
+    if connection.dialect.name == "sqlite" and not connection.connection.dbapi_connection.in_transaction:
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def _apply_pragmas_on_connect(engine: Engine, pragmas: Dict[str, Union[int, str]]) -> None:
+    @event.listens_for(engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+
+@lru_cache
+def get_engine() -> Engine:
+    """The engine of the configured database, created on first use and shared by the whole process."""
+    settings = get_settings()
+    return create_db_engine(settings.database_url, echo=settings.sql_echo)
+
+
+@lru_cache
+def get_async_engine() -> AsyncEngine:
+    """The async engine of the configured database, created on first use and shared by the whole process."""
+    settings = get_settings()
+    return create_async_db_engine(settings.database_url, echo=settings.sql_echo)
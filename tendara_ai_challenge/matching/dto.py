@@ -1,9 +1,7 @@
-from datetime import datetime
-from typing import List
+from datetime import date, datetime
+from typing import List, Literal, Optional
 
-from pydantic import BaseModel
-
-from tendara_ai_challenge.matching.entity import Notice
+from pydantic import BaseModel, Field, computed_field
 
 
 class NoticeModel(BaseModel):
@@ -42,17 +40,90 @@ class NoticeModel(BaseModel):
     submission_deadline: datetime
     """Date and time for the deadline for submitting tender proposals."""
 
+    external_id: Optional[str] = None
+    """Identifier of the notice on its source portal, stable across updates of the notice."""
+
+
+class FeedbackRequest(BaseModel):
+    """A thumbs up or down of a profile for one of its matched notices."""
+
+    notice_id: int = Field(gt=0)
+    feedback_rating: Literal[-1, 1]
+    """1 for a thumbs up, -1 for a thumbs down."""
+
+    feedback_text: Optional[str] = None
+
+
+class FeedbackModel(BaseModel):
+    feedback_id: int
+    profile_id: int
+    notice_id: int
+    feedback_rating: int
+    feedback_text: Optional[str] = None
+
+
+class MatchedNotice(BaseModel):
+    """A notice matching a search profile, with how well its text matches the profile's tags."""
+
+    id: int
+    title: Optional[str] = None
+    description: Optional[str] = None
+    buyer: Optional[str] = None
+    volume: Optional[int] = None
+    publication_deadline: Optional[date] = None
+    submission_deadline: Optional[date] = None
+
+    match_score: float = 0.0
+    """BM25 score of the profile's tags over the notice title and description, or the probability of a
+    thumbs up estimated by the profile's learned reranker."""
 
-# TODO: Later on we can provide a feedback model
-# class FeedbackModel(BaseModel):
-#     feedback_id: int
-#     profile_id: int
-#     notice: NoticeModel
-#     feedback_rating: int
-#     feedback_text: str
 
 class MatchingNoticesResponse(BaseModel):
-    notices: List[Notice]
+    notices: List[MatchedNotice]
+
+    next_cursor: Optional[str] = None
+    """Opaque cursor to pass as `cursor` to fetch the next page, or None on the last page."""
+
+
+class BatchMatchingStats(BaseModel):
+    """Throughput of a bulk matching job over all profiles."""
+
+    profiles: int = 0
+    groups: int = 0
+    matches: int = 0
+    seconds: float = 0.0
+
+    @computed_field
+    @property
+    def profiles_per_second(self) -> float:
+        return self.profiles / self.seconds if self.seconds else 0.0
+
+
+class RerankerTrainingStats(BaseModel):
+    """Outcome of training the rerankers of every profile with enough feedback."""
+
+    profiles: int = 0
+    feedback: int = 0
+    seconds: float = 0.0
+
+
+class ProfileCriteria(BaseModel):
+    """The structured filters of a search profile; empty or None criteria do not restrict the notices."""
+
+    category_ids: List[int] = []
+    location_ids: List[int] = []
+    cpv_prefixes: List[str] = []
+    min_volume: Optional[int] = None
+    max_volume: Optional[int] = None
+    published_after: Optional[date] = None
+    published_before: Optional[date] = None
+    submission_after: Optional[date] = None
+    submission_before: Optional[date] = None
 
-    # TODO: Later on we can add a match score to the response and present it to the user?
-    # match_score: float = 0.0
+    @property
+    def is_single_category_and_location(self) -> bool:
+        """Whether the criteria are only the one category and location every profile had originally."""
+        return (
+            len(self.category_ids) == 1 and len(self.location_ids) == 1 and not self.cpv_prefixes
+            and self.model_dump(exclude={"category_ids", "location_ids", "cpv_prefixes"}, exclude_none=True) == {}
+        )
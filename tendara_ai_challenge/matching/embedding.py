@@ -0,0 +1,52 @@
+import zlib
+from abc import ABC, abstractmethod
+from typing import List
+
+import numpy as np
+
+from tendara_ai_challenge.matching.tokenizer import tokenize
+
+
+class Embedder(ABC):
+    """Turns texts into L2-normalized float32 vectors, so cosine similarity is a dot product."""
+
+    dimension: int
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Returns a `(len(texts), dimension)` float32 matrix of unit vectors."""
+        pass
+
+
+class HashingEmbedder(Embedder):
+    """Deterministic, offline embedder hashing word tokens and character n-grams into a fixed-size vector.
+
+    Character n-grams make related word forms ("chatbot", "chatbots") land close to each other; it needs
+    no model download or network, which makes it the default for building and testing the vector index.
+    """
+
+    def __init__(self, dimension: int = 256, ngram_size: int = 3):
+        self.dimension = dimension
+        self.ngram_size = ngram_size
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                hashed = zlib.crc32(feature.encode())
+                sign = 1.0 if hashed & 0x80000000 else -1.0
+                vectors[row, hashed % self.dimension] += sign
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+    def _features(self, text: str) -> List[str]:
+        features = []
+        for token in tokenize(text):
+            features.append(f"w:{token}")
+            padded = f"<{token}>"
+            features.extend(
+                f"c:{padded[start:start + self.ngram_size]}" for start in range(max(1, len(padded) - self.ngram_size + 1))
+            )
+        return features
@@ -1,7 +1,12 @@
-from datetime import date
+from datetime import date, datetime
 from typing import List, Optional
 
-from sqlmodel import Field, Relationship, SQLModel, create_engine, Session
+from sqlalchemy import DateTime, Index, LargeBinary
+from sqlalchemy.engine import Engine
+from sqlmodel import Field, Relationship, SQLModel, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from tendara_ai_challenge.matching.database import get_async_engine, get_engine
 
 
 class Notice(SQLModel, table=True):
@@ -12,9 +17,15 @@ class Notice(SQLModel, table=True):
     volume: Optional[int] = Field(default=None)
     publication_deadline: Optional[date] = Field(default=None)
     submission_deadline: Optional[date] = Field(default=None)
+    token_count: Optional[int] = Field(default=None)  # Document length for BM25, set by the ETL.
+    external_id: Optional[str] = Field(default=None, index=True)  # Identity across incremental ETL runs.
+    content_hash: Optional[str] = Field(default=None)
+    cpv_codes: Optional[str] = Field(default=None)  # Comma-separated, like the tags of a profile.
+    corpus_version: Optional[int] = Field(default=None, index=True)  # Corpus version of the batch that last stored it.
 
     categories: List["NoticeCategory"] = Relationship(back_populates="notice")
     locations: List["NoticeLocation"] = Relationship(back_populates="notice")
+    tokens: List["NoticeToken"] = Relationship(back_populates="notice")
 
     def __repr__(self):
         return (
@@ -51,8 +62,16 @@ class Profile(SQLModel, table=True):
     location_id: Optional[int] = Field(default=None)
     tags: Optional[str] = Field(default=None)  # TODO: A better way to store tags.
     publication_deadline: Optional[date] = Field(default=None)  # TODO: Really use publication_deadline
-
-    # feedbacks: List["Feedback"] = Relationship(back_populates="profile")
+    # Optional criteria on top of the category and location; lists are comma-separated like the tags.
+    category_ids: Optional[str] = Field(default=None)
+    location_ids: Optional[str] = Field(default=None)
+    cpv_prefixes: Optional[str] = Field(default=None)
+    min_volume: Optional[int] = Field(default=None)
+    max_volume: Optional[int] = Field(default=None)
+    published_after: Optional[date] = Field(default=None)
+    published_before: Optional[date] = Field(default=None)
+    submission_after: Optional[date] = Field(default=None)
+    submission_before: Optional[date] = Field(default=None)
 
     def __repr__(self):
         return (
@@ -61,26 +80,43 @@ class Profile(SQLModel, table=True):
         )
 
 
-# class Feedback(SQLModel, table=True):
-#     id: Optional[int] = Field(default=None, primary_key=True)
-#     profile_id: Optional[int] = Field(default=None, foreign_key="profile.id")
-#     notice_id: Optional[int] = Field(default=None, foreign_key="notice.id")
-#     feedback_rating: Optional[int] = Field(default=None)
-#     feedback_text: Optional[str] = Field(default=None)
-#
-#     profile: "Profile" = Relationship(back_populates="feedbacks")
-#     notice: "Notice" = Relationship(back_populates="feedbacks")
-#
-#     def __repr__(self):
-#         return (
-#             f"<Feedback(profile_id={self.profile_id}, notice_id={self.notice_id}, "
-#             f"feedback_rating={self.feedback_rating}, feedback_text={self.feedback_text})>"
-#         )
-#
+class Feedback(SQLModel, table=True):
+    """A thumbs up (1) or down (-1) of a profile for a matched notice; the latest rating of a pair wins."""
+
+    __table_args__ = (Index("ix_feedback_profile_id_notice_id", "profile_id", "notice_id", unique=True),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    profile_id: Optional[int] = Field(default=None, foreign_key="profile.id")
+    notice_id: Optional[int] = Field(default=None, foreign_key="notice.id")
+    feedback_rating: Optional[int] = Field(default=None)
+    feedback_text: Optional[str] = Field(default=None)
+    created_at: Optional[datetime] = Field(default=None, sa_type=DateTime)
+
+    def __repr__(self):
+        return (
+            f"<Feedback(profile_id={self.profile_id}, notice_id={self.notice_id}, "
+            f"feedback_rating={self.feedback_rating}, feedback_text={self.feedback_text})>"
+        )
+
+
+class RerankerModel(SQLModel, table=True):
+    """The weights of a profile's learned reranker, trained offline from its feedback."""
+
+    profile_id: int = Field(primary_key=True, foreign_key="profile.id")
+    weights: bytes = Field(sa_type=LargeBinary)  # float64 array, one weight per reranking feature.
+    feedback_count: int = Field(default=0)
+    trained_at: datetime = Field(sa_type=DateTime)
+
+    def __repr__(self):
+        return f"<RerankerModel(profile_id={self.profile_id}, feedback_count={self.feedback_count}, trained_at={self.trained_at})>"
+
 
 class NoticeCategory(SQLModel, table=True):
+    # (category_id, notice_id) covers the matching join; notice_id alone serves lookups by notice.
+    __table_args__ = (Index("ix_noticecategory_category_id_notice_id", "category_id", "notice_id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    notice_id: int = Field(default=None, foreign_key="notice.id")
+    notice_id: int = Field(default=None, foreign_key="notice.id", index=True)
     category_id: int = Field(default=None, foreign_key="category.id")
 
     notice: "Notice" = Relationship(back_populates="categories")
@@ -91,8 +127,10 @@ class NoticeCategory(SQLModel, table=True):
 
 
 class NoticeLocation(SQLModel, table=True):
+    __table_args__ = (Index("ix_noticelocation_location_id_notice_id", "location_id", "notice_id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    notice_id: Optional[int] = Field(default=None, foreign_key="notice.id")
+    notice_id: Optional[int] = Field(default=None, foreign_key="notice.id", index=True)
     location_id: Optional[int] = Field(default=None, foreign_key="location.id")
 
     notice: "Notice" = Relationship(back_populates="locations")
@@ -102,16 +140,168 @@ class NoticeLocation(SQLModel, table=True):
         return f"<NoticeLocation(notice_id={self.notice_id}, location_id={self.location_id})>"
 
 
-sqlite_file_name = "database.db"
-sqlite_url = f"sqlite:///{sqlite_file_name}"
+class NoticeToken(SQLModel, table=True):
+    """A posting of the inverted index: how often `token` occurs in the title and description of a notice."""
+
+    # Covers posting-list reads, so they never touch the table itself.
+    __table_args__ = (Index("ix_noticetoken_token_notice_id", "token", "notice_id", "term_frequency"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    notice_id: int = Field(default=None, foreign_key="notice.id", index=True)
+    token: str
+    term_frequency: int = Field(default=1)
+
+    notice: "Notice" = Relationship(back_populates="tokens")
+
+    def __repr__(self):
+        return f"<NoticeToken(notice_id={self.notice_id}, token={self.token}, term_frequency={self.term_frequency})>"
+
+
+class TermStatistics(SQLModel, table=True):
+    """Number of notices containing `token`, maintained at ingest to compute its IDF."""
+
+    token: str = Field(primary_key=True)
+    document_frequency: int = Field(default=0)
+
+    def __repr__(self):
+        return f"<TermStatistics(token={self.token}, document_frequency={self.document_frequency})>"
+
+
+class CorpusStatistics(SQLModel, table=True):
+    """Single-row totals of the indexed notices, used for BM25's average document length."""
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    document_count: int = Field(default=0)
+    total_token_count: int = Field(default=0)
+
+    def __repr__(self):
+        return f"<CorpusStatistics(document_count={self.document_count}, total_token_count={self.total_token_count})>"
+
+
+class DataVersion(SQLModel, table=True):
+    """Counter bumped by every transaction changing a dataset, so processes deriving state from it notice changes.
+
+    One row per dataset, see `tendara_ai_challenge.matching.versions`.
+    """
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    value: int = Field(default=0)
+
+
+class ProfileMatch(SQLModel, table=True):
+    """Inbox entry: a notice matched against a stored profile when it was ingested."""
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    profile_id: int = Field(foreign_key="profile.id", index=True)
+    notice_id: int = Field(foreign_key="notice.id")
+    match_score: float = Field(default=0.0)  # BM25 score of the profile's tags, with the corpus statistics at ingest.
+
+    def __repr__(self):
+        return f"<ProfileMatch(profile_id={self.profile_id}, notice_id={self.notice_id}, match_score={self.match_score})>"
 
-engine = create_engine(sqlite_url, connect_args={"check_same_thread": False}, echo=True)
 
+class DigestMatch(SQLModel, table=True):
+    """A ranked match of a profile, as computed by the last bulk matching job for the nightly digest."""
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    profile_id: int = Field(foreign_key="profile.id", index=True)
+    notice_id: int = Field(foreign_key="notice.id")
+    rank: int = Field(default=0)
+    match_score: float = Field(default=0.0)
+
+    def __repr__(self):
+        return f"<DigestMatch(profile_id={self.profile_id}, notice_id={self.notice_id}, rank={self.rank})>"
+
+
+class SourceWatermark(SQLModel, table=True):
+    """How far the ETL got in a source: records consumed and the latest publication date seen."""
+
+    source: str = Field(primary_key=True)
+    offset: int = Field(default=0)
+    last_publication: Optional[datetime] = Field(default=None, sa_type=DateTime)
+
+    def __repr__(self):
+        return f"<SourceWatermark(source={self.source}, offset={self.offset}, last_publication={self.last_publication})>"
 
-def create_db_and_tables():
+
+class EtlJob(SQLModel, table=True):
+    """An ETL run of a source through the job queue, split into extract, classify and persist tasks."""
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    source: str
+    status: str = Field(default="pending")  # pending, done or failed.
+    chunk_size: int = Field(default=100)
+    incremental: bool = Field(default=False)
+    created_at: datetime = Field(sa_type=DateTime)
+    finished_at: Optional[datetime] = Field(default=None, sa_type=DateTime)
+
+    def __repr__(self):
+        return f"<EtlJob(id={self.id}, source={self.source}, status={self.status})>"
+
+
+class EtlTask(SQLModel, table=True):
+    """A checkpointed step of an `EtlJob`, leased by one worker at a time.
+
+    `payload` is the JSON input of the step: the source offset to extract from, or the notices of a chunk
+    (with their related ids once classified). `records` counts the notices the step handled.
+    """
+
+    # Serves the lease query: the next runnable task, downstream kinds first.
+    __table_args__ = (Index("ix_etltask_status_priority_id", "status", "priority", "id"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    job_id: int = Field(foreign_key="etljob.id", index=True)
+    kind: str  # extract, classify or persist.
+    priority: int = Field(default=0)
+    status: str = Field(default="pending")  # pending, leased, done or failed.
+    payload: str = Field(default="{}")
+    records: int = Field(default=0)
+    attempts: int = Field(default=0)
+    lease_owner: Optional[str] = Field(default=None)
+    lease_expires_at: Optional[datetime] = Field(default=None, sa_type=DateTime)
+    not_before: Optional[datetime] = Field(default=None, sa_type=DateTime)
+    error: Optional[str] = Field(default=None)
+    created_at: datetime = Field(sa_type=DateTime)
+    finished_at: Optional[datetime] = Field(default=None, sa_type=DateTime)
+
+    def __repr__(self):
+        return f"<EtlTask(id={self.id}, job_id={self.job_id}, kind={self.kind}, status={self.status}, attempts={self.attempts})>"
+
+
+def create_db_and_tables(engine: Optional[Engine] = None):
+    """Creates the missing tables, and adds to existing ones the columns and indexes of later versions."""
+    engine = engine or get_engine()
     SQLModel.metadata.create_all(engine)
+    add_missing_columns(engine)
+
+
+def add_missing_columns(engine: Engine) -> List[str]:
+    """Adds the columns a table lacks, e.g. those of `Notice` and `Profile` in a database of an earlier version.
+
+    `create_all` skips existing tables, so their new columns and indexes are added here; the new columns are
+    nullable and left NULL, for the backfills to fill in (see `ensure_token_index`).
+    Returns the added columns, as `table.column`.
+    """
+    added = []
+    with engine.begin() as connection:
+        for table in SQLModel.metadata.sorted_tables:
+            existing = {row[1] for row in connection.exec_driver_sql(f'PRAGMA table_info("{table.name}")')}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=connection.dialect)
+                    connection.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}')
+                    added.append(f"{table.name}.{column.name}")
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+    return added
 
 
 def get_session():
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
+        yield session
+
+
+async def get_async_session():
+    # Objects stay loaded after commit: expiring them would require lazy IO outside of an await.
+    async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
         yield session
@@ -0,0 +1,163 @@
+import argparse
+import logging
+from collections import Counter
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, delete, insert, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from sqlmodel import select
+
+from tendara_ai_challenge.matching.entity import (
+    CorpusStatistics, Notice, NoticeToken, TermStatistics, create_db_and_tables, get_session
+)
+from tendara_ai_challenge.matching.tokenizer import tokenize
+
+CORPUS_STATISTICS_ID = 1
+
+
+def term_frequencies(title: Optional[str], description: Optional[str]) -> Counter:
+    """Counts the tokens of a notice; title and description are indexed as a single document."""
+    return Counter(tokenize(title) + tokenize(description))
+
+
+def token_postings(notice_id: int, frequencies: Counter) -> List[dict]:
+    """Builds the `NoticeToken` rows of a notice, ready to be bulk-inserted."""
+    return [
+        {"notice_id": notice_id, "token": token, "term_frequency": term_frequency}
+        for token, term_frequency in frequencies.items()
+    ]
+
+
+def add_to_index(connection: Connection, postings: List[dict], token_count: int):
+    """Bulk-inserts postings and adds their notices to the term and corpus statistics, in the caller's transaction.
+
+    Only notices with postings are documents of the corpus, so that `remove_from_index` subtracts the same ones.
+    """
+    document_count = len({posting["notice_id"] for posting in postings})
+    if postings:
+        connection.execute(insert(NoticeToken.__table__), postings)
+
+        document_frequencies: Dict[str, int] = Counter(posting["token"] for posting in postings)
+        statement = sqlite_insert(TermStatistics.__table__)
+        connection.execute(
+            statement.on_conflict_do_update(
+                index_elements=["token"],
+                set_={"document_frequency": TermStatistics.__table__.c.document_frequency + statement.excluded.document_frequency}
+            ),
+            [{"token": token, "document_frequency": frequency} for token, frequency in document_frequencies.items()]
+        )
+
+    statement = sqlite_insert(CorpusStatistics.__table__).values(
+        id=CORPUS_STATISTICS_ID, document_count=document_count, total_token_count=token_count
+    )
+    columns = CorpusStatistics.__table__.c
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=["id"],
+        set_={
+            "document_count": columns.document_count + statement.excluded.document_count,
+            "total_token_count": columns.total_token_count + statement.excluded.total_token_count,
+        }
+    ))
+
+
+def remove_from_index(connection: Connection, notice_ids: List[int]):
+    """Deletes the postings of notices and subtracts them from the term and corpus statistics, in the caller's transaction."""
+    if not notice_ids:
+        return
+    postings = connection.execute(
+        select(NoticeToken.notice_id, NoticeToken.token, NoticeToken.term_frequency).where(NoticeToken.notice_id.in_(notice_ids))
+    ).all()
+    connection.execute(delete(NoticeToken.__table__).where(NoticeToken.__table__.c.notice_id.in_(notice_ids)))
+
+    terms = TermStatistics.__table__
+    document_frequencies: Dict[str, int] = Counter(token for _, token, _ in postings)
+    if document_frequencies:
+        connection.execute(
+            update(terms)
+            .where(terms.c.token == bindparam("removed_token"))
+            .values(document_frequency=terms.c.document_frequency - bindparam("removed")),
+            [{"removed_token": token, "removed": frequency} for token, frequency in document_frequencies.items()]
+        )
+        connection.execute(delete(terms).where(terms.c.document_frequency <= 0))
+
+    columns = CorpusStatistics.__table__.c
+    connection.execute(
+        update(CorpusStatistics.__table__)
+        .where(columns.id == CORPUS_STATISTICS_ID)
+        .values(
+            # Notices without postings, e.g. never indexed or without text, were never counted.
+            document_count=columns.document_count - len({notice_id for notice_id, _, _ in postings}),
+            total_token_count=columns.total_token_count - sum(term_frequency for _, _, term_frequency in postings),
+        )
+    )
+
+
+def rebuild_token_index(db: Session, batch_size: int = 1000) -> int:
+    """Re-creates the postings and statistics of every stored notice, e.g. for notices stored before the index existed.
+
+    Returns the number of indexed notices.
+    """
+    connection = db.connection()
+    for table in (NoticeToken.__table__, TermStatistics.__table__, CorpusStatistics.__table__):
+        connection.execute(delete(table))
+
+    indexed = 0
+    last_id = 0
+    while True:
+        rows = db.exec(
+            select(Notice.id, Notice.title, Notice.description)
+            .where(Notice.id > last_id)
+            .order_by(Notice.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+
+        postings = []
+        lengths = []
+        for notice_id, title, description in rows:
+            frequencies = term_frequencies(title, description)
+            postings.extend(token_postings(notice_id, frequencies))
+            lengths.append({"notice_id": notice_id, "length": sum(frequencies.values())})
+
+        notices = Notice.__table__
+        connection.execute(
+            update(notices).where(notices.c.id == bindparam("notice_id")).values(token_count=bindparam("length")),
+            lengths
+        )
+        add_to_index(connection, postings, sum(length["length"] for length in lengths))
+        indexed += len(rows)
+        last_id = rows[-1][0]
+
+    db.commit()
+    return indexed
+
+
+def ensure_token_index(db: Session) -> int:
+    """Rebuilds the token index if some notice was stored without it, e.g. by a version predating the index.
+
+    Indexed notices always have a `token_count`, so a NULL one means their postings are missing.
+    Returns the number of indexed notices, 0 when the index was complete.
+    """
+    if db.exec(select(Notice.id).where(Notice.token_count.is_(None)).limit(1)).first() is None:
+        return 0
+    indexed = rebuild_token_index(db)
+    logging.info("Rebuilt the token index of %d notices stored without it", indexed)
+    return indexed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuilds the token index of every stored notice.")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Notices indexed per statement.")
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    create_db_and_tables()
+    for session in get_session():
+        print(f"Indexed {rebuild_token_index(session, arguments.batch_size)} notices")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,40 +1,166 @@
-from typing import List
+from typing import List, Optional, Tuple
 
-from sqlalchemy import select, and_
-from sqlalchemy.orm import Session, selectinload
+import numpy as np
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
 from sqlmodel import select
 
-from tendara_ai_challenge.matching.entity import Profile, Notice, NoticeCategory, NoticeLocation
+from tendara_ai_challenge.matching.bitmap import NoticeBitmapIndex, profile_criteria, to_ids
+from tendara_ai_challenge.matching.dto import MatchedNotice
+from tendara_ai_challenge.matching.embedding import Embedder
+from tendara_ai_challenge.matching.entity import Profile, Notice, NoticeCategory, NoticeLocation, NoticeToken
+from tendara_ai_challenge.matching.ranking import Bm25Scorer, top_k
+from tendara_ai_challenge.matching.reranker import Reranker
+from tendara_ai_challenge.matching.tokenizer import parse_tags, tag_tokens
+from tendara_ai_challenge.matching.vector_index import VectorIndex
 
+# SQLite binds at most 32766 parameters per statement.
+MAX_BOUND_IDS = 10_000
 
-def find_relevant_notices(profile: Profile, db: Session) -> List[Notice]:
+
+def find_relevant_notices(profile: Profile, db: Session, limit: Optional[int] = None) -> List[Notice]:
     """Given the company's search profile and all notices, returns only the relevant notices for the company."""
-    profile_tags_set = set(tag.lower() for tag in profile.tags.split(", ")) if profile.tags else set()
+    return [notice for notice, score in rank_relevant_notices(profile, db, limit)]
+
+
+def rank_relevant_notices(profile: Profile, db: Session, limit: Optional[int] = None) -> List[Tuple[Notice, float]]:
+    """Returns the notices matching the profile's category and location, with their BM25 score for the profile's tags.
+
+    Notices are ordered by descending score; only the best `limit` notices are loaded from the database.
+    """
+    ranked_ids = score_relevant_notices(profile, db, limit)
+    notice_ids = [notice_id for notice_id, score in ranked_ids]
+    notices = {notice.id: notice for notice in db.exec(select(Notice).where(Notice.id.in_(notice_ids)))}
+    return [(notices[notice_id], score) for notice_id, score in ranked_ids]
+
+
+def rank_semantic_notices(
+        profile: Profile,
+        db: Session,
+        index: VectorIndex,
+        embedder: Embedder,
+        limit: int = 10,
+        n_probe: Optional[int] = None,
+) -> List[Tuple[int, float]]:
+    """Returns the ids and cosine similarities of the notices whose text is closest to the profile's tags.
+
+    Only notices matching the profile's category and location are considered, so an "AI" profile can match
+    a "citizen-facing chatbot" notice that shares no keyword with it.
+    """
+    query = embedder.embed([" ".join(parse_tags(profile.tags))])
+    candidates = candidate_notices(db, profile.category_id, profile.location_id)
+    candidate_ids = np.array([notice_id for notice_id, _ in candidates], dtype=np.int64)
+    return index.search(query, limit, candidate_ids=candidate_ids, n_probe=n_probe)[0]
+
+
+def load_matched_notices(db: Session, ranked_ids: List[Tuple[int, float]], fields: List[str]) -> List[MatchedNotice]:
+    """Loads only the given `fields` of the ranked notices, keeping their order."""
+    rows = db.exec(
+        select(*(getattr(Notice, field) for field in fields)).where(Notice.id.in_([notice_id for notice_id, _ in ranked_ids]))
+    ).all()
+    values = {row[0]: dict(zip(fields, row)) for row in rows}
+    return [MatchedNotice(**values[notice_id], match_score=score) for notice_id, score in ranked_ids]
+
+
+def score_relevant_notices(
+        profile: Profile,
+        db: Session,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[float, int]] = None,
+        bitmaps: Optional[NoticeBitmapIndex] = None,
+        reranker: Optional[Reranker] = None,
+) -> List[Tuple[int, float]]:
+    """Returns the ids and BM25 scores of the best `limit` notices matching the profile, best first.
+
+    With `after`, a (score, id) key of a previous result, only the notices ranked after it are considered.
+    With `bitmaps`, they are every notice satisfying all the profile's criteria, not only its category and location.
+    With a `reranker`, the candidates are ranked by the profile's learned model instead of their BM25 score alone.
+    """
+    scorer = Bm25Scorer(db, tag_tokens(profile.tags))
+    if bitmaps is not None:
+        # One state for both, as a refresh in another thread may publish the next one meanwhile.
+        state = bitmaps.current
+        notice_ids = to_ids(state.match(profile_criteria(profile)))
+        document_lengths = state.token_counts[notice_ids].astype(np.float64)
+        postings = load_postings(db, scorer.tokens, notice_ids) if len(notice_ids) else []
+    else:
+        candidates = candidate_notices(db, profile.category_id, profile.location_id)
+        notice_ids = np.array([notice_id for notice_id, token_count in candidates], dtype=np.int64)
+        document_lengths = np.array([token_count or 0 for notice_id, token_count in candidates], dtype=np.float64)
+        # Score the tags from the union of their posting lists, restricted to the candidates
+        postings = candidate_postings(db, profile.category_id, profile.location_id, scorer.tokens) if len(notice_ids) else []
+
+    posting_ids = np.array([notice_id for notice_id, _, _ in postings], dtype=np.int64)
+    posting_positions = scorer.token_positions(token for _, token, _ in postings)
+    term_frequencies = np.array([term_frequency for _, _, term_frequency in postings], dtype=np.float64)
 
-    # Define the query to filter notices based on Profile's category, location, and tags
-    statement = (
-        select(Notice)
+    document_positions = np.searchsorted(notice_ids, posting_ids)
+    scores = scorer.score(document_lengths, document_positions, posting_positions, term_frequencies)
+    if reranker is not None:
+        # Postings are distinct per notice and token, so a notice's postings count the tags it contains.
+        scores = reranker.score(notice_ids, scores, np.bincount(document_positions, minlength=len(notice_ids)))
+    if after is not None:
+        after_score, after_id = after
+        remaining = (scores < after_score) | ((scores == after_score) & (notice_ids > after_id))
+        notice_ids, scores = notice_ids[remaining], scores[remaining]
+    return top_k(notice_ids, scores, limit)
+
+
+def candidate_notices(db: Session, category_id: int, location_id: int) -> List[Tuple[int, Optional[int]]]:
+    """Fetches only the ids and document lengths of the notices in a category and location, by id."""
+    return db.exec(candidate_notices_statement(category_id, location_id)).all()
+
+
+def candidate_postings(db: Session, category_id: int, location_id: int, tokens: List[str]) -> List[Tuple[int, str, int]]:
+    """Fetches the (notice id, token, term frequency) postings of `tokens` in the notices of a category and location.
+
+    This is the union of the tokens' posting lists, intersected with the category and location links.
+    """
+    if not tokens:
+        return []
+    return db.exec(candidate_postings_statement(category_id, location_id, tokens)).all()
+
+
+def load_postings(db: Session, tokens: List[str], notice_ids: Optional[np.ndarray] = None) -> List[Tuple[int, str, int]]:
+    """Fetches the (notice id, token, term frequency) postings of `tokens`, in every notice or only in `notice_ids`.
+
+    The ids are bound in batches of `MAX_BOUND_IDS`, each read as index seeks on (token, notice id).
+    """
+    if not tokens:
+        return []
+    statement = select(NoticeToken.notice_id, NoticeToken.token, NoticeToken.term_frequency).where(NoticeToken.token.in_(tokens))
+    if notice_ids is None:
+        return db.exec(statement).all()
+    postings = []
+    for start in range(0, len(notice_ids), MAX_BOUND_IDS):
+        batch = notice_ids[start:start + MAX_BOUND_IDS].tolist()
+        postings.extend(db.exec(statement.where(NoticeToken.notice_id.in_(batch))).all())
+    return postings
+
+
+def candidate_notices_statement(category_id: int, location_id: int):
+    return (
+        select(Notice.id, Notice.token_count)
         .join(NoticeLocation, NoticeLocation.notice_id == Notice.id)
         .join(NoticeCategory, NoticeCategory.notice_id == Notice.id)
-        .where(
-            and_(
-                NoticeCategory.category_id == profile.category_id,
-                NoticeLocation.location_id == profile.location_id
-            )
-        )
-        .options(selectinload(Notice.categories), selectinload(Notice.locations))
+        .where(_category_and_location(category_id, location_id))
+        .distinct()
+        .order_by(Notice.id)
     )
 
-    # Execute the query
-    relevant_notices = db.exec(statement).all()
 
-    # Filter and sort notices based on tag overlap in description
-    filtered_notices = [
-        (notice, sum(1 for word in notice.description.lower().split() if word in profile_tags_set))
-        for notice in relevant_notices
-    ]
+def candidate_postings_statement(category_id: int, location_id: int, tokens: List[str]):
+    return (
+        select(NoticeToken.notice_id, NoticeToken.token, NoticeToken.term_frequency)
+        .join(NoticeLocation, NoticeLocation.notice_id == NoticeToken.notice_id)
+        .join(NoticeCategory, NoticeCategory.notice_id == NoticeToken.notice_id)
+        .where(_category_and_location(category_id, location_id), NoticeToken.token.in_(tokens))
+        .distinct()
+    )
 
-    # Sort by match count in descending order
-    sorted_notices = [notice for notice, match_count in sorted(filtered_notices, key=lambda x: x[1], reverse=True)]
 
-    return sorted_notices
+def _category_and_location(category_id: int, location_id: int):
+    return and_(
+        NoticeCategory.category_id == category_id,
+        NoticeLocation.location_id == location_id
+    )
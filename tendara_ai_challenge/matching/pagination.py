@@ -0,0 +1,37 @@
+import base64
+import json
+from typing import List, Optional, Tuple
+
+from tendara_ai_challenge.matching.dto import MatchedNotice
+
+NOTICE_FIELDS = tuple(field for field in MatchedNotice.model_fields if field != "match_score")
+
+
+class InvalidPageRequest(ValueError):
+    pass
+
+
+def encode_cursor(score: float, notice_id: int) -> str:
+    """Encodes the sort key of the last returned match, from which the next page continues."""
+    return base64.urlsafe_b64encode(json.dumps([score, notice_id]).encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[float, int]]:
+    if cursor is None:
+        return None
+    try:
+        score, notice_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(score), int(notice_id)
+    except (ValueError, TypeError) as error:
+        raise InvalidPageRequest("Invalid cursor") from error
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """Parses a `fields=title,volume` projection; the notice id is always returned."""
+    if fields is None:
+        return list(NOTICE_FIELDS)
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = sorted(set(requested) - set(NOTICE_FIELDS))
+    if unknown:
+        raise InvalidPageRequest(f"Unknown fields: {', '.join(unknown)}")
+    return ["id"] + [field for field in NOTICE_FIELDS if field in requested and field != "id"]
@@ -0,0 +1,94 @@
+from collections import Counter, defaultdict
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from sqlmodel import select
+
+from tendara_ai_challenge.matching.aho_corasick import AhoCorasick
+from tendara_ai_challenge.matching.bitmap import cpv_prefix, profile_criteria
+from tendara_ai_challenge.matching.dto import NoticeModel, ProfileCriteria
+from tendara_ai_challenge.matching.entity import Profile
+from tendara_ai_challenge.matching.tokenizer import parse_tags, tag_tokens, tokenize
+
+
+class ProfilePercolator:
+    """Reverse index of all stored profiles, matching each new notice against every profile in one pass.
+
+    Profiles are bucketed by each (category id, location id) of their criteria, and all their tags are
+    compiled into a single Aho-Corasick automaton over the tokenized notice text. A notice matches the
+    profiles of the buckets of its categories and locations whose other criteria it satisfies, scored by
+    how many times their tags occur in its text. `tokens` holds the tag tokens of each profile, to score
+    the matches with BM25 like the matches API.
+    """
+
+    def __init__(self, profiles: Iterable[Profile]):
+        self.buckets: Dict[Tuple[int, int], Set[int]] = defaultdict(set)
+        self.criteria: Dict[int, ProfileCriteria] = {}
+        self.tokens: Dict[int, Set[str]] = {}
+        self.automaton: AhoCorasick[int] = AhoCorasick()
+        for profile in profiles:
+            criteria = profile_criteria(profile)
+            for category_id in criteria.category_ids:
+                for location_id in criteria.location_ids:
+                    self.buckets[(category_id, location_id)].add(profile.id)
+            if not criteria.is_single_category_and_location:
+                self.criteria[profile.id] = criteria
+            self.tokens[profile.id] = tag_tokens(profile.tags)
+            for tag in parse_tags(profile.tags):
+                phrase = " ".join(tokenize(tag))
+                if phrase:
+                    self.automaton.add(phrase, profile.id)
+        self.automaton.build()
+
+    @classmethod
+    def from_database(cls, db: Union[Session, Connection]) -> "ProfilePercolator":
+        return cls(db.execute(select(Profile.__table__)).all())
+
+    def match(self, notice: NoticeModel, category_ids: List[int], location_ids: List[int]) -> List[Tuple[int, float]]:
+        """Returns the (profile id, tag hits) pairs of the profiles matching a notice."""
+        profile_ids = set()
+        for category_id in category_ids:
+            for location_id in location_ids:
+                profile_ids |= self.buckets.get((category_id, location_id), set())
+        profile_ids = {
+            profile_id for profile_id in profile_ids
+            if profile_id not in self.criteria or satisfies(notice, self.criteria[profile_id])
+        }
+        if not profile_ids:
+            return []
+
+        # Tokens are joined by single spaces, so a keyword occurrence is a whole-token match when it is
+        # delimited by spaces or the ends of the text.
+        normalized = " ".join(tokenize(f"{notice.title} {notice.description}"))
+        hits = Counter(
+            profile_id for start, end, profile_id in self.automaton.iter(normalized)
+            if profile_id in profile_ids
+            and (start == 0 or normalized[start - 1] == " ")
+            and (end == len(normalized) or normalized[end] == " ")
+        )
+        return [(profile_id, float(hits[profile_id])) for profile_id in sorted(profile_ids)]
+
+
+def satisfies(notice: NoticeModel, criteria: ProfileCriteria) -> bool:
+    """Whether a notice satisfies the CPV, volume and date criteria, like `NoticeBitmapIndex.match` of a stored one."""
+    if criteria.cpv_prefixes:
+        prefixes = [cpv_prefix(prefix) for prefix in criteria.cpv_prefixes]
+        if not any(cpv_prefix(code).startswith(prefix) for code in notice.cpv_codes for prefix in prefixes):
+            return False
+    return (
+        _between(notice.volume, criteria.min_volume, criteria.max_volume)
+        and _between(_date(notice.publication_deadline), criteria.published_after, criteria.published_before)
+        and _between(_date(notice.submission_deadline), criteria.submission_after, criteria.submission_before)
+    )
+
+
+def _between(value, minimum, maximum) -> bool:
+    if minimum is None and maximum is None:
+        return True
+    return value is not None and (minimum is None or value >= minimum) and (maximum is None or value <= maximum)
+
+
+def _date(value: Optional[Union[date, datetime]]) -> Optional[date]:
+    return value.date() if isinstance(value, datetime) else value
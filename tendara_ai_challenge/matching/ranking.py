@@ -0,0 +1,87 @@
+from typing import Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from sqlmodel import select
+
+from tendara_ai_challenge.matching.entity import CorpusStatistics, TermStatistics
+
+K1 = 1.2
+B = 0.75
+
+
+class Bm25Scorer:
+    """Okapi BM25 over the notice token index, using the document lengths and IDF stored at ingest."""
+
+    def __init__(self, db: Union[Session, Connection], tokens: Iterable[str], k1: float = K1, b: float = B):
+        self.k1 = k1
+        self.b = b
+        self.tokens = sorted(set(tokens))
+
+        corpus = db.execute(
+            select(CorpusStatistics.document_count, CorpusStatistics.total_token_count).where(CorpusStatistics.id == 1)
+        ).first()
+        self.document_count = corpus.document_count if corpus else 0
+        self.average_length = corpus.total_token_count / corpus.document_count if corpus and corpus.document_count else 1.0
+
+        document_frequencies = dict(db.execute(
+            select(TermStatistics.token, TermStatistics.document_frequency).where(TermStatistics.token.in_(self.tokens))
+        ).all()) if self.tokens else {}
+        frequencies = np.array([document_frequencies.get(token, 0) for token in self.tokens], dtype=np.float64)
+        self.idf = np.log1p((self.document_count - frequencies + 0.5) / (frequencies + 0.5))
+
+    def token_positions(self, tokens: Iterable[str]) -> np.ndarray:
+        """Maps query tokens to their position in `self.tokens`."""
+        positions = {token: position for position, token in enumerate(self.tokens)}
+        return np.fromiter((positions[token] for token in tokens), dtype=np.int64)
+
+    def score(
+            self,
+            document_lengths: np.ndarray,
+            document_positions: np.ndarray,
+            token_positions: np.ndarray,
+            term_frequencies: np.ndarray,
+    ) -> np.ndarray:
+        """Scores all documents at once from their postings.
+
+        `document_lengths` holds one entry per candidate document; each posting `i` says that the token at
+        `token_positions[i]` occurs `term_frequencies[i]` times in the document at `document_positions[i]`.
+        """
+        if len(term_frequencies) == 0:
+            return np.zeros(len(document_lengths), dtype=np.float64)
+        contributions = self.term_weights(document_lengths, document_positions, token_positions, term_frequencies)
+        return np.bincount(document_positions, weights=contributions, minlength=len(document_lengths))
+
+    def term_weights(
+            self,
+            document_lengths: np.ndarray,
+            document_positions: np.ndarray,
+            token_positions: np.ndarray,
+            term_frequencies: np.ndarray,
+    ) -> np.ndarray:
+        """Returns the BM25 contribution of each posting, the score of a document being the sum of its postings'."""
+        lengths = document_lengths[document_positions]
+        term_frequencies = term_frequencies.astype(np.float64)
+        normalization = self.k1 * (1 - self.b + self.b * lengths / self.average_length)
+        return self.idf[token_positions] * term_frequencies * (self.k1 + 1) / (term_frequencies + normalization)
+
+
+def top_k(ids: np.ndarray, scores: np.ndarray, limit: Optional[int] = None) -> List[Tuple[int, float]]:
+    """Returns the `limit` best (id, score) pairs, by descending score then ascending id.
+
+    Only the selected entries are sorted: the score of the `limit`-th entry is found by partitioning in
+    linear time, and ties on that score are broken by id so the selection is deterministic.
+    """
+    if limit is not None and limit < len(ids):
+        if limit <= 0:
+            return []
+        threshold = np.partition(scores, len(scores) - limit)[len(scores) - limit]
+        above = np.flatnonzero(scores > threshold)
+        tied = np.flatnonzero(scores == threshold)
+        tied = tied[np.argsort(ids[tied], kind="stable")][:limit - len(above)]
+        selected = np.concatenate([above, tied])
+    else:
+        selected = np.arange(len(ids))
+    order = selected[np.lexsort((ids[selected], -scores[selected]))]
+    return [(int(ids[position]), float(scores[position])) for position in order]
@@ -0,0 +1,385 @@
+import argparse
+import logging
+import threading
+import time
+import zlib
+from dataclasses import dataclass, replace
+from datetime import date, datetime
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from sqlmodel import select
+
+from tendara_ai_challenge.matching.bitmap import MISSING, NoticeBitmapIndex, NoticeBitmaps, day_number, notice_bitmaps, updated_notice_ids
+from tendara_ai_challenge.matching.cache import match_cache
+from tendara_ai_challenge.matching.dto import RerankerTrainingStats
+from tendara_ai_challenge.matching.entity import Feedback, Notice, NoticeToken, Profile, RerankerModel, get_session
+from tendara_ai_challenge.matching.ranking import Bm25Scorer
+from tendara_ai_challenge.matching.tokenizer import tag_tokens, tokenize
+from tendara_ai_challenge.matching.versions import CORPUS_VERSION_ID, bump_version, read_version
+
+TEXT_FEATURES = 32
+
+FEATURES = (
+    "bias", "bm25", "tag_hits", "category_match", "location_match", "log_volume", "submission_years", "publication_years",
+    *(f"text_{bucket}" for bucket in range(TEXT_FEATURES)),
+)
+
+# Without feedback to move it, a model ranks like BM25.
+PRIOR_WEIGHTS = np.zeros(len(FEATURES))
+PRIOR_WEIGHTS[FEATURES.index("bm25")] = 1.0
+
+
+@dataclass(eq=False)
+class NoticeTextVectors:
+    """One consistent state of `NoticeTextFeatures`, never modified once it published it."""
+
+    vectors: np.ndarray
+    indexed: np.ndarray
+    count: int = 0
+    max_id: int = 0
+    version: int = 0  # Corpus version of the last refresh.
+
+    @classmethod
+    def empty(cls, dimension: int) -> "NoticeTextVectors":
+        return cls(np.zeros((1, dimension), dtype=np.float32), np.zeros(1, dtype=bool))
+
+    def copy(self) -> "NoticeTextVectors":
+        return replace(self, vectors=self.vectors.copy(), indexed=self.indexed.copy())
+
+    def add(self, notice_ids: List[int], vectors: np.ndarray):
+        """Indexes the vectors of notices in place, replacing those indexed before; only for an unpublished state."""
+        ids = np.array(notice_ids, dtype=np.int64)
+        self._grow(int(ids.max()) + 1)
+        self.vectors[ids] = vectors
+        self.count += int(np.count_nonzero(~self.indexed[ids]))
+        self.indexed[ids] = True
+        self.max_id = max(self.max_id, int(ids.max()))
+
+    def rows(self, notice_ids: np.ndarray) -> np.ndarray:
+        """The vectors of the notices, zero for notices not indexed yet."""
+        return _column(self.vectors, notice_ids, 0.0)
+
+    def _grow(self, size: int):
+        if size <= len(self.vectors):
+            return
+        capacity = max(size, 2 * len(self.vectors))
+        vectors = np.zeros((capacity, self.vectors.shape[1]), dtype=np.float32)
+        vectors[:len(self.vectors)] = self.vectors
+        indexed = np.zeros(capacity, dtype=bool)
+        indexed[:len(self.indexed)] = self.indexed
+        self.vectors, self.indexed = vectors, indexed
+
+
+class NoticeTextFeatures:
+    """Hashed bag-of-words vectors of the notice titles and descriptions, as a dense matrix indexed by notice id.
+
+    Tokens are hashed into `dimension` signed buckets, so a reranker can learn which words a profile likes
+    without a vocabulary. Like the bitmap index, it is refreshed incrementally with the notices stored or updated since,
+    on a copy of its `current` state that is published once complete.
+    """
+
+    def __init__(self, dimension: int = TEXT_FEATURES):
+        self.dimension = dimension
+        self._lock = threading.Lock()
+        self.current = NoticeTextVectors.empty(dimension)
+
+    def clear(self):
+        with self._lock:
+            self.current = NoticeTextVectors.empty(self.dimension)
+
+    @property
+    def count(self) -> int:
+        return self.current.count
+
+    @property
+    def max_id(self) -> int:
+        return self.current.max_id
+
+    @property
+    def version(self) -> int:
+        return self.current.version
+
+    def add(self, notice_ids: List[int], texts: List[str]):
+        """Indexes the texts of notices, replacing those indexed before."""
+        if not notice_ids:
+            return
+        with self._lock:
+            state = self.current.copy()
+            state.add(notice_ids, hash_texts(texts, self.dimension))
+            self.current = state
+
+    def refresh(self, db: Session, batch_size: int = 10_000) -> int:
+        """Indexes the notices stored or updated since the last refresh, or everything again if notices were deleted."""
+        with self._lock:
+            current = self.current
+            version = read_version(db, CORPUS_VERSION_ID)
+            max_id, count = db.exec(select(func.max(Notice.id), func.count(Notice.id))).one()
+            state = NoticeTextVectors.empty(self.dimension) if count < current.count or (max_id or 0) < current.max_id else None
+
+            indexed = 0
+            base = current if state is None else state
+            for notice_ids in updated_notice_ids(db, base.version, base.max_id, batch_size):
+                state = current.copy() if state is None else state
+                indexed += self._add_rows(state, db.exec(
+                    select(Notice.id, Notice.title, Notice.description).where(Notice.id.in_(notice_ids))
+                ).all())
+            while True:
+                rows = db.exec(
+                    select(Notice.id, Notice.title, Notice.description)
+                    .where(Notice.id > (current if state is None else state).max_id).order_by(Notice.id).limit(batch_size)
+                ).all()
+                if not rows:
+                    break
+                state = current.copy() if state is None else state
+                indexed += self._add_rows(state, rows)
+
+            self.current = replace(current if state is None else state, version=version)
+            return indexed
+
+    def _add_rows(self, state: NoticeTextVectors, rows: List[Tuple[int, Optional[str], Optional[str]]]) -> int:
+        texts = [f"{title or ''} {description or ''}" for _, title, description in rows]
+        state.add([notice_id for notice_id, _, _ in rows], hash_texts(texts, self.dimension))
+        return len(rows)
+
+    def rows(self, notice_ids: np.ndarray) -> np.ndarray:
+        """The vectors of the notices, zero for notices not indexed yet."""
+        return self.current.rows(notice_ids)
+
+
+class Reranker:
+    """A profile's logistic model over cheap features of its candidate notices.
+
+    The features of all candidates are read from in-memory columns and scored in one matrix-vector product,
+    so reranking runs no query and adds microseconds per candidate.
+    """
+
+    def __init__(self, profile: Profile, weights: np.ndarray, bitmaps: NoticeBitmapIndex, text_features: NoticeTextFeatures):
+        self.profile = profile
+        self.weights = weights
+        self.bitmaps = bitmaps
+        self.text_features = text_features
+
+    def score(self, notice_ids: np.ndarray, bm25_scores: np.ndarray, tag_hits: np.ndarray) -> np.ndarray:
+        """Returns the log-odds of a thumbs up of every candidate, see `probability`.
+
+        Unlike probabilities, they do not saturate, so the best candidates are not tied at 1.0.
+        """
+        features = reranking_features(
+            self.profile, notice_ids, bm25_scores, tag_hits, self.bitmaps.current, self.text_features.current, day_number(date.today())
+        )
+        return features @ self.weights
+
+
+def reranking_features(
+        profile: Profile,
+        notice_ids: np.ndarray,
+        bm25_scores: np.ndarray,
+        tag_hits: np.ndarray,
+        bitmaps: NoticeBitmaps,
+        text_features: NoticeTextVectors,
+        today: Union[int, np.ndarray],
+) -> np.ndarray:
+    """Returns the `FEATURES` of the notices for the profile, one row per notice, from one state of each index.
+
+    Deadlines are measured in years from `today`, a day number for all notices or one per notice.
+    """
+    features = np.empty((len(notice_ids), len(FEATURES)), dtype=np.float64)
+    features[:, 0] = 1.0
+    features[:, 1] = bm25_scores
+    features[:, 2] = tag_hits / max(len(tag_tokens(profile.tags)), 1)
+    features[:, 3] = _members(bitmaps.categories.get(profile.category_id, 0), notice_ids)
+    features[:, 4] = _members(bitmaps.locations.get(profile.location_id, 0), notice_ids)
+
+    volumes = _column(bitmaps.volumes, notice_ids, MISSING)
+    features[:, 5] = np.where(volumes == MISSING, 0.0, np.log1p(np.maximum(volumes, 0)) / 10)
+    submission_days = _column(bitmaps.submission_days, notice_ids, MISSING)
+    features[:, 6] = np.where(submission_days == MISSING, 0.0, np.clip((submission_days - today) / 365, -1, 1))
+    publication_days = _column(bitmaps.publication_days, notice_ids, MISSING)
+    features[:, 7] = np.where(publication_days == MISSING, 0.0, np.clip((today - publication_days) / 365, -1, 1))
+
+    features[:, 8:] = text_features.rows(notice_ids)
+    return features
+
+
+def fit_logistic(features: np.ndarray, labels: np.ndarray, prior: np.ndarray = PRIOR_WEIGHTS, l2: float = 1.0, iterations: int = 25) -> np.ndarray:
+    """Fits logistic regression weights by Newton's method, with an L2 penalty pulling them towards `prior`.
+
+    The penalty does not grow with the number of examples, so the more feedback, the further the weights move.
+    """
+    weights = prior.astype(np.float64)
+    labels = labels.astype(np.float64)
+    identity = np.eye(len(weights))
+    for _ in range(iterations):
+        probabilities = _sigmoid(features @ weights)
+        gradient = features.T @ (probabilities - labels) + l2 * (weights - prior)
+        hessian = (features.T * (probabilities * (1 - probabilities))) @ features + l2 * identity
+        step = np.linalg.solve(hessian, gradient)
+        weights -= step
+        if np.abs(step).max() < 1e-8:
+            break
+    return weights
+
+
+def train_reranker(
+        db: Session,
+        profile: Profile,
+        bitmaps: NoticeBitmapIndex,
+        text_features: NoticeTextFeatures,
+        l2: float = 1.0,
+) -> Optional[RerankerModel]:
+    """Fits the reranker of a profile to its feedback, with each notice's features as of when it was rated.
+
+    The indexes must be refreshed; the model is added to the session but not committed.
+    """
+    feedback = db.exec(
+        select(Feedback.notice_id, Feedback.feedback_rating, Feedback.created_at)
+        .where(Feedback.profile_id == profile.id)
+        .order_by(Feedback.notice_id)
+    ).all()
+    if not feedback:
+        return None
+
+    bitmaps, text_features = bitmaps.current, text_features.current
+    notice_ids = np.array([notice_id for notice_id, _, _ in feedback], dtype=np.int64)
+    scorer = Bm25Scorer(db, tag_tokens(profile.tags))
+    postings = db.exec(
+        select(NoticeToken.notice_id, NoticeToken.token, NoticeToken.term_frequency)
+        .where(NoticeToken.token.in_(scorer.tokens), NoticeToken.notice_id.in_(notice_ids.tolist()))
+    ).all() if scorer.tokens else []
+    document_positions = np.searchsorted(notice_ids, np.array([notice_id for notice_id, _, _ in postings], dtype=np.int64))
+    bm25_scores = scorer.score(
+        _column(bitmaps.token_counts, notice_ids, 0).astype(np.float64),
+        document_positions,
+        scorer.token_positions(token for _, token, _ in postings),
+        np.array([term_frequency for _, _, term_frequency in postings], dtype=np.float64),
+    )
+    tag_hits = np.bincount(document_positions, minlength=len(notice_ids))
+    rated_days = np.array([day_number(created_at or datetime.now()) for _, _, created_at in feedback], dtype=np.int64)
+
+    features = reranking_features(profile, notice_ids, bm25_scores, tag_hits, bitmaps, text_features, rated_days)
+    weights = fit_logistic(features, np.array([rating > 0 for _, rating, _ in feedback]), l2=l2)
+
+    model = db.get(RerankerModel, profile.id) or RerankerModel(profile_id=profile.id)
+    model.weights = weights.tobytes()
+    model.feedback_count = len(feedback)
+    model.trained_at = datetime.now()
+    db.add(model)
+    return model
+
+
+def train_rerankers(db: Session, min_feedback: int = 5, l2: float = 1.0) -> RerankerTrainingStats:
+    """Trains the reranker of every profile with at least `min_feedback` ratings, replacing its stored model."""
+    started = time.perf_counter()
+    notice_bitmaps.refresh(db)
+    notice_text_features.refresh(db)
+    rated = db.exec(
+        select(Feedback.profile_id, func.count(Feedback.id))
+        .group_by(Feedback.profile_id)
+        .having(func.count(Feedback.id) >= min_feedback)
+    ).all()
+
+    stats = RerankerTrainingStats()
+    for profile_id, feedback_count in rated:
+        profile = db.get(Profile, profile_id)
+        if profile is None or train_reranker(db, profile, notice_bitmaps, notice_text_features, l2) is None:
+            continue
+        stats.profiles += 1
+        stats.feedback += feedback_count
+    if stats.profiles:
+        # The rankings cached by the API processes were computed with the previous models.
+        bump_version(db, CORPUS_VERSION_ID)
+    db.commit()
+
+    for profile_id, _ in rated:
+        match_cache.invalidate(profile_id)
+    stats.seconds = time.perf_counter() - started
+    logging.info("Trained the rerankers of %d profiles on %d ratings in %.2fs", stats.profiles, stats.feedback, stats.seconds)
+    return stats
+
+
+def load_reranker(
+        db: Session,
+        profile: Profile,
+        bitmaps: Optional[NoticeBitmapIndex] = None,
+        text_features: Optional[NoticeTextFeatures] = None,
+) -> Optional[Reranker]:
+    """Returns the reranker of a profile with a trained model, refreshing the indexes it reads, or None."""
+    if profile.id is None:
+        return None
+    model = db.get(RerankerModel, profile.id)
+    if model is None:
+        return None
+    weights = np.frombuffer(model.weights, dtype=np.float64)
+    if len(weights) != len(FEATURES):
+        logging.warning("Ignoring the reranker of profile %d, trained on other features", profile.id)
+        return None
+
+    bitmaps = notice_bitmaps if bitmaps is None else bitmaps
+    text_features = notice_text_features if text_features is None else text_features
+    bitmaps.refresh(db)
+    text_features.refresh(db)
+    return Reranker(profile, weights, bitmaps, text_features)
+
+
+def hash_texts(texts: List[str], dimension: int = TEXT_FEATURES) -> np.ndarray:
+    """Returns the L2-normalized signed hashed bag of words of every text, one row per text."""
+    vectors = np.zeros((len(texts), dimension), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for token in tokenize(text):
+            hashed = zlib.crc32(token.encode())
+            vectors[row, hashed % dimension] += 1.0 if hashed & 0x80000000 else -1.0
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+def probability(scores: np.ndarray) -> np.ndarray:
+    """Converts the scores of a `Reranker` to the estimated probability of a thumbs up, for display."""
+    return _sigmoid(np.asarray(scores, dtype=np.float64))
+
+
+def _members(bitmap: int, notice_ids: np.ndarray) -> np.ndarray:
+    """Whether each notice is set in `bitmap`, as 0.0 or 1.0."""
+    data = np.frombuffer(bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little"), dtype=np.uint8)
+    members = np.zeros(len(notice_ids), dtype=np.float64)
+    inside = notice_ids < len(data) * 8
+    ids = notice_ids[inside]
+    members[inside] = (data[ids >> 3] >> (ids & 7)) & 1
+    return members
+
+
+def _column(column: np.ndarray, notice_ids: np.ndarray, missing) -> np.ndarray:
+    """Reads the rows of notices from a column indexed by notice id, `missing` for notices stored since its refresh."""
+    if not len(notice_ids) or notice_ids.max() < len(column):
+        return column[notice_ids]
+    values = np.full((len(notice_ids), *column.shape[1:]), missing, dtype=column.dtype)
+    inside = notice_ids < len(column)
+    values[inside] = column[notice_ids[inside]]
+    return values
+
+
+def _sigmoid(values: np.ndarray) -> np.ndarray:
+    return 0.5 * (1.0 + np.tanh(0.5 * values))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trains the reranker of every profile from its feedback.")
+    parser.add_argument("--min-feedback", type=int, default=5, help="Ratings a profile needs to get a reranker.")
+    parser.add_argument("--l2", type=float, default=1.0, help="Strength of the pull of the weights towards plain BM25.")
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    for session in get_session():
+        stats = train_rerankers(session, arguments.min_feedback, arguments.l2)
+        print(f"{stats.profiles} profiles, {stats.feedback} ratings, {stats.seconds:.2f}s")
+
+
+# Shared by the API process, like the bitmap index; refreshed before a reranker scores.
+notice_text_features = NoticeTextFeatures()
+
+
+if __name__ == "__main__":
+    main()
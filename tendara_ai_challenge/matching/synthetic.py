@@ -0,0 +1,88 @@
+import random
+from datetime import datetime, timedelta
+from typing import Iterator, List, Tuple
+
+from tendara_ai_challenge.matching.dto import NoticeModel
+
+# CPV division, its name, and what its notices are about.
+DIVISIONS: List[Tuple[str, str, Tuple[str, ...]]] = [
+    ("09", "Energy", ("solar panels", "photovoltaic systems", "heat pumps", "district heating", "wind turbines", "battery storage")),
+    ("30", "Office equipment", ("laptops", "printers", "office furniture", "monitors", "toner cartridges", "docking stations")),
+    ("33", "Medical equipment", ("MRI scanners", "surgical instruments", "hospital beds", "laboratory reagents", "ventilators", "dental equipment")),
+    ("34", "Transport equipment", ("electric buses", "fire engines", "municipal vehicles", "tram rolling stock", "bicycles", "snow ploughs")),
+    ("45", "Construction work", ("a public library", "a primary school", "a bridge", "social housing", "a sports hall", "road resurfacing")),
+    ("48", "Software packages", ("an ERP system", "a document management system", "GIS software", "a citizen portal", "antivirus licences", "a payroll system")),
+    ("50", "Repair and maintenance", ("lifts", "HVAC systems", "fire alarms", "street lighting", "IT hardware", "playground equipment")),
+    ("71", "Engineering services", ("structural design", "urban planning", "environmental impact assessment", "site supervision", "energy audits", "geotechnical surveys")),
+    ("72", "IT services", ("cloud hosting", "software development", "cybersecurity monitoring", "data migration", "helpdesk support", "network infrastructure")),
+    ("79", "Business services", ("legal advice", "translation services", "market research", "recruitment services", "event management", "auditing")),
+    ("80", "Education services", ("language courses", "vocational training", "leadership programmes", "e-learning content", "driver training", "IT skills courses")),
+    ("90", "Environmental services", ("waste collection", "street cleaning", "school cleaning", "wastewater treatment", "pest control", "snow clearing")),
+]
+
+CITIES: List[Tuple[str, str]] = [
+    ("Berlin", "Germany"), ("Munich", "Germany"), ("Hamburg", "Germany"), ("Cologne", "Germany"),
+    ("Vienna", "Austria"), ("Graz", "Austria"), ("Paris", "France"), ("Lyon", "France"), ("Madrid", "Spain"),
+    ("Barcelona", "Spain"), ("Lisbon", "Portugal"), ("Porto", "Portugal"), ("Rome", "Italy"), ("Milan", "Italy"),
+    ("Amsterdam", "Netherlands"), ("Rotterdam", "Netherlands"), ("Brussels", "Belgium"), ("Dublin", "Ireland"),
+    ("Copenhagen", "Denmark"), ("Stockholm", "Sweden"), ("Helsinki", "Finland"), ("Oslo", "Norway"),
+    ("Warsaw", "Poland"), ("Krakow", "Poland"), ("Prague", "Czech Republic"), ("Budapest", "Hungary"),
+    ("Athens", "Greece"), ("Tallinn", "Estonia"), ("Zurich", "Switzerland"), ("Luxembourg", "Luxembourg"),
+]
+
+BUYERS = ("City Council", "Public Works Department", "University Hospital", "Education Authority",
+          "Transport Authority", "Regional Government", "Water Utility", "Police Department")
+ACTIONS = ("Supply of", "Provision of", "Framework agreement for", "Procurement of", "Delivery and installation of",
+           "Maintenance of", "Tender for")
+CLAUSES = (
+    "The contract includes delivery, installation and training of staff.",
+    "Bidders must demonstrate at least three comparable references in the last five years.",
+    "The contracting authority favours sustainable and energy-efficient solutions.",
+    "Services are to be provided across multiple municipal sites.",
+    "The framework agreement runs for four years with an option to extend by one year.",
+    "Compliance with accessibility and data protection regulations is mandatory.",
+    "Tenders may be submitted for one or more lots.",
+    "Support and maintenance must be available on working days.",
+)
+
+
+def synthetic_records(count: int, seed: int = 0) -> Iterator[dict]:
+    """Yields `count` reproducible notice records, shaped like the JSON of `data/notices.json`.
+
+    Notices mix a dozen CPV divisions and thirty European cities; their text is built from the
+    subjects of their division, so keyword matching behaves as on real notices.
+    """
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    for _ in range(count):
+        division, name, subjects = rng.choice(DIVISIONS)
+        subject, related = rng.sample(subjects, 2)
+        city, country = rng.choice(CITIES)
+        buyer = rng.choice(BUYERS)
+        publication = start + timedelta(days=rng.randrange(730))
+        codes = [_cpv_code(rng, division) for _ in range(rng.choice((1, 1, 1, 2, 3)))]
+        yield {
+            "title": f"{rng.choice(ACTIONS)} {subject} for the {city} {buyer}",
+            "description": " ".join([
+                f"The {city} {buyer} invites tenders for {subject} ({name.lower()}).",
+                f"The scope also covers {related} where required.",
+                *rng.sample(CLAUSES, rng.randint(2, 4)),
+            ]),
+            "location": f"{city}, {country}",
+            "buyer": f"{city} {buyer}",
+            "volume": int(round(rng.lognormvariate(12, 1.2), -3)),
+            "cpv_codes": codes,
+            "publication_deadline": publication.isoformat(),
+            "submission_deadline": (publication + timedelta(days=rng.randint(14, 120))).isoformat(),
+        }
+
+
+def synthetic_notices(count: int, seed: int = 0) -> Iterator[NoticeModel]:
+    """Yields `count` reproducible notices; see `synthetic_records`."""
+    for record in synthetic_records(count, seed):
+        yield NoticeModel.model_validate(record)
+
+
+def _cpv_code(rng: random.Random, division: str) -> str:
+    digits = division + "".join(str(rng.randint(0, 9)) for _ in range(rng.randint(1, 3)))
+    return f"{digits.ljust(8, '0')}-{rng.randint(0, 9)}"
@@ -0,0 +1,30 @@
+import re
+from typing import Iterable, List, Optional, Set
+
+TOKEN_PATTERN = re.compile(r"\w[\w+#]*")
+TAG_SEPARATOR = ","
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Splits `text` into lowercase word tokens, keeping suffixes like in "C++" or "C#".
+
+    The same tokenizer is used to index notices at ingest and to parse profile tags at query time.
+    """
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+def join_tags(tags: Iterable[str]) -> str:
+    """Serializes profile tags to the comma-separated form stored on `Profile.tags`."""
+    return TAG_SEPARATOR.join(tag.strip() for tag in tags)
+
+
+def parse_tags(tags: Optional[str]) -> List[str]:
+    """Parses `Profile.tags` back into its tags, whatever spacing was used around the commas."""
+    if not tags:
+        return []
+    return [tag.strip() for tag in tags.split(TAG_SEPARATOR) if tag.strip()]
+
+
+def tag_tokens(tags: Optional[str]) -> Set[str]:
+    """Returns the tokens of all the tags stored on a profile."""
+    return {token for tag in parse_tags(tags) for token in tokenize(tag)}
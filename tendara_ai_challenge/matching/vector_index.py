@@ -0,0 +1,217 @@
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from tendara_ai_challenge.matching.ranking import top_k
+
+VECTORS_FILE = "vectors.f32"
+IDS_FILE = "ids.i64"
+CENTROIDS_FILE = "centroids.npy"
+ASSIGNMENTS_FILE = "assignments.i32"
+COUNT_FILE = "count.i64"
+
+
+class VectorIndex:
+    """Append-only, memory-mapped float32 matrix of notice vectors with an optional IVF coarse partition.
+
+    Vectors and their notice ids are appended to raw files at ingest and memory-mapped for search, so the
+    index is shared between processes through the page cache and never fully loaded in memory. Once
+    `build_partitions` has clustered the vectors, searches can scan only the `n_probe` closest clusters.
+
+    Only the rows counted in `COUNT_FILE` exist: it is replaced atomically once a batch is fully written, so a
+    reader never sees a torn batch and the leftovers of a crash in the middle of `add` are overwritten.
+    """
+
+    def __init__(self, directory: str, dimension: int, chunk_size: int = 1 << 16):
+        self.directory = Path(directory)
+        self.dimension = dimension
+        self.chunk_size = chunk_size
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._vectors: Optional[np.ndarray] = None
+        self._ids: Optional[np.ndarray] = None
+        self._lists: Optional[Tuple[int, np.ndarray, np.ndarray]] = None
+        self._centroids: Optional[Tuple[int, np.ndarray]] = None
+
+    def __len__(self) -> int:
+        path = self.directory / COUNT_FILE
+        if path.exists():
+            return int(np.fromfile(path, dtype=np.int64)[0])
+        # An index written before the count file existed: its complete rows.
+        ids, vectors = self.directory / IDS_FILE, self.directory / VECTORS_FILE
+        if not ids.exists() or not vectors.exists():
+            return 0
+        return min(ids.stat().st_size // 8, vectors.stat().st_size // (4 * self.dimension))
+
+    @property
+    def vectors(self) -> np.ndarray:
+        if self._vectors is None or len(self._vectors) != len(self):
+            self._vectors = self._map(VECTORS_FILE, np.float32, (len(self), self.dimension))
+        return self._vectors
+
+    @property
+    def ids(self) -> np.ndarray:
+        if self._ids is None or len(self._ids) != len(self):
+            self._ids = self._map(IDS_FILE, np.int64, (len(self),))
+        return self._ids
+
+    @property
+    def centroids(self) -> Optional[np.ndarray]:
+        """The cluster centroids, re-read only when `build_partitions` replaced them."""
+        path = self.directory / CENTROIDS_FILE
+        try:
+            modified = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if self._centroids is None or self._centroids[0] != modified:
+            self._centroids = (modified, np.load(path))
+        return self._centroids[1]
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray):
+        """Appends unit vectors for the given notice ids, assigning them to their cluster if partitioned."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if vectors.shape != (len(ids), self.dimension):
+            raise ValueError(f"Expected vectors of shape ({len(ids)}, {self.dimension}), got {vectors.shape}")
+
+        count = len(self)
+        centroids = self.centroids
+        if centroids is not None:
+            self._append(ASSIGNMENTS_FILE, count, np.argmax(vectors @ centroids.T, axis=1).astype(np.int32))
+        self._append(VECTORS_FILE, count, vectors)
+        self._append(IDS_FILE, count, np.asarray(ids, dtype=np.int64))
+        self._commit(count + len(ids))
+
+    def replace(self, ids: np.ndarray, vectors: np.ndarray):
+        """Overwrites the vectors of notices already in the index, e.g. updated ones, and appends the others.
+
+        Rows are overwritten in place, so a search running meanwhile may score a notice on its old vector.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        count = len(self)
+        stored_ids = self.ids
+        rows = np.flatnonzero(np.isin(stored_ids, ids))
+        positions = {notice_id: position for position, notice_id in enumerate(ids.tolist())}
+        if len(rows):
+            replaced = np.array([positions[notice_id] for notice_id in stored_ids[rows].tolist()], dtype=np.int64)
+            self._overwrite(VECTORS_FILE, np.float32, (count, self.dimension), rows, vectors[replaced])
+            centroids = self.centroids
+            if centroids is not None:
+                assignments = np.argmax(vectors[replaced] @ centroids.T, axis=1).astype(np.int32)
+                self._overwrite(ASSIGNMENTS_FILE, np.int32, (count,), rows, assignments)
+                self._lists = None
+        missing = ~np.isin(ids, stored_ids)
+        if missing.any():
+            self.add(ids[missing], vectors[missing])
+
+    def build_partitions(self, n_lists: int, iterations: int = 10, sample_size: int = 100_000, seed: int = 0):
+        """Clusters the vectors with spherical k-means and stores the centroid and cluster of every vector.
+
+        An index with fewer vectors than `n_lists` gets one cluster per vector; an empty one is left unpartitioned.
+        """
+        rng = np.random.default_rng(seed)
+        vectors = self.vectors
+        n_lists = min(n_lists, len(vectors))
+        if not n_lists:
+            return
+        sample = vectors[np.sort(rng.choice(len(vectors), size=min(sample_size, len(vectors)), replace=False))]
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+
+        for _ in range(iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            for cluster in range(n_lists):
+                members = sample[assignments == cluster]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[cluster] = centroid / (np.linalg.norm(centroid) or 1.0)
+
+        assignments = np.concatenate([
+            np.argmax(vectors[start:start + self.chunk_size] @ centroids.T, axis=1)
+            for start in range(0, len(vectors), self.chunk_size)
+        ]).astype(np.int32)
+
+        # The assignments are replaced first: they are only read once the new centroids exist.
+        self._replace(ASSIGNMENTS_FILE, assignments.tobytes())
+        with open(self.directory / f"{CENTROIDS_FILE}.tmp", "wb") as f:
+            np.save(f, centroids)
+        os.replace(self.directory / f"{CENTROIDS_FILE}.tmp", self.directory / CENTROIDS_FILE)
+        self._lists = None
+
+    def search(
+            self,
+            queries: np.ndarray,
+            k: int = 10,
+            candidate_ids: Optional[np.ndarray] = None,
+            n_probe: Optional[int] = None,
+    ) -> List[List[Tuple[int, float]]]:
+        """Returns, for each query vector, the `k` most cosine-similar (notice id, similarity) pairs.
+
+        Vectors are scored in chunks, all queries at once. With `candidate_ids` only those notices are
+        considered; with `n_probe` (and a partitioned index) only the `n_probe` closest clusters are scanned.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        rows = self._rows_to_scan(queries, n_probe)
+        if candidate_ids is not None:
+            rows = np.flatnonzero(np.isin(self.ids, candidate_ids)) if rows is None else rows[np.isin(self.ids[rows], candidate_ids)]
+
+        ids = self.ids[rows] if rows is not None else np.asarray(self.ids)
+        scores = np.empty((len(queries), len(ids)), dtype=np.float32)
+        for start in range(0, len(ids), self.chunk_size):
+            # A full scan reads contiguous slices of the memory map instead of gathering rows.
+            chunk = rows[start:start + self.chunk_size] if rows is not None else slice(start, start + self.chunk_size)
+            chunk_vectors = self.vectors[chunk]
+            scores[:, start:start + len(chunk_vectors)] = queries @ chunk_vectors.T
+        return [top_k(ids, query_scores, k) for query_scores in scores]
+
+    def _rows_to_scan(self, queries: np.ndarray, n_probe: Optional[int]) -> Optional[np.ndarray]:
+        """Returns the rows of the clusters to probe, or None to scan the whole index."""
+        centroids = self.centroids
+        if n_probe is None or centroids is None:
+            return None
+
+        order, offsets = self._inverted_lists(len(centroids))
+        probed = np.unique(np.argsort(-(queries @ centroids.T), axis=1)[:, :n_probe])
+        return np.sort(np.concatenate([order[offsets[cluster]:offsets[cluster + 1]] for cluster in probed]))
+
+    def _inverted_lists(self, n_lists: int) -> Tuple[np.ndarray, np.ndarray]:
+        count = len(self)
+        if self._lists is None or self._lists[0] != count:
+            assignments = self._map(ASSIGNMENTS_FILE, np.int32, (count,))
+            order = np.argsort(assignments, kind="stable")
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=n_lists))])
+            self._lists = (count, order, offsets)
+        return self._lists[1:]
+
+    def _map(self, file_name: str, dtype, shape: tuple) -> np.ndarray:
+        if shape[0] == 0:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(self.directory / file_name, dtype=dtype, mode="r", shape=shape)
+
+    def _append(self, file_name: str, count: int, array: np.ndarray):
+        """Writes `array` after the first `count` rows of a file, over any uncommitted rows."""
+        path = self.directory / file_name
+        row_size = array.itemsize * (array.shape[1] if array.ndim == 2 else 1)
+        with open(path, "r+b" if path.exists() else "wb") as f:
+            f.truncate(count * row_size)
+            f.seek(count * row_size)
+            f.write(array.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _overwrite(self, file_name: str, dtype, shape: tuple, rows: np.ndarray, values: np.ndarray):
+        matrix = np.memmap(self.directory / file_name, dtype=dtype, mode="r+", shape=shape)
+        matrix[rows] = values
+        matrix.flush()
+        del matrix
+
+    def _commit(self, count: int):
+        self._replace(COUNT_FILE, np.array([count], dtype=np.int64).tobytes())
+
+    def _replace(self, file_name: str, data: bytes):
+        temporary = self.directory / f"{file_name}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.directory / file_name)
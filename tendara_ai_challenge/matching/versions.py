@@ -0,0 +1,39 @@
+from typing import Tuple, Union
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from sqlmodel import select
+
+from tendara_ai_challenge.matching.entity import DataVersion
+
+# Bumped when notices are stored or rerankers trained, invalidating the rankings cached by every API process.
+CORPUS_VERSION_ID = 1
+# Bumped when profiles are created, updated or deleted, so the ETL rebuilds its profile percolator
+# and every API process drops the rankings it cached.
+PROFILES_VERSION_ID = 2
+
+
+def read_version(db: Union[Session, Connection], version_id: int) -> int:
+    """The current version of a dataset, as bumped by any process; 0 before its first bump."""
+    return db.execute(select(DataVersion.value).where(DataVersion.id == version_id)).scalar() or 0
+
+
+def read_versions(db: Union[Session, Connection], *version_ids: int) -> Tuple[int, ...]:
+    """The current versions of several datasets, read in a single query; see `read_version`."""
+    values = dict(db.execute(select(DataVersion.id, DataVersion.value).where(DataVersion.id.in_(version_ids))).all())
+    return tuple(values.get(version_id) or 0 for version_id in version_ids)
+
+
+def bump_version(db: Union[Session, Connection], version_id: int) -> int:
+    """Bumps the version of a dataset in the caller's transaction, so it changes exactly when the changes commit.
+
+    Returns the new version.
+    """
+    table = DataVersion.__table__
+    return db.execute(
+        sqlite_insert(table)
+        .values(id=version_id, value=1)
+        .on_conflict_do_update(index_elements=[table.c.id], set_={"value": table.c.value + 1})
+        .returning(table.c.value)
+    ).scalar_one()
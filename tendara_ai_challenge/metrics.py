@@ -0,0 +1,238 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds, from a fast SQLite statement to a slow LLM request.
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Metric:
+    """A named family of samples, one per combination of label values."""
+
+    type = "untyped"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def clear(self):
+        with self._lock:
+            self._values = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects the labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...], **extra: str) -> str:
+        pairs = [*zip(self.labelnames, key), *extra.items()]
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{self._labels(key)} {_number(value)}" for key, value in values]
+
+
+class Histogram(Metric):
+    """Counts observations in cumulative buckets, keeping their sum and count like Prometheus does."""
+
+    type = "histogram"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: str):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def time(self, **labels: str):
+        """Observes the duration of a `with` block, in seconds."""
+        if not self.registry.enabled:
+            return nullcontext()
+        return self._timer(labels)
+
+    @contextmanager
+    def _timer(self, labels: Dict[str, str]):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: str) -> int:
+        counts, _ = self._values.get(self._key(labels), ((), 0.0))
+        return sum(counts)
+
+    def sum(self, **labels: str) -> float:
+        _, total = self._values.get(self._key(labels), ((), 0.0))
+        return total
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        samples = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                samples.append(f"{self.name}_bucket{self._labels(key, le=_number(bound))} {cumulative}")
+            samples.append(f"{self.name}_sum{self._labels(key)} {_number(total)}")
+            samples.append(f"{self.name}_count{self._labels(key)} {cumulative}")
+        return samples
+
+
+class MetricsRegistry:
+    """Holds the metrics of the process and renders them in the Prometheus text exposition format.
+
+    While the registry is disabled, updating a metric returns after a single attribute check.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._metrics: Dict[str, Metric] = {}
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def clear(self):
+        """Resets the samples of every metric, keeping the metrics registered."""
+        for metric in self._metrics.values():
+            metric.clear()
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, kind: type, name: str, documentation: str, labelnames: Sequence[str], **kwargs) -> Metric:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = kind(self, name, documentation, labelnames, **kwargs)
+        elif not isinstance(metric, kind) or metric.labelnames != tuple(labelnames):
+            raise ValueError(f"Metric {name} is already registered differently")
+        return metric
+
+
+def serve_metrics(port: int, registry: "MetricsRegistry", host: str = ""):
+    """Serves `registry` on `port` from a daemon thread, for processes without an app like the ETL workers.
+
+    Returns the server, whose `shutdown` stops it. Every process has a registry of its own, so each one
+    serves its metrics on a port of its own and Prometheus scrapes them all.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name=f"metrics-{port}", daemon=True).start()
+    return server
+
+
+def timed_stream(
+        items: Callable[[Iterable], Iterator],
+        data: Iterable,
+        histogram: Histogram,
+        counter: Optional[Counter] = None,
+        **labels: str,
+) -> Iterator:
+    """Applies the streaming stage `items` to `data`, observing the time spent producing every item.
+
+    The time spent pulling from `data` is left out, so each stage of a pipeline of generators is timed
+    on its own. While the registry is disabled, the stage is applied without any wrapping.
+    """
+    if not histogram.registry.enabled:
+        return items(data)
+    return _timed_stream(items, data, histogram, counter, labels)
+
+
+def _timed_stream(items, data, histogram: Histogram, counter: Optional[Counter], labels: Dict[str, str]) -> Iterator:
+    upstream_seconds = 0.0
+
+    def pull():
+        nonlocal upstream_seconds
+        iterator = iter(data)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                upstream_seconds += time.perf_counter() - started
+            yield item
+
+    stage = iter(items(pull()))
+    while True:
+        started, pulled = time.perf_counter(), upstream_seconds
+        try:
+            item = next(stage)
+        except StopIteration:
+            return
+        histogram.observe(time.perf_counter() - started - (upstream_seconds - pulled), **labels)
+        if counter is not None:
+            counter.inc(**labels)
+        yield item
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+# Enabled by the apps and the ETL workers when `Settings.metrics_enabled` is set.
+metrics = MetricsRegistry()
@@ -1,71 +1,112 @@
 from datetime import datetime
 
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
-
-from tendara_ai_challenge.matching.entity import Profile, create_db_and_tables, get_session
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import delete
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from tendara_ai_challenge.api import create_app
+from tendara_ai_challenge.matching.cache import match_cache
+from tendara_ai_challenge.matching.entity import (
+    DigestMatch, Feedback, Profile, ProfileMatch, RerankerModel, get_async_session
+)
+from tendara_ai_challenge.matching.tokenizer import join_tags, parse_tags
+from tendara_ai_challenge.matching.versions import PROFILES_VERSION_ID, bump_version
 from tendara_ai_challenge.profile.dto import SearchProfileRequestSchema, SearchProfileResponseSchema
 
-app = FastAPI()
-
-
-@app.on_event("startup")
-def on_startup():
-    create_db_and_tables()
+router = APIRouter()
 
 
-@app.post("/profiles", response_model=SearchProfileResponseSchema)
-async def create_profile(*, session: Session = Depends(get_session), profile: SearchProfileRequestSchema):
-    db_profile = Profile(
-        location_id=profile.location_id,
-        category_id=profile.category_id,
-        tags=",".join(map(str, profile.tags)),
-        # TODO: Add publication_deadline to the Profile object.
-        publication_deadline=datetime.max
-    )
+@router.post("/profiles", response_model=SearchProfileResponseSchema)
+async def create_profile(*, session: AsyncSession = Depends(get_async_session), profile: SearchProfileRequestSchema):
+    db_profile = Profile()
+    _apply_request(db_profile, profile)
     session.add(db_profile)
-    session.commit()
-    session.refresh(db_profile)
-
-    # TODO: Moving to dedicated mapping Model.
-    response_data = {
-        "id": db_profile.id,
-        "category_id": db_profile.category_id,
-        "location_id": db_profile.location_id,
-        "tags": list(map(str, db_profile.tags.split(","))),
-        "publication_deadline": db_profile.publication_deadline
-    }
+    await session.run_sync(bump_version, PROFILES_VERSION_ID)
+    await session.commit()
+    await session.refresh(db_profile)
+    # SQLite may reuse the id of a deleted profile, so never serve its cached matches.
+    match_cache.invalidate(db_profile.id)
 
     # TODO: Return the result in HTTP Response.
-    return SearchProfileResponseSchema(**response_data)
+    return _to_response(db_profile)
 
 
-@app.get("/profiles/{id}", response_model=SearchProfileResponseSchema)
-async def get_profile(id: int, session: Session = Depends(get_session)):
-    profile = session.query(Profile).filter_by(id=id).first()
+@router.get("/profiles/{id}", response_model=SearchProfileResponseSchema)
+async def get_profile(id: int, session: AsyncSession = Depends(get_async_session)):
+    profile = await session.get(Profile, id)
     if profile is None:
         raise HTTPException(status_code=404, detail="Profile not found")
 
-    # TODO: Moving to dedicated mapping Model.
-    response_data = {
-        "id": profile.id,
-        "category_id": profile.category_id,
-        "location_id": profile.location_id,
-        "tags": list(map(str, profile.tags.split(","))),
-        "publication_deadline": profile.publication_deadline
-    }
-
     # TODO: Return the result in HTTP Response.
-    return SearchProfileResponseSchema(**response_data)
+    return _to_response(profile)
+
+
+@router.put("/profiles/{id}", response_model=SearchProfileResponseSchema)
+async def update_profile(id: int, profile: SearchProfileRequestSchema, session: AsyncSession = Depends(get_async_session)):
+    db_profile = await session.get(Profile, id)
+    if db_profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    _apply_request(db_profile, profile)
+    session.add(db_profile)
+    await session.run_sync(bump_version, PROFILES_VERSION_ID)
+    await session.commit()
+    await session.refresh(db_profile)
+    match_cache.invalidate(id)
+
+    return _to_response(db_profile)
 
 
-@app.delete("/profiles/{id}")
-async def delete_profile(id: int, session: Session = Depends(get_session)):
-    profile = session.query(Profile).filter_by(id=id).first()
+@router.delete("/profiles/{id}")
+async def delete_profile(id: int, session: AsyncSession = Depends(get_async_session)):
+    profile = await session.get(Profile, id)
     if profile is None:
         raise HTTPException(status_code=404, detail="Profile not found")
-    session.delete(profile)
-    session.commit()
+    for entity in (ProfileMatch, DigestMatch, Feedback, RerankerModel):
+        await session.execute(delete(entity).where(entity.profile_id == id))
+    await session.delete(profile)
+    await session.run_sync(bump_version, PROFILES_VERSION_ID)
+    await session.commit()
+    match_cache.invalidate(id)
 
     # TODO: Return the result in HTTP Response.
     return {"message": "Profile deleted successfully"}
+
+
+def _apply_request(db_profile: Profile, profile: SearchProfileRequestSchema):
+    db_profile.location_id = profile.location_id
+    db_profile.category_id = profile.category_id
+    db_profile.tags = join_tags(profile.tags)
+    db_profile.category_ids = join_tags(str(category_id) for category_id in profile.category_ids)
+    db_profile.location_ids = join_tags(str(location_id) for location_id in profile.location_ids)
+    db_profile.cpv_prefixes = join_tags(profile.cpv_prefixes)
+    db_profile.min_volume = profile.min_volume
+    db_profile.max_volume = profile.max_volume
+    db_profile.published_after = profile.published_after
+    db_profile.published_before = profile.published_before
+    db_profile.publication_deadline = datetime.max
+    db_profile.submission_after = profile.submission_after
+    db_profile.submission_before = profile.submission_before
+
+
+def _to_response(profile: Profile) -> SearchProfileResponseSchema:
+    return SearchProfileResponseSchema(
+        id=profile.id,
+        category_id=profile.category_id,
+        location_id=profile.location_id,
+        tags=parse_tags(profile.tags),
+        publication_deadline=profile.publication_deadline,
+        category_ids=[int(category_id) for category_id in parse_tags(profile.category_ids)],
+        location_ids=[int(location_id) for location_id in parse_tags(profile.location_ids)],
+        cpv_prefixes=parse_tags(profile.cpv_prefixes),
+        min_volume=profile.min_volume,
+        max_volume=profile.max_volume,
+        published_after=profile.published_after,
+        published_before=profile.published_before,
+        submission_after=profile.submission_after,
+        submission_before=profile.submission_before,
+    )
+
+
+# Serves this API alone; `tendara_ai_challenge.app` serves it together with the other one.
+app = create_app(router)
@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import List, Optional
 
 from pydantic import BaseModel, Field
@@ -9,6 +9,15 @@ class SearchProfileRequestSchema(BaseModel):
     tags: List[str] = Field(..., min_length=1, description="Tags or Keywords to search in database")
     category_id: int = Field(..., gt=0, description="Category ID")
     location_id: int = Field(..., gt=0, description="Location ID")
+    category_ids: List[int] = Field(default=[], description="Further category IDs, notices in any of them match")
+    location_ids: List[int] = Field(default=[], description="Further location IDs, notices in any of them match")
+    cpv_prefixes: List[str] = Field(default=[], description="CPV code prefixes, e.g. \"72\" for all IT services")
+    min_volume: Optional[int] = Field(default=None, ge=0, description="Minimum contract value in EUR")
+    max_volume: Optional[int] = Field(default=None, ge=0, description="Maximum contract value in EUR")
+    published_after: Optional[date] = Field(default=None, description="Earliest publication date of interest")
+    published_before: Optional[date] = Field(default=None, description="Latest publication date of interest")
+    submission_after: Optional[date] = Field(default=None, description="Earliest submission deadline of interest")
+    submission_before: Optional[date] = Field(default=None, description="Latest submission deadline of interest")
 
     class Config:
         orm_mode = True
@@ -20,3 +29,12 @@ class SearchProfileResponseSchema(BaseModel):
     location_id: Optional[int] = Field(default=None)
     tags: List[str] = Field(..., min_length=1)
     publication_deadline: Optional[datetime] = Field(default=None)
+    category_ids: List[int] = Field(default=[])
+    location_ids: List[int] = Field(default=[])
+    cpv_prefixes: List[str] = Field(default=[])
+    min_volume: Optional[int] = Field(default=None)
+    max_volume: Optional[int] = Field(default=None)
+    published_after: Optional[date] = Field(default=None)
+    published_before: Optional[date] = Field(default=None)
+    submission_after: Optional[date] = Field(default=None)
+    submission_before: Optional[date] = Field(default=None)
@@ -0,0 +1,38 @@
+import os
+from functools import lru_cache
+from typing import Mapping, Optional
+
+from pydantic import BaseModel
+
+
+class Settings(BaseModel):
+    """Configuration of the services, from the environment (e.g. `DATABASE_URL`) or a `.env` file.
+
+    Nothing is read when modules are imported: `get_settings` loads the settings on first use,
+    and clients and engines are only built from them when they are first needed.
+    """
+
+    database_url: str = "sqlite:///database.db"
+    sql_echo: bool = False
+    openai_api_key: Optional[str] = None
+    metrics_enabled: bool = False
+    """Whether the apps record metrics; see `tendara_ai_challenge.metrics`."""
+    vector_index_path: Optional[str] = None
+    """Directory of the notice `VectorIndex` built at ingest; semantic matching is disabled without it."""
+
+    @classmethod
+    def from_env(cls, environ: Optional[Mapping[str, str]] = None, env_file: Optional[str] = ".env") -> "Settings":
+        """Reads the settings from upper-case variables; those of the environment win over the `.env` file."""
+        values = {}
+        if env_file and os.path.exists(env_file):
+            from dotenv import dotenv_values
+            values.update(dotenv_values(env_file))
+        values.update(os.environ if environ is None else environ)
+        return cls(**{
+            name: values[name.upper()] for name in cls.model_fields if values.get(name.upper()) not in (None, "")
+        })
+
+
+@lru_cache
+def get_settings() -> Settings:
+    return Settings.from_env()
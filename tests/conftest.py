@@ -0,0 +1,48 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import NullPool
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from tendara_ai_challenge.app import app
+from tendara_ai_challenge.matching.bitmap import notice_bitmaps
+from tendara_ai_challenge.matching.cache import match_cache
+from tendara_ai_challenge.matching.database import create_async_db_engine
+from tendara_ai_challenge.matching.entity import get_async_session, get_session
+from tendara_ai_challenge.matching.reranker import notice_text_features
+
+
+@pytest.fixture(name="session")
+def session_fixture(tmp_path):
+    # A file database, so that the sync test session and the async app session see the same data.
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False}
+    )
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+@pytest.fixture(name="client")
+def client_fixture(session: Session):
+    """Client of both APIs, reading the test database through the sync test session and fresh async sessions."""
+    async_engine = create_async_db_engine(str(session.get_bind().url), poolclass=NullPool)
+
+    def get_session_override():
+        return session
+
+    async def get_async_session_override():
+        async with AsyncSession(async_engine, expire_on_commit=False) as async_session:
+            yield async_session
+
+    app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_async_session] = get_async_session_override
+    client = TestClient(app)
+    # The app reads through its own connections, so commit whatever the test wrote before each request.
+    client.event_hooks = {"request": [lambda request: session.commit()]}
+    yield client
+    app.dependency_overrides.clear()
+    match_cache.clear()
+    notice_bitmaps.clear()
+    notice_text_features.clear()
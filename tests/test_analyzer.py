@@ -0,0 +1,285 @@
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from openai import OpenAI
+
+from tendara_ai_challenge.etl.batching import BatchOpenAIAnalyzer
+from tendara_ai_challenge.etl.cache import AnalysisCache, CachedAnalyzer
+from tendara_ai_challenge.etl.concurrency import ConcurrentAnalyzer, RateLimiter
+from tendara_ai_challenge.etl.dto import RelatedIds
+from tendara_ai_challenge.etl.instrumentation import LLM_REQUEST_SECONDS, LLM_TOKENS
+from tendara_ai_challenge.etl.preclassifier import CpvCategoryMapping, CpvCategoryNames, Gazetteer, RuleBasedAnalyzer
+from tendara_ai_challenge.etl.processor import Analyzer, OpenAIAnalyzer
+from tendara_ai_challenge.matching.dto import NoticeModel
+from tendara_ai_challenge.matching.entity import Category, Location
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    """Answers chat completion requests like the OpenAI API, classifying "Notice <n>" as category <n>."""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        state = self.server.state
+        with state["lock"]:
+            state["requests"] += 1
+            fail = state["failures"] > 0
+            state["failures"] -= 1
+
+        if fail:
+            return self._respond(429, {"error": {"message": "Rate limit reached", "type": "requests"}})
+
+        time.sleep(random.uniform(0, 0.02))
+        prompt = body["messages"][-1]["content"]
+        numbered = re.findall(r"\[(\d+)\] .*Notice (\d+)", prompt)
+        if numbered:
+            results = [
+                {"index": int(index), "categoryIds": [int(number)], "locationIds": [1]}
+                for index, number in numbered if int(index) not in state["skipped_indexes"]
+            ]
+            content = json.dumps({"results": results})
+        else:
+            number = int(re.search(r"Notice (\d+)", prompt).group(1))
+            content = json.dumps({"categoryIds": [number], "locationIds": [1]})
+        self._respond(200, {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content, "refusal": None},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+        })
+
+    def _respond(self, status: int, payload: dict):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(name="stub_server")
+def stub_server_fixture():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOpenAIHandler)
+    server.state = {"lock": threading.Lock(), "requests": 0, "failures": 0, "skipped_indexes": set()}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(name="stub_client")
+def stub_client_fixture(stub_server: ThreadingHTTPServer):
+    host, port = stub_server.server_address
+    return OpenAI(api_key="test", base_url=f"http://{host}:{port}/v1", max_retries=0)
+
+
+class RecordingAnalyzer(Analyzer):
+    """Answers every notice with category 1 and remembers which notices it was asked about."""
+
+    def __init__(self, database):
+        super().__init__(database)
+        self.notices = []
+
+    def fetch_related_ids(self, categories, locations, notice):
+        self.notices.append(notice)
+        return RelatedIds(categoryIds=[1], locationIds=[1])
+
+
+def make_notice(number: int, location: str = "Munich, Germany", cpv_codes=("72000000-5",)) -> NoticeModel:
+    return NoticeModel(
+        title=f"Notice {number}",
+        description="Maintenance of municipal IT systems.",
+        location=location,
+        buyer="Munich City Council",
+        volume=1000,
+        cpv_codes=list(cpv_codes),
+        publication_deadline=datetime(2024, 11, 15),
+        submission_deadline=datetime(2025, 1, 31),
+    )
+
+
+CATEGORIES = [Category(id=1, name="Construction"), Category(id=2, name="IT")]
+LOCATIONS = [Location(id=1, city="Munich", country="Germany")]
+
+
+def test_concurrent_analyzer_keeps_input_order(stub_client: OpenAI):
+    analyzer = ConcurrentAnalyzer(OpenAIAnalyzer(None, client=stub_client), max_workers=8)
+    notices = [make_notice(number) for number in range(20)]
+
+    results = analyzer.fetch_related_ids_batch(CATEGORIES, LOCATIONS, notices)
+
+    assert [result.categoryIds for result in results] == [[number] for number in range(20)]
+
+
+def test_concurrent_analyzer_retries_rate_limited_calls(stub_server: ThreadingHTTPServer, stub_client: OpenAI):
+    stub_server.state["failures"] = 2
+    analyzer = ConcurrentAnalyzer(
+        OpenAIAnalyzer(None, client=stub_client), max_workers=1, max_retries=2, backoff_seconds=0.01
+    )
+
+    result = analyzer.fetch_related_ids(CATEGORIES, LOCATIONS, make_notice(3))
+
+    assert result.categoryIds == [3]
+    assert stub_server.state["requests"] == 3
+
+
+def test_concurrent_analyzer_gives_up_after_max_retries(stub_server: ThreadingHTTPServer, stub_client: OpenAI):
+    stub_server.state["failures"] = 5
+    analyzer = ConcurrentAnalyzer(
+        OpenAIAnalyzer(None, client=stub_client), max_workers=1, max_retries=1, backoff_seconds=0.01
+    )
+
+    with pytest.raises(Exception):
+        analyzer.fetch_related_ids(CATEGORIES, LOCATIONS, make_notice(3))
+    assert stub_server.state["requests"] == 2
+
+
+def test_rate_limiter_waits_for_tokens_to_refill():
+    rate_limiter = RateLimiter(requests_per_minute=6000, tokens_per_minute=600)
+    rate_limiter.acquire(600)
+
+    started = time.monotonic()
+    rate_limiter.acquire(5)
+
+    assert time.monotonic() - started >= 0.4
+
+
+def test_cached_analyzer_only_calls_llm_on_miss(tmp_path, stub_server: ThreadingHTTPServer, stub_client: OpenAI):
+    cache_path = str(tmp_path / "analysis.db")
+    analyzer = CachedAnalyzer(OpenAIAnalyzer(None, client=stub_client), AnalysisCache(cache_path))
+    notices = [make_notice(1), make_notice(2), make_notice(1)]
+
+    first = analyzer.fetch_related_ids_batch(CATEGORIES, LOCATIONS, notices)
+    assert [result.categoryIds for result in first] == [[1], [2], [1]]
+    assert stub_server.state["requests"] == 3
+
+    # A new analyzer over the same file reuses the persisted results.
+    analyzer = CachedAnalyzer(OpenAIAnalyzer(None, client=stub_client), AnalysisCache(cache_path))
+    second = analyzer.fetch_related_ids_batch(CATEGORIES, LOCATIONS, notices)
+    assert second == first
+    assert stub_server.state["requests"] == 3
+    assert analyzer.stats.hits == 3
+    assert analyzer.stats.hit_rate == 1.0
+    assert analyzer.stats.saved_tokens > 0
+
+    # A different catalog is a different cache version.
+    analyzer.fetch_related_ids(CATEGORIES[:1], LOCATIONS, make_notice(1))
+    assert stub_server.state["requests"] == 4
+    assert analyzer.stats.misses == 1
+
+
+def test_analysis_cache_evicts_least_recently_used():
+    cache = AnalysisCache(max_entries=2)
+    related_ids = RelatedIds(categoryIds=[1], locationIds=[1])
+
+    cache.put_many({"a": related_ids})
+    time.sleep(0.01)
+    cache.put_many({"b": related_ids})
+    time.sleep(0.01)
+    cache.get_many(["a"])
+    time.sleep(0.01)
+    cache.put_many({"c": related_ids})
+
+    assert len(cache) == 2
+    assert set(cache.get_many(["a", "b", "c"])) == {"a", "c"}
+
+
+def test_batch_analyzer_classifies_several_notices_per_request(stub_server: ThreadingHTTPServer, stub_client: OpenAI):
+    analyzer = BatchOpenAIAnalyzer(None, notices_per_request=3, client=stub_client)
+    notices = [make_notice(1), make_notice(2), make_notice(2), make_notice(1)]
+
+    results = analyzer.fetch_related_ids_batch(CATEGORIES, LOCATIONS, notices)
+
+    assert [result.categoryIds for result in results] == [[1], [2], [2], [1]]
+    assert stub_server.state["requests"] == 2
+
+
+def test_batch_analyzer_falls_back_to_single_requests(stub_server: ThreadingHTTPServer, stub_client: OpenAI):
+    stub_server.state["skipped_indexes"] = {1}
+    analyzer = BatchOpenAIAnalyzer(None, notices_per_request=3, client=stub_client)
+    # Notice 7 is answered with a category id outside of the catalog, so it is rejected as well.
+    notices = [make_notice(1), make_notice(2), make_notice(7)]
+
+    results = analyzer.fetch_related_ids_batch(CATEGORIES, LOCATIONS, notices)
+
+    assert [result.categoryIds for result in results] == [[1], [2], [7]]
+    assert stub_server.state["requests"] == 3
+
+
+def test_gazetteer_normalizes_and_prefers_city_with_country():
+    gazetteer = Gazetteer([
+        Location(id=1, city="München", country="Germany"),
+        Location(id=2, city="Cambridge", country="UK"),
+        Location(id=3, city="Cambridge", country="USA"),
+    ])
+
+    assert gazetteer.location_ids("  MUNCHEN , germany") == {1}
+    assert gazetteer.location_ids("Cambridge, UK") == {2}
+    assert gazetteer.location_ids("Cambridge") == {2, 3}
+    assert gazetteer.location_ids("Atlantis") == set()
+
+
+def test_rule_based_analyzer_only_sends_unresolved_notices_to_fallback():
+    fallback = RecordingAnalyzer(None)
+    analyzer = RuleBasedAnalyzer(fallback, CpvCategoryMapping({"72": 2, "0933": 1}))
+    locations = LOCATIONS + [Location(id=2, city="Cambridge", country="UK"), Location(id=3, city="Cambridge", country="USA")]
+    notices = [
+        make_notice(1, cpv_codes=["72000000-5", "09330000-1"]),
+        make_notice(2, location="Cambridge"),
+        make_notice(3, cpv_codes=["45212300-9"]),
+        make_notice(4, location="Cambridge, USA"),
+    ]
+
+    results = analyzer.fetch_related_ids_batch(CATEGORIES, locations, notices)
+
+    assert results[0] == RelatedIds(categoryIds=[1, 2], locationIds=[1])
+    assert results[3] == RelatedIds(categoryIds=[2], locationIds=[3])
+    assert [notice.title for notice in fallback.notices] == ["Notice 2", "Notice 3"]
+    assert analyzer.stats.skip_rate == 0.5
+
+
+def test_rule_based_analyzer_resolves_shipped_cpv_categories_by_name():
+    fallback = RecordingAnalyzer(None)
+    analyzer = RuleBasedAnalyzer(fallback, CpvCategoryNames.load())
+    categories = [Category(id=4, name="IT services"), Category(id=5, name="construction WORK")]
+    notices = [
+        make_notice(1, cpv_codes=["72212000-4"]),
+        make_notice(2, cpv_codes=["45212300-9", "72000000-5"]),
+        make_notice(3, cpv_codes=["09330000-1"]),
+    ]
+
+    results = analyzer.fetch_related_ids_batch(categories, LOCATIONS, notices)
+
+    assert results[0] == RelatedIds(categoryIds=[4], locationIds=[1])
+    assert results[1] == RelatedIds(categoryIds=[4, 5], locationIds=[1])
+    assert [notice.title for notice in fallback.notices] == ["Notice 3"]
+
+
+def test_openai_analyzer_records_latency_and_token_usage(stub_client: OpenAI):
+    LLM_REQUEST_SECONDS.registry.enabled = True
+    try:
+        LLM_REQUEST_SECONDS.registry.clear()
+        OpenAIAnalyzer(None, client=stub_client).fetch_related_ids(CATEGORIES, LOCATIONS, make_notice(1))
+        BatchOpenAIAnalyzer(None, client=stub_client).fetch_related_ids_batch(CATEGORIES, LOCATIONS, [make_notice(1), make_notice(2)])
+
+        assert LLM_REQUEST_SECONDS.count(model="gpt-4o-mini") == 2
+        assert LLM_TOKENS.value(model="gpt-4o-mini", kind="prompt") == 20
+        assert LLM_TOKENS.value(model="gpt-4o-mini", kind="completion") == 10
+    finally:
+        LLM_REQUEST_SECONDS.registry.enabled = False
+        LLM_REQUEST_SECONDS.registry.clear()
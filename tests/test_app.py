@@ -0,0 +1,43 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from tendara_ai_challenge.app import app
+from tendara_ai_challenge.matching.cache import match_cache
+from tendara_ai_challenge.matching.database import get_async_engine, get_engine
+from tendara_ai_challenge.metrics import metrics
+from tendara_ai_challenge.settings import Settings, get_settings
+
+
+@pytest.fixture(name="client")
+def client_fixture(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setenv("METRICS_ENABLED", "true")
+    for cached in (get_settings, get_engine, get_async_engine):
+        cached.cache_clear()
+    with TestClient(app) as client:
+        yield client
+    for cached in (get_settings, get_engine, get_async_engine):
+        cached.cache_clear()
+    metrics.enabled = False
+    metrics.clear()
+    match_cache.clear()
+
+
+def test_combined_app_serves_both_apis_on_shared_engines(client: TestClient, tmp_path):
+    profile_id = client.post("/profiles", json={"category_id": 1, "location_id": 1, "tags": ["software"]}).json()["id"]
+
+    assert client.get(f"/profiles/{profile_id}/matches").json()["notices"] == []
+    assert 'match_requests_total{cache="miss"} 1' in client.get("/metrics").text
+    assert get_engine().url.database == get_async_engine().url.database == str(tmp_path / "app.db")
+
+
+def test_settings_prefer_the_environment_over_the_env_file(tmp_path):
+    env_file = tmp_path / ".env"
+    env_file.write_text("OPENAI_API_KEY=from-file\nDATABASE_URL=sqlite:///file.db\n")
+
+    settings = Settings.from_env({"DATABASE_URL": "sqlite:///env.db", "SQL_ECHO": "1"}, env_file=str(env_file))
+
+    assert settings.openai_api_key == "from-file"
+    assert settings.database_url == "sqlite:///env.db"
+    assert settings.sql_echo is True
+    assert settings.metrics_enabled is False
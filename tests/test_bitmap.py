@@ -0,0 +1,172 @@
+import threading
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.pool import StaticPool
+
+from tendara_ai_challenge.etl.dto import RelatedIds
+from tendara_ai_challenge.etl.listeners import BitmapIndexListener
+from tendara_ai_challenge.etl.processor import Analyzer, DataProcessorService
+from tendara_ai_challenge.matching.app import score_profile
+from tendara_ai_challenge.matching.bitmap import NoticeBitmapIndex, cpv_prefix, load_notice_rows, notice_bitmaps, profile_criteria, to_ids
+from tendara_ai_challenge.matching.dto import ProfileCriteria
+from tendara_ai_challenge.matching.entity import Profile
+from tendara_ai_challenge.matching.matching import score_relevant_notices
+from tendara_ai_challenge.matching.utils import load_notices
+
+COUNTRIES = {"Germany": 1, "Austria": 2}
+
+
+class CountryAnalyzer(Analyzer):
+    """Puts German and Austrian notices in their own location, the others in location 3;
+    IT notices (CPV division 72) are in category 1, the others in categories 2 and 3."""
+
+    def fetch_related_ids(self, categories, locations, notice):
+        category_ids = [1] if any(code.startswith("72") for code in notice.cpv_codes) else [2, 3]
+        return RelatedIds(categoryIds=category_ids, locationIds=[location_id(notice)])
+
+
+def location_id(notice) -> int:
+    return COUNTRIES.get(notice.location.split(", ")[-1], 3)
+
+
+def category_ids(notice) -> set:
+    return {1} if any(code.startswith("72") for code in notice.cpv_codes) else {2, 3}
+
+
+@pytest.fixture(name="session")
+def session_fixture():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.exec(text("INSERT INTO category (id, name) VALUES (1, 'IT'), (2, 'Construction'), (3, 'Energy')"))
+        session.exec(text("INSERT INTO location (id, city, country) VALUES (1, 'Berlin', 'Germany'), (2, 'Vienna', 'Austria'), (3, 'Paris', 'France')"))
+        yield session
+    notice_bitmaps.clear()
+
+
+def test_bitmap_filters_match_brute_force(session: Session):
+    notices = load_notices()
+    DataProcessorService(CountryAnalyzer(session), batch_size=16).process(notices)
+    index = NoticeBitmapIndex()
+    assert index.refresh(session, batch_size=30) == len(notices)
+    assert index.refresh(session) == 0
+
+    for criteria in (
+            ProfileCriteria(category_ids=[1], location_ids=[1, 2]),
+            ProfileCriteria(category_ids=[2], location_ids=[2, 3], min_volume=100_000, max_volume=1_000_000),
+            ProfileCriteria(cpv_prefixes=["45"], submission_after=date(2025, 1, 1)),
+            ProfileCriteria(cpv_prefixes=["72200000-7", "341"], published_before=date(2024, 12, 31)),
+            ProfileCriteria(location_ids=[3], published_after=date(2024, 11, 1), submission_before=date(2025, 3, 1)),
+    ):
+        expected = [
+            notice_id for notice_id, notice in enumerate(notices, start=1)
+            if (not criteria.category_ids or category_ids(notice) & set(criteria.category_ids))
+            and (not criteria.location_ids or location_id(notice) in criteria.location_ids)
+            and (not criteria.cpv_prefixes or any(
+                cpv_prefix(code).startswith(cpv_prefix(prefix)) for code in notice.cpv_codes for prefix in criteria.cpv_prefixes
+            ))
+            and (criteria.min_volume is None or notice.volume >= criteria.min_volume)
+            and (criteria.max_volume is None or notice.volume <= criteria.max_volume)
+            and (criteria.published_after is None or notice.publication_deadline.date() >= criteria.published_after)
+            and (criteria.published_before is None or notice.publication_deadline.date() <= criteria.published_before)
+            and (criteria.submission_after is None or notice.submission_deadline.date() >= criteria.submission_after)
+            and (criteria.submission_before is None or notice.submission_deadline.date() <= criteria.submission_before)
+        ]
+        assert expected
+        assert to_ids(index.match(criteria)).tolist() == expected
+
+
+def test_bitmap_scoring_matches_sql_candidates(session: Session):
+    index = NoticeBitmapIndex()
+    DataProcessorService(CountryAnalyzer(session), batch_size=25, listeners=[BitmapIndexListener(index)]).process(load_notices())
+
+    for profile in (
+            Profile(category_id=1, location_id=1, tags="software,cloud,services"),
+            Profile(category_id=3, location_id=3, tags="construction,energy"),
+            Profile(category_id=1, location_id=2, tags="software"),
+    ):
+        assert profile_criteria(profile).is_single_category_and_location
+        assert score_relevant_notices(profile, session, bitmaps=index) == score_relevant_notices(profile, session)
+
+
+def test_rich_profiles_are_scored_on_the_shared_bitmap_index(session: Session):
+    DataProcessorService(CountryAnalyzer(session), batch_size=25).process(load_notices())
+    profile = Profile(category_id=1, location_id=1, location_ids="2,3", cpv_prefixes="722", tags="software,cloud")
+    assert not profile_criteria(profile).is_single_category_and_location
+
+    scored = score_profile(session, profile)
+
+    by_location = [
+        score_relevant_notices(Profile(category_id=1, location_id=location, tags=profile.tags), session) for location in (1, 2, 3)
+    ]
+    it_services = {notice_id for notice_id in to_ids(notice_bitmaps.match(ProfileCriteria(cpv_prefixes=["722"]))).tolist()}
+    assert len(notice_bitmaps) == 100
+    assert scored == sorted(
+        (match for matches in by_location for match in matches if match[0] in it_services), key=lambda match: (-match[1], match[0])
+    )
+
+
+def test_bitmap_listener_reindexes_updated_notices(session: Session):
+    index = NoticeBitmapIndex()
+    notices = load_notices()[:10]
+    data_processor = DataProcessorService(
+        CountryAnalyzer(session), batch_size=5, listeners=[BitmapIndexListener(index)], incremental=True
+    )
+    data_processor.process(notices)
+
+    updated = notices[3].model_copy(update={"volume": 123_456_789, "location": "Berlin, Germany", "cpv_codes": ["72212000-4"]})
+    data_processor.process([updated])
+
+    assert len(index) == 10
+    assert to_ids(index.match(ProfileCriteria(min_volume=123_456_789))).tolist() == [4]
+    assert 4 in to_ids(index.match(ProfileCriteria(category_ids=[1], location_ids=[1], cpv_prefixes=["7221"]))).tolist()
+    assert 4 not in to_ids(index.match(ProfileCriteria(category_ids=[2]))).tolist()
+
+
+def test_refresh_reindexes_notices_updated_in_place(session: Session):
+    index = NoticeBitmapIndex()
+    notices = load_notices()[:10]
+    data_processor = DataProcessorService(CountryAnalyzer(session), batch_size=5, incremental=True)
+    data_processor.process(notices)
+    assert index.refresh(session) == 10
+
+    data_processor.process([notices[3].model_copy(update={"volume": 123_456_789})])
+
+    assert index.refresh(session) == 1
+    assert index.refresh(session) == 0
+    assert to_ids(index.match(ProfileCriteria(min_volume=123_456_789))).tolist() == [4]
+
+
+def test_matching_reads_a_consistent_state_while_notices_are_reindexed(session: Session):
+    index = NoticeBitmapIndex()
+    DataProcessorService(CountryAnalyzer(session), batch_size=25).process(load_notices())
+    index.refresh(session)
+    criteria = ProfileCriteria(category_ids=[1], location_ids=[1, 2])
+    published = index.current
+    expected = to_ids(index.match(criteria)).tolist()
+    rows = load_notice_rows(session.connection(), list(range(1, 101)))
+
+    results = []
+    stop = threading.Event()
+
+    def match():
+        while not stop.is_set():
+            results.append(to_ids(index.match(criteria)).tolist())
+
+    readers = [threading.Thread(target=match) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for _ in range(50):
+        index.add(*rows)
+    stop.set()
+    for reader in readers:
+        reader.join()
+
+    assert results and all(result == expected for result in results)
+    assert to_ids(published.match(criteria)).tolist() == expected
+    assert index.current is not published
@@ -0,0 +1,78 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import sqlite
+from sqlmodel import Session, SQLModel
+
+from tendara_ai_challenge.matching.database import create_db_engine
+from tendara_ai_challenge.matching.entity import Notice, Profile, create_db_and_tables
+from tendara_ai_challenge.matching.index import ensure_token_index
+from tendara_ai_challenge.matching.matching import candidate_notices_statement, candidate_postings_statement
+
+# The tables of the first version, before the ETL and matching added their columns.
+BASELINE_SCHEMA = [
+    "CREATE TABLE notice (id INTEGER NOT NULL PRIMARY KEY, title VARCHAR, description VARCHAR, buyer VARCHAR, "
+    "volume INTEGER, publication_deadline DATE, submission_deadline DATE)",
+    "CREATE TABLE category (id INTEGER NOT NULL PRIMARY KEY, name VARCHAR)",
+    "CREATE TABLE location (id INTEGER NOT NULL PRIMARY KEY, city VARCHAR, country VARCHAR)",
+    "CREATE TABLE profile (id INTEGER NOT NULL PRIMARY KEY, category_id INTEGER, location_id INTEGER, tags VARCHAR, "
+    "publication_deadline DATE)",
+    "CREATE TABLE noticecategory (id INTEGER NOT NULL PRIMARY KEY, notice_id INTEGER REFERENCES notice (id), "
+    "category_id INTEGER REFERENCES category (id))",
+    "CREATE TABLE noticelocation (id INTEGER NOT NULL PRIMARY KEY, notice_id INTEGER REFERENCES notice (id), "
+    "location_id INTEGER REFERENCES location (id))",
+    "INSERT INTO notice (id, title, description) VALUES (1, 'School cleaning', 'Cleaning of a primary school')",
+    "INSERT INTO profile (id, category_id, location_id, tags) VALUES (1, 1, 1, 'school')",
+]
+
+
+@pytest.fixture(name="session")
+def session_fixture(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'database.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+
+def query_plan(session: Session, statement) -> str:
+    sql = statement.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True})
+    return "\n".join(row[-1] for row in session.exec(text(f"EXPLAIN QUERY PLAN {sql}")).all())
+
+
+def test_engine_applies_sqlite_pragmas(session: Session):
+    assert session.exec(text("PRAGMA journal_mode")).one()[0] == "wal"
+    assert session.exec(text("PRAGMA mmap_size")).one()[0] == 256 * 1024 * 1024
+    assert session.exec(text("PRAGMA cache_size")).one()[0] == -64 * 1024
+
+
+@pytest.mark.parametrize("statement", [
+    candidate_notices_statement(1, 2),
+    candidate_postings_statement(1, 2, ["python", "java"]),
+])
+def test_matching_queries_use_indexes(session: Session, statement):
+    plan = query_plan(session, statement)
+
+    for table in ("noticecategory", "noticelocation", "noticetoken"):
+        for line in plan.splitlines():
+            assert not line.startswith(f"SCAN {table}"), plan
+    assert "USING COVERING INDEX ix_noticecategory_category_id_notice_id" in plan
+    assert "USING COVERING INDEX ix_noticelocation_location_id_notice_id" in plan
+
+
+def test_baseline_database_is_upgraded_in_place(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'baseline.db'}")
+    with engine.begin() as connection:
+        for statement in BASELINE_SCHEMA:
+            connection.exec_driver_sql(statement)
+
+    create_db_and_tables(engine)
+    with Session(engine) as session:
+        assert ensure_token_index(session) == 1
+        session.commit()
+        notice = session.get(Notice, 1)
+        profile = session.get(Profile, 1)
+        indexes = {row[1] for row in session.exec(text("PRAGMA index_list(notice)")).all()}
+
+    assert notice.token_count > 0 and notice.external_id is None
+    assert profile.tags == "school" and profile.cpv_prefixes is None
+    assert {"ix_notice_external_id", "ix_notice_corpus_version"} <= indexes
+    engine.dispose()
@@ -1,11 +1,32 @@
+import gzip
+import json
+from typing import List, Optional
+
 import pytest
 from sqlalchemy import create_engine, text, StaticPool
 from sqlmodel import SQLModel, Session
 
-from tendara_ai_challenge.etl.extractor import JSONDataExtractStrategy, DataExtractService
-from tendara_ai_challenge.etl.processor import DataProcessorService, OpenAIAnalyzer
-from tendara_ai_challenge.etl.transformer import JSONDataTransformStrategy, DataTransformService
-from tendara_ai_challenge.matching.entity import NoticeCategory, NoticeLocation
+from tendara_ai_challenge.etl.dto import RelatedIds
+from tendara_ai_challenge.etl.extractor import (
+    JSONDataExtractStrategy, DataExtractService, StreamingJSONDataExtractStrategy
+)
+from tendara_ai_challenge.etl.processor import Analyzer, DataProcessorService, OpenAIAnalyzer
+from tendara_ai_challenge.etl.transformer import (
+    DataTransformService, JSONDataTransformStrategy, ParallelJSONDataTransformStrategy
+)
+from tendara_ai_challenge.matching.dto import NoticeModel
+from tendara_ai_challenge.matching.entity import (
+    Category, CorpusStatistics, Location, Notice, NoticeCategory, NoticeLocation, NoticeToken, SourceWatermark,
+    TermStatistics
+)
+from tendara_ai_challenge.matching.tokenizer import tokenize
+
+
+class StubAnalyzer(Analyzer):
+    """Links every notice to the first category and location, without calling an LLM."""
+
+    def fetch_related_ids(self, categories: List[Category], locations: List[Location], notice: NoticeModel) -> Optional[RelatedIds]:
+        return RelatedIds(categoryIds=[categories[0].id], locationIds=[locations[0].id])
 
 
 @pytest.fixture(name="session")
@@ -101,3 +122,229 @@ def test_processor_in_etl(session: Session):
 
     assert notice_locations[0].notice_id == 1
     assert notice_locations[0].location_id == 1
+
+
+def test_streaming_extractor_reads_json_array():
+    """ Test that the StreamingJSONDataExtractStrategy yields the same records as json.load, even with tiny chunks. """
+    data_path = "data/notices.json"
+    service = DataExtractService(StreamingJSONDataExtractStrategy(chunk_size=7))
+
+    stream = service.stream(data_path)
+
+    with open(data_path) as f:
+        assert list(stream) == json.load(f)
+
+
+def test_streaming_extractor_decodes_large_records_a_logarithmic_number_of_times(tmp_path):
+    records = [{"title": "Large", "description": "x" * 100_000}, {"title": "Small"}]
+    data_path = tmp_path / "notices.json"
+    data_path.write_text(json.dumps(records, indent=2))
+    strategy = StreamingJSONDataExtractStrategy(chunk_size=16)
+    decoder, calls = strategy.decoder, []
+    strategy.decoder = type("CountingDecoder", (), {
+        "raw_decode": lambda self, buffer, position: calls.append(position) or decoder.raw_decode(buffer, position)
+    })()
+
+    assert list(strategy.stream_data(str(data_path))) == records
+    assert len(calls) < 30
+
+
+def test_streaming_extractor_reads_gzipped_ndjson(tmp_path):
+    """ Test that the StreamingJSONDataExtractStrategy reads gzip-compressed NDJSON input. """
+    with open("data/notices.json") as f:
+        records = json.load(f)
+    data_path = tmp_path / "notices.ndjson.gz"
+    with gzip.open(data_path, "wt") as f:
+        f.write("\n".join(json.dumps(record) for record in records) + "\n\n")
+
+    service = DataExtractService(StreamingJSONDataExtractStrategy(chunk_size=16))
+
+    assert list(service.stream(str(data_path))) == records
+
+
+def test_streaming_pipeline_in_etl(session: Session):
+    """ Test that a streamed extract can be transformed and processed lazily, notice by notice. """
+    session.exec(text("INSERT INTO category (id, name) VALUES (1, 'Construction')"))
+    session.exec(text("INSERT INTO location (id, city, country) VALUES (1, 'Munich', 'Germany')"))
+
+    records = DataExtractService(StreamingJSONDataExtractStrategy()).stream("data/notices.json")
+    notices = DataTransformService(JSONDataTransformStrategy()).transform_stream(records)
+    stored = DataProcessorService(StubAnalyzer(session)).process_stream(notices)
+
+    first = next(stored)
+    assert first.title == "Supply and Installation of Solar Panels for Municipal Buildings"
+    assert session.query(Notice).count() == 1
+
+    assert [notice.title for notice in stored] == ["Construction of New Public Library Facility"]
+    assert session.query(NoticeCategory).count() == 2
+    assert session.query(NoticeLocation).count() == 2
+
+
+def test_batched_processor_persists_in_single_transactions(session: Session):
+    """ Test that a batched DataProcessorService stores all notices and links and reports its throughput. """
+    session.exec(text("INSERT INTO category (id, name) VALUES (1, 'Construction')"))
+    session.exec(text("INSERT INTO location (id, city, country) VALUES (1, 'Munich', 'Germany')"))
+
+    data = DataExtractService(JSONDataExtractStrategy()).load("data/notices.json")
+    notices = DataTransformService(JSONDataTransformStrategy()).transform_data(data)
+
+    data_processor = DataProcessorService(StubAnalyzer(session), batch_size=10)
+    stored = data_processor.process(notices * 3)
+
+    assert [notice.id for notice in stored] == [1, 2, 3, 4, 5, 6]
+    assert session.query(NoticeCategory).count() == 6
+    assert session.query(NoticeLocation).count() == 6
+    assert data_processor.stats.batches == 1
+    assert data_processor.stats.rows == 18 + session.query(NoticeToken).count()
+    assert data_processor.stats.rows_per_second > 0
+
+    corpus = session.get(CorpusStatistics, 1)
+    assert corpus.document_count == 6
+    assert corpus.total_token_count == sum(notice.token_count for notice in stored)
+    assert session.get(TermStatistics, "solar").document_frequency == 3
+
+
+def test_batched_processor_rolls_back_failed_batch(session: Session):
+    """ Test that a failure while persisting a batch leaves none of its rows behind. """
+    data = DataExtractService(JSONDataExtractStrategy()).load("data/notices.json")
+    notices = DataTransformService(JSONDataTransformStrategy()).transform_data(data)
+    invalid_ids = RelatedIds.model_construct(categoryIds=[None], locationIds=[])
+
+    data_processor = DataProcessorService(StubAnalyzer(session), batch_size=2)
+    with pytest.raises(Exception):
+        data_processor.persist_batch(notices, [None, invalid_ids])
+
+    assert session.query(Notice).count() == 0
+    assert session.query(NoticeCategory).count() == 0
+
+
+class CountingAnalyzer(StubAnalyzer):
+    def __init__(self, database):
+        super().__init__(database)
+        self.analyzed = []
+
+    def fetch_related_ids(self, categories: List[Category], locations: List[Location], notice: NoticeModel) -> Optional[RelatedIds]:
+        self.analyzed.append(notice.title)
+        return super().fetch_related_ids(categories, locations, notice)
+
+
+def test_incremental_processor_skips_unchanged_and_updates_changed_notices(session: Session):
+    """ Test that re-running an incremental ETL only classifies and rewrites the notices that changed. """
+    session.exec(text("INSERT INTO category (id, name) VALUES (1, 'Construction')"))
+    session.exec(text("INSERT INTO location (id, city, country) VALUES (1, 'Munich', 'Germany')"))
+    data = DataExtractService(JSONDataExtractStrategy()).load("data/notices.json")
+    notices = DataTransformService(JSONDataTransformStrategy()).transform_data(data)
+
+    analyzer = CountingAnalyzer(session)
+    data_processor = DataProcessorService(analyzer, batch_size=10, incremental=True)
+    data_processor.process(notices + notices[:1], source="notices.json")
+    assert (data_processor.stats.new, data_processor.stats.changed, data_processor.stats.skipped) == (2, 0, 1)
+
+    changed = notices[1].model_copy(update={"description": "Construction of a library with solar roofing."})
+    analyzer.analyzed.clear()
+    stored = data_processor.process([notices[0], changed], source="notices.json")
+
+    assert analyzer.analyzed == [changed.title]
+    assert (data_processor.stats.new, data_processor.stats.changed, data_processor.stats.skipped) == (0, 1, 1)
+    assert [notice.id for notice in stored] == [2]
+    assert session.query(Notice).count() == 2
+    assert session.get(Notice, 2).description == changed.description
+    assert session.query(NoticeCategory).count() == 2
+    assert session.query(NoticeToken).filter(NoticeToken.notice_id == 2).count() == len(
+        set(tokenize(changed.title) + tokenize(changed.description))
+    )
+
+    corpus = session.get(CorpusStatistics, 1)
+    assert corpus.document_count == 2
+    assert corpus.total_token_count == sum(notice.token_count for notice in session.query(Notice))
+    assert session.get(TermStatistics, "solar").document_frequency == 2
+    assert sum(term.document_frequency for term in session.query(TermStatistics)) == session.query(NoticeToken).count()
+
+    watermark = session.get(SourceWatermark, "notices.json")
+    assert watermark.offset == 2
+    assert watermark.last_publication == max(notice.publication_deadline for notice in notices)
+
+
+def test_incremental_processor_updates_notices_stored_without_external_id(session: Session):
+    """ Test that notices stored before external ids existed are recognized by their natural key and updated once. """
+    session.exec(text("INSERT INTO category (id, name) VALUES (1, 'Construction')"))
+    session.exec(text("INSERT INTO location (id, city, country) VALUES (1, 'Munich', 'Germany')"))
+    data = DataExtractService(JSONDataExtractStrategy()).load("data/notices.json")
+    notices = DataTransformService(JSONDataTransformStrategy()).transform_data(data)
+    DataProcessorService(StubAnalyzer(session)).process(notices)
+    session.exec(text("UPDATE notice SET external_id = NULL, content_hash = NULL"))
+    session.commit()
+
+    data_processor = DataProcessorService(StubAnalyzer(session), incremental=True)
+    data_processor.process(notices)
+    assert (data_processor.stats.new, data_processor.stats.changed, data_processor.stats.skipped) == (0, 2, 0)
+    assert session.query(Notice).count() == 2
+    assert session.query(Notice).filter(Notice.external_id.is_(None)).count() == 0
+
+    data_processor.process(notices)
+    assert (data_processor.stats.new, data_processor.stats.changed, data_processor.stats.skipped) == (0, 0, 2)
+
+
+def test_updating_notices_stored_without_postings_keeps_the_document_count(session: Session):
+    """ Test that updating a notice stored before the token index only adds it to the corpus statistics. """
+    session.exec(text("INSERT INTO category (id, name) VALUES (1, 'Construction')"))
+    session.exec(text("INSERT INTO location (id, city, country) VALUES (1, 'Munich', 'Germany')"))
+    data = DataExtractService(JSONDataExtractStrategy()).load("data/notices.json")
+    notices = DataTransformService(JSONDataTransformStrategy()).transform_data(data)
+    DataProcessorService(StubAnalyzer(session)).process(notices[:1])
+    legacy = Notice(
+        title=notices[1].title, description=notices[1].description, buyer=notices[1].buyer,
+        publication_deadline=notices[1].publication_deadline.date(),
+    )
+    session.add(legacy)
+    session.commit()
+
+    data_processor = DataProcessorService(StubAnalyzer(session), incremental=True)
+    data_processor.process(notices)
+
+    assert (data_processor.stats.new, data_processor.stats.changed, data_processor.stats.skipped) == (0, 1, 1)
+    corpus = session.get(CorpusStatistics, 1)
+    assert corpus.document_count == 2
+    assert corpus.total_token_count == sum(notice.token_count for notice in session.query(Notice))
+
+
+def test_processor_resumes_after_source_watermark(session: Session):
+    """ Test that a resumed run skips the records consumed by the previous runs of the source. """
+    session.exec(text("INSERT INTO category (id, name) VALUES (1, 'Construction')"))
+    session.exec(text("INSERT INTO location (id, city, country) VALUES (1, 'Munich', 'Germany')"))
+    data = DataExtractService(JSONDataExtractStrategy()).load("data/notices.json")
+    notices = DataTransformService(JSONDataTransformStrategy()).transform_data(data)
+
+    DataProcessorService(StubAnalyzer(session)).process(notices[:1], source="feed")
+    data_processor = DataProcessorService(StubAnalyzer(session))
+    stored = data_processor.process(notices, source="feed", resume=True)
+
+    assert [notice.title for notice in stored] == [notices[1].title]
+    assert data_processor.stats.skipped == 1
+    assert session.get(SourceWatermark, "feed").offset == 2
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_parallel_transformer_quarantines_invalid_records(tmp_path, processes):
+    """ Test that invalid records are quarantined with their reason while valid ones keep their order. """
+    with open("data/notices.json") as f:
+        records = json.load(f)
+    missing_title = {key: value for key, value in records[0].items() if key != "title"}
+    bad_deadline = {**records[1], "submission_deadline": "next week"}
+    data = [records[0], missing_title, "not a notice", records[1], bad_deadline] * 3
+    quarantine_path = tmp_path / "quarantine.ndjson"
+
+    strategy = ParallelJSONDataTransformStrategy(processes=processes, chunk_size=2, quarantine_path=str(quarantine_path))
+    notices = list(DataTransformService(strategy).transform_stream(data))
+
+    assert [notice.title for notice in notices] == [records[0]["title"], records[1]["title"]] * 3
+    assert notices == JSONDataTransformStrategy().transform(records * 3)
+    assert (strategy.stats.records, strategy.stats.rejected) == (15, 9)
+    assert strategy.stats.reject_rate == pytest.approx(0.6)
+    assert strategy.stats.records_per_second > 0
+
+    with open(quarantine_path) as f:
+        quarantined = [json.loads(line) for line in f]
+    assert [entry["record"] for entry in quarantined[:3]] == [missing_title, "not a notice", bad_deadline]
+    assert quarantined[0]["reason"].startswith("title: Field required")
+    assert quarantined[2]["reason"].startswith("submission_deadline: ")
@@ -0,0 +1,187 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import islice
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from tendara_ai_challenge.etl.dto import PortalConfig
+from tendara_ai_challenge.etl.extractor import APIDataExtractStrategy, DataExtractService
+from tendara_ai_challenge.etl.fetcher import PortalFetcher
+from tendara_ai_challenge.etl.transformer import DataTransformService, JSONDataTransformStrategy
+
+PAGE_SIZE = 3
+
+
+def make_records(portal: str, count: int) -> list:
+    with open("data/notices.json") as f:
+        template = json.load(f)[0]
+    return [{**template, "title": f"{portal} notice {number}"} for number in range(count)]
+
+
+class StubPortalHandler(BaseHTTPRequestHandler):
+    """Serves `/<portal>/notices` pages of `PAGE_SIZE` records, paginated by an offset cursor.
+
+    Portals can be slow (`delays`), fail their first requests with 503 (`failures`) or always fail (`broken`).
+    Every page carries an ETag, and a matching If-None-Match on the first page is answered with 304.
+    """
+
+    def do_GET(self):
+        state = self.server.state
+        url = urlsplit(self.path)
+        portal = url.path.strip("/").split("/")[0]
+        cursor = int(parse_qs(url.query).get("cursor", ["0"])[0])
+
+        with state["lock"]:
+            state["requests"][portal] = state["requests"].get(portal, 0) + 1
+            state["in_flight"][portal] = state["in_flight"].get(portal, 0) + 1
+            state["max_in_flight"][portal] = max(state["max_in_flight"].get(portal, 0), state["in_flight"][portal])
+            fail = portal in state["broken"] or state["failures"].get(portal, 0) > 0
+            state["failures"][portal] = state["failures"].get(portal, 0) - 1
+        try:
+            time.sleep(state["delays"].get(portal, 0))
+            if fail:
+                return self._respond(503, {"error": "unavailable"}, {"Retry-After": "0"})
+
+            records = state["records"][portal]
+            etag = f'"{portal}-{len(records)}"'
+            if cursor == 0 and self.headers.get("If-None-Match") == etag:
+                return self._respond(304, None, {"ETag": etag})
+
+            page = {"notices": records[cursor:cursor + PAGE_SIZE]}
+            if cursor + PAGE_SIZE < len(records):
+                page["next_cursor"] = str(cursor + PAGE_SIZE)
+            self._respond(200, page, {"ETag": etag})
+        finally:
+            with state["lock"]:
+                state["in_flight"][portal] -= 1
+
+    def _respond(self, status: int, payload, headers: dict):
+        data = json.dumps(payload).encode() if payload is not None else b""
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(name="portal_server")
+def portal_server_fixture():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubPortalHandler)
+    server.state = {
+        "lock": threading.Lock(),
+        "records": {"fast": make_records("fast", 7), "slow": make_records("slow", 4), "flaky": make_records("flaky", 5)},
+        "delays": {"slow": 0.05},
+        "failures": {"flaky": 2},
+        "broken": set(),
+        "requests": {},
+        "in_flight": {},
+        "max_in_flight": {},
+    }
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def portal(server: ThreadingHTTPServer, name: str, **options) -> PortalConfig:
+    host, port = server.server_address
+    return PortalConfig(name=name, urls=[f"http://{host}:{port}/{name}/notices"], **options)
+
+
+def fetch_all(fetcher: PortalFetcher, portals) -> list:
+    async def collect():
+        return [record async for record in fetcher.fetch(portals)]
+
+    return asyncio.run(collect())
+
+
+def test_fetcher_crawls_all_pages_and_retries_flaky_portals(portal_server: ThreadingHTTPServer):
+    portal_server.state["broken"].add("down")
+    portal_server.state["records"]["down"] = make_records("down", 1)
+    fetcher = PortalFetcher(max_retries=3, backoff_seconds=0.01)
+
+    records = fetch_all(fetcher, [portal(portal_server, name) for name in ("fast", "slow", "flaky", "down")])
+
+    expected = [
+        record["title"] for name in ("fast", "slow", "flaky") for record in portal_server.state["records"][name]
+    ]
+    assert sorted(record["title"] for record in records) == sorted(expected)
+    assert portal_server.state["requests"]["flaky"] == 2 + 2
+    assert portal_server.state["requests"]["down"] == 4
+    assert fetcher.stats.failed_portals == ["down"]
+    assert fetcher.stats.pages == 3 + 2 + 2
+    assert fetcher.stats.retries == 2 + 3
+
+
+def test_failed_feed_cancels_the_other_feeds_of_its_portal(portal_server: ThreadingHTTPServer):
+    portal_server.state["broken"].add("down")
+    portal_server.state["records"]["down"] = make_records("down", 1)
+    portal_server.state["records"]["slow"] = make_records("slow", 30)
+    portal_server.state["records"]["fast"] = make_records("fast", 90)
+    portal_server.state["delays"]["fast"] = 0.02
+    host, port = portal_server.server_address
+    mixed = PortalConfig(name="mixed", urls=[f"http://{host}:{port}/{name}/notices" for name in ("down", "slow")])
+    fetcher = PortalFetcher(max_retries=1, backoff_seconds=0.01)
+
+    # The other portal keeps the crawl running long after the mixed portal failed.
+    records = fetch_all(fetcher, [mixed, portal(portal_server, "fast")])
+
+    assert fetcher.stats.failed_portals == ["mixed"]
+    assert len([record for record in records if record["title"].startswith("fast")]) == 90
+    assert len([record for record in records if record["title"].startswith("slow")]) <= PAGE_SIZE
+
+
+def test_fetcher_skips_unchanged_feeds_with_conditional_requests(portal_server: ThreadingHTTPServer):
+    fetcher = PortalFetcher(backoff_seconds=0.01)
+    portals = [portal(portal_server, "fast"), portal(portal_server, "slow")]
+    assert len(fetch_all(fetcher, portals)) == 11
+
+    portal_server.state["records"]["slow"].append(make_records("slow", 5)[-1])
+    records = fetch_all(fetcher, portals)
+
+    assert [record["title"] for record in records] == [record["title"] for record in portal_server.state["records"]["slow"]]
+    assert fetcher.stats.not_modified == 1
+
+
+def test_fetcher_limits_concurrency_per_portal(portal_server: ThreadingHTTPServer):
+    portal_server.state["delays"]["fast"] = 0.02
+    feeds = portal(portal_server, "fast", concurrency=1)
+    feeds.urls = feeds.urls * 4
+    busy = portal(portal_server, "slow", concurrency=4)
+    busy.urls = busy.urls * 4
+
+    fetch_all(PortalFetcher(), [feeds, busy])
+
+    assert portal_server.state["max_in_flight"]["fast"] == 1
+    assert portal_server.state["max_in_flight"]["slow"] > 1
+
+
+def test_api_extract_strategy_feeds_streaming_transform(portal_server: ThreadingHTTPServer):
+    strategy = APIDataExtractStrategy([portal(portal_server, "fast"), portal(portal_server, "flaky")], PortalFetcher(backoff_seconds=0.01))
+    records = DataExtractService(strategy).stream(None)
+    notices = list(DataTransformService(JSONDataTransformStrategy()).transform_stream(records))
+
+    assert len(notices) == 12
+    assert {notice.title for notice in notices} >= {"fast notice 0", "flaky notice 4"}
+
+
+def test_api_extract_strategy_stops_fetching_when_consumer_stops(portal_server: ThreadingHTTPServer):
+    portal_server.state["records"]["fast"] = make_records("fast", 300)
+    strategy = APIDataExtractStrategy(fetcher=PortalFetcher(max_buffered_pages=1))
+    host, port = portal_server.server_address
+
+    records = strategy.stream_data(f"http://{host}:{port}/fast/notices")
+    assert len(list(islice(records, 4))) == 4
+    records.close()
+
+    assert portal_server.state["requests"]["fast"] < 100 // PAGE_SIZE
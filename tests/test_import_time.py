@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).parent.parent
+
+# Cumulative import time allowed per module, in seconds. The OpenAI SDK alone takes about half a second.
+BUDGETS = {
+    "tendara_ai_challenge.etl.processor": 0.8,
+    "tendara_ai_challenge.etl.concurrency": 0.8,
+    "tendara_ai_challenge.etl.batching": 0.8,
+    "tendara_ai_challenge.app": 1.5,
+}
+
+# Modules only needed once a client or engine is used.
+LAZY_MODULES = {"openai", "dotenv", "aiosqlite"}
+
+
+def import_in_fresh_interpreter(module: str, tmp_path: Path, code: str = "") -> subprocess.CompletedProcess:
+    env = {key: value for key, value in os.environ.items() if key not in ("OPENAI_API_KEY", "DATABASE_URL")}
+    env["PYTHONPATH"] = str(ROOT)
+    env["DATABASE_URL"] = f"sqlite:///{tmp_path / 'import.db'}"
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import sys, {module}\n{code}"],
+        cwd=tmp_path, env=env, capture_output=True, text=True,
+    )
+
+
+def cumulative_seconds(importtime: str) -> dict:
+    """Parses the `-X importtime` report into the cumulative import time of every module."""
+    seconds = {}
+    for line in importtime.splitlines():
+        if line.startswith("import time:") and "|" in line and "cumulative" not in line:
+            _, cumulative, module = line[len("import time:"):].split("|")
+            seconds[module.strip()] = int(cumulative) / 1_000_000
+    return seconds
+
+
+@pytest.mark.parametrize("module", sorted(BUDGETS))
+def test_import_stays_within_budget_without_credentials(module: str, tmp_path: Path):
+    result = import_in_fresh_interpreter(
+        module, tmp_path, "print(','.join(sorted(name for name in sys.modules if '.' not in name)))"
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert not LAZY_MODULES & set(result.stdout.strip().split(","))
+    assert cumulative_seconds(result.stderr)[module] < BUDGETS[module]
+
+
+def test_import_creates_no_engine_or_client(tmp_path: Path):
+    result = import_in_fresh_interpreter("tendara_ai_challenge.app", tmp_path, "\n".join([
+        "from tendara_ai_challenge.matching.database import get_async_engine, get_engine",
+        "from tendara_ai_challenge.etl.processor import OpenAIAnalyzer, get_openai_client",
+        "analyzer = OpenAIAnalyzer(None)",
+        "assert get_engine.cache_info().currsize == get_async_engine.cache_info().currsize == 0",
+        "assert get_openai_client.cache_info().currsize == 0",
+    ]))
+
+    assert result.returncode == 0, result.stderr
+    assert not (tmp_path / "import.db").exists()
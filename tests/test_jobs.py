@@ -0,0 +1,336 @@
+import json
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import pytest
+from sqlalchemy import text
+from sqlmodel import Session, SQLModel, select
+
+from tendara_ai_challenge.etl.batching import BatchOpenAIAnalyzer
+from tendara_ai_challenge.etl.cache import CachedAnalyzer
+from tendara_ai_challenge.etl.concurrency import ConcurrentAnalyzer
+from tendara_ai_challenge.etl.dto import RelatedIds
+from tendara_ai_challenge.etl.jobs import JobQueue
+from tendara_ai_challenge.etl.preclassifier import RuleBasedAnalyzer
+from tendara_ai_challenge.etl.processor import Analyzer
+from tendara_ai_challenge.etl.worker import AnalyzerConfig, EtlWorker, build_analyzer, main, run_workers
+from tendara_ai_challenge.matching.database import create_db_engine
+from tendara_ai_challenge.matching.dto import NoticeModel
+from tendara_ai_challenge.matching.entity import Category, EtlTask, Location, Notice, NoticeCategory, Profile, ProfileMatch
+from tendara_ai_challenge.matching.synthetic import synthetic_records
+from tendara_ai_challenge.settings import get_settings
+
+
+class StubAnalyzer(Analyzer):
+    """Links every notice to the first category and location, without calling an LLM."""
+
+    def fetch_related_ids(self, categories: List[Category], locations: List[Location], notice: NoticeModel) -> Optional[RelatedIds]:
+        return RelatedIds(categoryIds=[categories[0].id], locationIds=[locations[0].id])
+
+
+class FlakyAnalyzer(StubAnalyzer):
+    """Fails its first `failures` batches."""
+
+    failures = 1
+
+    def fetch_related_ids_batch(self, categories, locations, notices):
+        if FlakyAnalyzer.failures:
+            FlakyAnalyzer.failures -= 1
+            raise RuntimeError("LLM unavailable")
+        return super().fetch_related_ids_batch(categories, locations, notices)
+
+
+class InterruptedAnalyzer(StubAnalyzer):
+    """Fails once it analyzed `batches` batches, counting the notices it analyzed and recording the classify leases."""
+
+    batches = 1
+    analyzed = 0
+    leases = []
+
+    def fetch_related_ids_batch(self, categories, locations, notices):
+        InterruptedAnalyzer.leases.append(
+            self.database.exec(select(EtlTask.lease_expires_at).where(EtlTask.kind == "classify")).one()
+        )
+        if not InterruptedAnalyzer.batches:
+            raise RuntimeError("Worker stopped")
+        InterruptedAnalyzer.batches -= 1
+        InterruptedAnalyzer.analyzed += len(notices)
+        return super().fetch_related_ids_batch(categories, locations, notices)
+
+
+@pytest.fixture(name="database_url")
+def database_url_fixture(tmp_path: Path):
+    url = f"sqlite:///{tmp_path / 'jobs.db'}"
+    engine = create_db_engine(url)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.exec(text("INSERT INTO category (id, name) VALUES (1, 'Construction')"))
+        session.exec(text("INSERT INTO location (id, city, country) VALUES (1, 'Munich', 'Germany')"))
+        session.commit()
+    engine.dispose()
+    return url
+
+
+@pytest.fixture(name="queue")
+def queue_fixture(database_url: str):
+    engine = create_db_engine(database_url)
+    yield JobQueue(engine, backoff_seconds=0)
+    engine.dispose()
+
+
+def write_records(path: Path, count: int, malformed_after: Optional[int] = None) -> str:
+    with open(path, "w", encoding="utf-8") as f:
+        for number, record in enumerate(synthetic_records(count, seed=1)):
+            if number == malformed_after:
+                f.write("{not json\n")
+            f.write(json.dumps(record) + "\n")
+    return str(path)
+
+
+def tasks(queue: JobQueue) -> List[EtlTask]:
+    with Session(queue.engine) as db:
+        return db.exec(select(EtlTask).order_by(EtlTask.id)).all()
+
+
+def notice_count(queue: JobQueue) -> int:
+    with Session(queue.engine) as db:
+        return len(db.exec(select(Notice.id)).all())
+
+
+def test_worker_runs_job_through_checkpointed_tasks(queue: JobQueue, tmp_path: Path):
+    job_id = queue.enqueue(write_records(tmp_path / "notices.ndjson", 10), chunk_size=4)
+
+    EtlWorker(queue, StubAnalyzer, poll_seconds=0).run(until_empty=True)
+
+    assert queue.job(job_id).status == "done"
+    assert notice_count(queue) == 10
+    by_kind = {}
+    for task in tasks(queue):
+        assert task.status == "done"
+        by_kind.setdefault(task.kind, []).append(task.records)
+    assert by_kind == {"extract": [10], "classify": [4, 4, 2], "persist": [4, 4, 2]}
+    with Session(queue.engine) as db:
+        assert len(db.exec(select(NoticeCategory.notice_id)).all()) == 10
+    assert queue.depth() == {("extract", "done"): 1, ("classify", "done"): 3, ("persist", "done"): 3}
+    assert queue.throughput() == pytest.approx(10 / 60)
+
+
+def test_failed_task_is_retried_with_backoff(queue: JobQueue, tmp_path: Path):
+    FlakyAnalyzer.failures = 1
+    job_id = queue.enqueue(write_records(tmp_path / "notices.ndjson", 3), chunk_size=3)
+
+    EtlWorker(queue, FlakyAnalyzer, poll_seconds=0).run(until_empty=True)
+
+    classify = [task for task in tasks(queue) if task.kind == "classify"]
+    assert [(task.status, task.attempts) for task in classify] == [("done", 2)]
+    assert classify[0].error == "RuntimeError: LLM unavailable"
+    assert queue.job(job_id).status == "done"
+    assert notice_count(queue) == 3
+
+
+def test_task_failing_every_attempt_fails_its_job(queue: JobQueue, tmp_path: Path):
+    FlakyAnalyzer.failures = queue.max_attempts
+    job_id = queue.enqueue(write_records(tmp_path / "notices.ndjson", 3), chunk_size=3)
+
+    EtlWorker(queue, FlakyAnalyzer, poll_seconds=0).run(until_empty=True)
+
+    assert queue.job(job_id).status == "failed"
+    assert [(task.kind, task.status, task.attempts) for task in tasks(queue)] == [
+        ("extract", "done", 1), ("classify", "failed", queue.max_attempts)
+    ]
+    assert notice_count(queue) == 0
+
+
+def test_extract_resumes_from_its_checkpoint(queue: JobQueue, tmp_path: Path):
+    path = tmp_path / "notices.ndjson"
+    job_id = queue.enqueue(write_records(path, 10, malformed_after=6), chunk_size=3)
+    worker = EtlWorker(queue, StubAnalyzer, poll_seconds=0)
+
+    # The extract task fails in its third chunk, after checkpointing the first two.
+    worker.run_task(queue.lease(worker.name))
+    extract = tasks(queue)[0]
+    assert (extract.status, json.loads(extract.payload)) == ("pending", {"offset": 6})
+
+    write_records(path, 10)
+    worker.run(until_empty=True)
+
+    assert queue.job(job_id).status == "done"
+    with Session(queue.engine) as db:
+        assert sorted(db.exec(select(Notice.title)).all()) == sorted(record["title"] for record in synthetic_records(10, seed=1))
+
+
+def test_classify_resumes_from_its_checkpointed_analyses(queue: JobQueue, tmp_path: Path):
+    InterruptedAnalyzer.batches, InterruptedAnalyzer.analyzed, InterruptedAnalyzer.leases = 1, 0, []
+    job_id = queue.enqueue(write_records(tmp_path / "notices.ndjson", 5), chunk_size=5)
+    worker = EtlWorker(queue, InterruptedAnalyzer, poll_seconds=0, classify_batch_size=2)
+    worker.run(max_tasks=1)
+
+    # The classify task fails in its second batch, after checkpointing the analyses of the first.
+    worker.run(max_tasks=1)
+    classify = tasks(queue)[1]
+    assert classify.status == "pending"
+    assert InterruptedAnalyzer.leases[1] > InterruptedAnalyzer.leases[0]
+    assert len(json.loads(classify.payload)["related_ids"]) == 2
+
+    InterruptedAnalyzer.batches = 10
+    worker.run(until_empty=True)
+
+    assert queue.job(job_id).status == "done"
+    assert notice_count(queue) == 5
+    assert InterruptedAnalyzer.analyzed == 5
+
+
+def test_extract_quarantines_invalid_records(queue: JobQueue, tmp_path: Path):
+    path = tmp_path / "notices.ndjson"
+    write_records(path, 3)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"title": "No deadlines", "volume": "a lot"}) + "\n")
+    job_id = queue.enqueue(str(path), chunk_size=2)
+
+    EtlWorker(queue, StubAnalyzer, poll_seconds=0, quarantine_path=str(tmp_path / "rejects.ndjson")).run(until_empty=True)
+
+    assert queue.job(job_id).status == "done"
+    assert notice_count(queue) == 3
+    with open(tmp_path / "rejects.ndjson", encoding="utf-8") as f:
+        rejects = [json.loads(line) for line in f]
+    assert [reject["record"]["title"] for reject in rejects] == ["No deadlines"]
+    assert "volume" in rejects[0]["reason"]
+
+
+def test_expired_lease_is_taken_over_and_persists_once(queue: JobQueue, tmp_path: Path):
+    queue.lease_seconds = 0.05
+    job_id = queue.enqueue(write_records(tmp_path / "notices.ndjson", 4), chunk_size=4)
+    worker = EtlWorker(queue, StubAnalyzer, name="crashed", poll_seconds=0)
+    worker.run(max_tasks=2)
+    persist = queue.lease("crashed")
+    assert persist.kind == "persist"
+
+    # The crashed worker's lease expires and another worker stores the chunk.
+    time.sleep(0.1)
+    queue.lease_seconds = 300
+    EtlWorker(queue, StubAnalyzer, name="restarted", poll_seconds=0).run(until_empty=True)
+    assert notice_count(queue) == 4
+
+    # The crashed worker coming back cannot store the chunk a second time.
+    worker.run_task(persist)
+    assert notice_count(queue) == 4
+    assert tasks(queue)[-1].lease_owner == "restarted"
+    assert queue.job(job_id).status == "done"
+
+
+def test_incremental_job_skips_unchanged_notices(queue: JobQueue, tmp_path: Path):
+    source = write_records(tmp_path / "notices.ndjson", 5)
+    worker = EtlWorker(queue, StubAnalyzer, poll_seconds=0)
+    queue.enqueue(source, chunk_size=2, incremental=True)
+    worker.run(until_empty=True)
+
+    job_id = queue.enqueue(source, chunk_size=2, incremental=True)
+    worker.run(until_empty=True)
+
+    assert queue.job(job_id).status == "done"
+    assert notice_count(queue) == 5
+    assert [task.records for task in tasks(queue) if task.job_id == job_id and task.kind == "classify"] == [0, 0, 0]
+
+
+def test_worker_composes_configured_analyzer(queue: JobQueue, tmp_path: Path):
+    factory = build_analyzer(AnalyzerConfig(analyzer="tests.test_jobs:StubAnalyzer", concurrency=4, requests_per_minute=600))
+    job_id = queue.enqueue(write_records(tmp_path / "notices.ndjson", 6), chunk_size=3)
+
+    EtlWorker(queue, factory, poll_seconds=0).run(until_empty=True)
+
+    with Session(queue.engine) as db:
+        first, second = factory(db), factory(db)
+    assert isinstance(first, RuleBasedAnalyzer)
+    assert isinstance(first.fallback, ConcurrentAnalyzer) and isinstance(first.fallback.analyzer, StubAnalyzer)
+    assert first.fallback.max_workers == 4
+    assert first.fallback.rate_limiter is second.fallback.rate_limiter
+    assert queue.job(job_id).status == "done"
+    assert notice_count(queue) == 6
+
+
+def test_worker_batches_notices_per_concurrent_request():
+    factory = build_analyzer(AnalyzerConfig(
+        cpv_categories=None,
+        analyzer="tendara_ai_challenge.etl.batching:BatchOpenAIAnalyzer",
+        notices_per_request=5,
+        concurrency=2,
+    ))
+
+    analyzer = factory(None)
+
+    assert isinstance(analyzer.analyzer, BatchOpenAIAnalyzer)
+    assert analyzer.analyzer.notices_per_request == analyzer.chunk_size == 5
+
+
+def test_worker_reuses_cached_analyses_across_jobs(tmp_path: Path):
+    config = AnalyzerConfig(analyzer="tests.test_jobs:StubAnalyzer", cache_path=str(tmp_path / "analyses.db"))
+    source = write_records(tmp_path / "notices.ndjson", 4)
+    hits = []
+    for run in range(2):
+        # A fresh database per run, as notices already stored are not classified again.
+        engine = create_db_engine(f"sqlite:///{tmp_path / f'run{run}.db'}")
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as db:
+            db.add(Category(id=1, name="Construction"))
+            db.add(Location(id=1, city="Munich", country="Germany"))
+            db.commit()
+        queue = JobQueue(engine)
+        factory = build_analyzer(config)
+        analyzers = []
+
+        def create(db: Session):
+            analyzers.append(factory(db))
+            return analyzers[-1]
+
+        queue.enqueue(source, chunk_size=4)
+        EtlWorker(queue, create, poll_seconds=0).run(until_empty=True)
+        hits.append(sum(analyzer.fallback.stats.hits for analyzer in analyzers))
+        assert isinstance(analyzers[0].fallback, CachedAnalyzer)
+        assert notice_count(queue) == 4
+        engine.dispose()
+
+    assert hits == [0, 4]
+
+
+def test_worker_processes_share_the_queue(database_url: str, queue: JobQueue, tmp_path: Path):
+    job_id = queue.enqueue(write_records(tmp_path / "notices.ndjson", 40), chunk_size=5)
+
+    run_workers(2, database_url, analyzer=AnalyzerConfig(analyzer="tests.test_jobs:StubAnalyzer"), until_empty=True)
+
+    assert queue.job(job_id).status == "done"
+    assert notice_count(queue) == 40
+    assert len({task.lease_owner for task in tasks(queue)}) <= 2
+
+
+def test_worker_processes_store_overlapping_incremental_chunks_once(database_url: str, queue: JobQueue, tmp_path: Path):
+    source = write_records(tmp_path / "notices.ndjson", 40)
+    job_ids = [queue.enqueue(source, chunk_size=5, incremental=True) for _ in range(2)]
+
+    run_workers(2, database_url, analyzer=AnalyzerConfig(analyzer="tests.test_jobs:StubAnalyzer"), until_empty=True)
+
+    assert [queue.job(job_id).status for job_id in job_ids] == ["done", "done"]
+    with Session(queue.engine) as db:
+        external_ids = db.exec(select(Notice.external_id)).all()
+    assert len(external_ids) == len(set(external_ids)) == 40
+
+
+def test_cli_enqueues_runs_and_reports(database_url: str, queue: JobQueue, tmp_path: Path, monkeypatch, capsys):
+    with Session(queue.engine) as db:
+        db.add(Profile(id=1, category_id=1, location_id=1, tags="school"))
+        db.commit()
+    monkeypatch.setenv("DATABASE_URL", database_url)
+    get_settings.cache_clear()
+    try:
+        main(["enqueue", write_records(tmp_path / "notices.ndjson", 3), "--chunk-size", "2"])
+        main(["work", "--analyzer", "tests.test_jobs:StubAnalyzer", "--until-empty"])
+        main(["status"])
+    finally:
+        get_settings.cache_clear()
+
+    output = capsys.readouterr().out
+    assert "Queued job 1" in output
+    assert "persist            0         0         2         0" in output
+    assert "1     done              5/5         3" in output
+    with Session(queue.engine) as db:
+        assert len(db.exec(select(ProfileMatch).where(ProfileMatch.profile_id == 1)).all()) == 3
@@ -1,8 +1,19 @@
 from tendara_ai_challenge.matching.utils import load_notices
+from tendara_ai_challenge.matching.synthetic import CITIES, DIVISIONS, synthetic_notices
 
 def test_load_notices():
     """Test that all notices are loaded correctly from the actual JSON file."""
     notices = load_notices()
     
     # Verify we have the expected number of notices
-    assert len(notices) == 100
\ No newline at end of file
+    assert len(notices) == 100
+
+def test_synthetic_notices_are_reproducible():
+    notices = list(synthetic_notices(500, seed=3))
+
+    assert notices == list(synthetic_notices(500, seed=3))
+    assert notices != list(synthetic_notices(500, seed=4))
+    assert len({notice.title for notice in notices}) > 400
+    assert len({notice.location for notice in notices}) == len(CITIES)
+    assert all(notice.submission_deadline > notice.publication_deadline for notice in notices)
+    assert all(code[:2] in {division for division, _, _ in DIVISIONS} for notice in notices for code in notice.cpv_codes)
@@ -1,32 +1,15 @@
 import pytest
 from fastapi.testclient import TestClient
+import numpy as np
 from sqlalchemy import text
-from sqlmodel import Session, SQLModel, create_engine
-from sqlmodel.pool import StaticPool
+from sqlmodel import Session, select
 
-from tendara_ai_challenge.matching.app import app
-from tendara_ai_challenge.matching.entity import get_session
-
-
-@pytest.fixture(name="session")
-def session_fixture():
-    engine = create_engine(
-        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
-    )
-    SQLModel.metadata.create_all(engine)
-    with Session(engine) as session:
-        yield session
-
-
-@pytest.fixture(name="client")
-def client_fixture(session: Session):
-    def get_session_override():
-        return session
-
-    app.dependency_overrides[get_session] = get_session_override
-    client = TestClient(app)
-    yield client
-    app.dependency_overrides.clear()
+from tendara_ai_challenge.matching.entity import DigestMatch, Profile
+from tendara_ai_challenge.matching.index import ensure_token_index, rebuild_token_index
+from tendara_ai_challenge.matching.matching import score_relevant_notices
+from tendara_ai_challenge.matching.ranking import top_k
+from tendara_ai_challenge.matching.tokenizer import parse_tags, tag_tokens, tokenize
+from tendara_ai_challenge.matching.versions import CORPUS_VERSION_ID, PROFILES_VERSION_ID, bump_version
 
 
 def test_should_match_if_same_category_location_tags(client: TestClient, session: Session):
@@ -94,3 +77,187 @@ def test_should_match_if_same_category_location_tags(client: TestClient, session
     response = client.get("profiles/3/matches")
     assert response.status_code == 200
     assert response.json()["notices"][0]["id"] == 1  # Solar Panels notice
+
+
+def test_should_rank_by_tag_hits_from_token_index(client: TestClient, session: Session):
+    session.exec(text("INSERT INTO category (id, name) VALUES (1, 'IT')"))
+    session.exec(text("INSERT INTO location (id, city, country) VALUES (1, 'Berlin', 'Germany')"))
+
+    session.exec(text("INSERT INTO notice (id, title, description) "
+                      "VALUES (1, 'Java Developer', 'Maintenance of a Java backend.')"))
+    session.exec(text("INSERT INTO notice (id, title, description) "
+                      "VALUES (2, 'Python Developer', 'Python, Django and C++ development for the city portal.')"))
+    for notice_id in (1, 2):
+        session.exec(text(f"INSERT INTO noticecategory (notice_id, category_id) VALUES ({notice_id}, 1)"))
+        session.exec(text(f"INSERT INTO noticelocation (notice_id, location_id) VALUES ({notice_id}, 1)"))
+
+    session.exec(text("INSERT INTO profile (id, category_id, location_id, tags) VALUES (1, 1, 1, 'Python, C++')"))
+    # Notices stored without their postings are indexed once, e.g. on startup after an upgrade.
+    assert ensure_token_index(session) == 2
+    assert ensure_token_index(session) == 0
+
+    response = client.get("profiles/1/matches")
+    assert response.status_code == 200
+    notices = response.json()["notices"]
+    assert [notice["id"] for notice in notices] == [2, 1]
+    assert notices[0]["match_score"] > 0
+    assert notices[1]["match_score"] == 0
+
+
+def test_tokenizer_is_shared_by_notices_and_tags():
+    assert tokenize("Python, Django and C++ development.") == ["python", "django", "and", "c++", "development"]
+    assert parse_tags("Python, C++,Java ") == ["Python", "C++", "Java"]
+    assert tag_tokens("Machine Learning,AI") == {"machine", "learning", "ai"}
+
+
+def test_top_k_selects_best_scores_with_deterministic_ties():
+    ids = np.array([1, 2, 3, 4, 5])
+    scores = np.array([0.5, 2.0, 0.5, 3.0, 0.5])
+
+    assert top_k(ids, scores) == [(4, 3.0), (2, 2.0), (1, 0.5), (3, 0.5), (5, 0.5)]
+    assert top_k(ids, scores, 3) == [(4, 3.0), (2, 2.0), (1, 0.5)]
+    assert top_k(ids, scores, 0) == []
+
+
+def test_should_paginate_matches_with_cursor_and_projection(client: TestClient, session: Session):
+    session.exec(text("INSERT INTO category (id, name) VALUES (1, 'IT')"))
+    session.exec(text("INSERT INTO location (id, city, country) VALUES (1, 'Berlin', 'Germany')"))
+    descriptions = ["Python", "Java", "Python Python", "Cobol", "Python Django", "Rust"]
+    for notice_id, description in enumerate(descriptions, 1):
+        session.exec(text(f"INSERT INTO notice (id, title, description, volume) "
+                          f"VALUES ({notice_id}, 'Notice {notice_id}', '{description}', {notice_id * 1000})"))
+        session.exec(text(f"INSERT INTO noticecategory (notice_id, category_id) VALUES ({notice_id}, 1)"))
+        session.exec(text(f"INSERT INTO noticelocation (notice_id, location_id) VALUES ({notice_id}, 1)"))
+    session.exec(text("INSERT INTO profile (id, category_id, location_id, tags) VALUES (1, 1, 1, 'Python')"))
+    rebuild_token_index(session)
+
+    pages = []
+    cursor = None
+    while True:
+        params = {"limit": 4, "fields": "title"}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("profiles/1/matches", params=params)
+        assert response.status_code == 200
+        pages.append(response.json()["notices"])
+        cursor = response.json()["next_cursor"]
+        if cursor is None:
+            break
+
+    assert [[notice["id"] for notice in page] for page in pages] == [[3, 1, 5, 2], [4, 6]]
+    assert set(pages[0][0]) == {"id", "title", "match_score"}
+    assert pages[0][0]["title"] == "Notice 3"
+
+    response = client.get("profiles/1/matches", params={"limit": 1})
+    assert set(response.json()["notices"][0]) >= {"id", "title", "description", "volume", "match_score"}
+
+
+def test_should_reject_invalid_page_requests(client: TestClient, session: Session):
+    session.exec(text("INSERT INTO profile (id, category_id, location_id, tags) VALUES (1, 1, 1, 'Python')"))
+
+    assert client.get("profiles/1/matches", params={"cursor": "not-a-cursor"}).status_code == 400
+    assert client.get("profiles/1/matches", params={"fields": "title,secret"}).status_code == 400
+    assert client.get("profiles/1/matches", params={"limit": 0}).status_code == 422
+
+
+def test_should_serve_unchanged_matches_from_cache_with_etag(client: TestClient, session: Session):
+    session.exec(text("INSERT INTO category (id, name) VALUES (1, 'IT')"))
+    session.exec(text("INSERT INTO location (id, city, country) VALUES (1, 'Berlin', 'Germany')"))
+    session.exec(text("INSERT INTO notice (id, title, description) VALUES (1, 'Python Developer', 'Python')"))
+    session.exec(text("INSERT INTO noticecategory (notice_id, category_id) VALUES (1, 1)"))
+    session.exec(text("INSERT INTO noticelocation (notice_id, location_id) VALUES (1, 1)"))
+    session.exec(text("INSERT INTO profile (id, category_id, location_id, tags) VALUES (1, 1, 1, 'Python')"))
+
+    response = client.get("profiles/1/matches")
+    etag = response.headers["ETag"]
+    assert [notice["id"] for notice in response.json()["notices"]] == [1]
+
+    # The cached ranking is served even though the notice links changed underneath it...
+    session.exec(text("DELETE FROM noticecategory"))
+    response = client.get("profiles/1/matches", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert client.get("profiles/1/matches", params={"limit": 10}, headers={"If-None-Match": etag}).status_code == 200
+
+    # ...until an ingest, here through another connection as by the ETL process, bumps the corpus version.
+    bump_version(session, CORPUS_VERSION_ID)
+    response = client.get("profiles/1/matches", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["notices"] == []
+    assert response.headers["ETag"] != etag
+
+
+def test_should_rerank_cached_matches_when_profiles_change_in_another_process(client: TestClient, session: Session):
+    session.exec(text("INSERT INTO category (id, name) VALUES (1, 'IT')"))
+    for notice_id in (1, 2):
+        session.exec(text(f"INSERT INTO location (id, city, country) VALUES ({notice_id}, 'City {notice_id}', 'Germany')"))
+        session.exec(text(f"INSERT INTO notice (id, title, description) VALUES ({notice_id}, 'Notice', 'Python')"))
+        session.exec(text(f"INSERT INTO noticecategory (notice_id, category_id) VALUES ({notice_id}, 1)"))
+        session.exec(text(f"INSERT INTO noticelocation (notice_id, location_id) VALUES ({notice_id}, {notice_id})"))
+    session.exec(text("INSERT INTO profile (id, category_id, location_id, tags) VALUES (1, 1, 1, 'Python')"))
+    session.commit()
+
+    response = client.get("profiles/1/matches")
+    etag = response.headers["ETag"]
+    assert [notice["id"] for notice in response.json()["notices"]] == [1]
+
+    # Another API process updates the profile: this process's cache never saw the update.
+    session.exec(text("UPDATE profile SET location_id = 2 WHERE id = 1"))
+    bump_version(session, PROFILES_VERSION_ID)
+    session.commit()
+    response = client.get("profiles/1/matches", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert [notice["id"] for notice in response.json()["notices"]] == [2]
+    assert response.headers["ETag"] != etag
+
+
+def test_digest_matches_every_profile_like_single_queries(client: TestClient, session: Session):
+    session.exec(text("INSERT INTO category (id, name) VALUES (1, 'IT')"))
+    session.exec(text("INSERT INTO location (id, city, country) VALUES (1, 'Berlin', 'Germany')"))
+    descriptions = ["Python", "Java", "Python Python Java", "Cobol", "Python Django", "Rust and Java"]
+    for notice_id, description in enumerate(descriptions, 1):
+        session.exec(text(f"INSERT INTO notice (id, title, description) "
+                          f"VALUES ({notice_id}, 'Notice {notice_id}', '{description}')"))
+        session.exec(text(f"INSERT INTO noticecategory (notice_id, category_id) VALUES ({notice_id}, 1)"))
+        session.exec(text(f"INSERT INTO noticelocation (notice_id, location_id) VALUES ({notice_id}, 1)"))
+    for profile_id, tags in enumerate(["Python", "Java", "Rust,Cobol", "Python,Django"], 1):
+        session.exec(text(f"INSERT INTO profile (id, category_id, location_id, tags) VALUES ({profile_id}, 1, 1, '{tags}')"))
+    session.exec(text("INSERT INTO profile (id, category_id, location_id, tags) VALUES (5, 2, 1, 'Python')"))
+    rebuild_token_index(session)
+
+    response = client.post("matches/digest", params={"limit": 3})
+    assert response.status_code == 200
+    assert response.json()["profiles"] == 5
+    assert response.json()["groups"] == 2
+    assert response.json()["profiles_per_second"] > 0
+
+    for profile_id in range(1, 6):
+        digest = session.exec(
+            select(DigestMatch).where(DigestMatch.profile_id == profile_id).order_by(DigestMatch.rank)
+        ).all()
+        expected = score_relevant_notices(session.get(Profile, profile_id), session, 3)
+        assert [(match.notice_id, pytest.approx(match.match_score)) for match in digest] == expected
+
+        response = client.get(f"profiles/{profile_id}/digest", params={"fields": "title"})
+        assert response.status_code == 200
+        assert [(notice["id"], pytest.approx(notice["match_score"])) for notice in response.json()["notices"]] == expected
+    assert client.get("profiles/6/digest").status_code == 404
+
+
+def test_digest_applies_the_other_criteria_of_profiles(client: TestClient, session: Session):
+    session.exec(text("INSERT INTO category (id, name) VALUES (1, 'IT'), (2, 'Construction')"))
+    session.exec(text("INSERT INTO location (id, city, country) VALUES (1, 'Berlin', 'Germany')"))
+    for notice_id, (category_id, volume) in enumerate([(1, 50_000), (1, 500_000), (2, 900_000), (2, 10_000)], 1):
+        session.exec(text(f"INSERT INTO notice (id, title, description, volume) "
+                          f"VALUES ({notice_id}, 'Notice {notice_id}', 'Python', {volume})"))
+        session.exec(text(f"INSERT INTO noticecategory (notice_id, category_id) VALUES ({notice_id}, {category_id})"))
+        session.exec(text(f"INSERT INTO noticelocation (notice_id, location_id) VALUES ({notice_id}, 1)"))
+    session.exec(text("INSERT INTO profile (id, category_id, location_id, tags, category_ids, min_volume) "
+                      "VALUES (1, 1, 1, 'Python', '2', 100000)"))
+    rebuild_token_index(session)
+
+    response = client.post("matches/digest")
+    assert response.json()["groups"] == 1
+
+    response = client.get("profiles/1/digest")
+    assert [notice["id"] for notice in response.json()["notices"]] == [2, 3]
@@ -0,0 +1,144 @@
+import time
+from typing import List, Optional
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import StaticPool, create_engine, text
+from sqlmodel import Session, SQLModel
+
+from tendara_ai_challenge.etl.dto import RelatedIds
+from tendara_ai_challenge.etl.extractor import DataExtractService, StreamingJSONDataExtractStrategy
+from tendara_ai_challenge.etl.instrumentation import ETL_BATCH_SECONDS, ETL_RECORD_SECONDS, ETL_RECORDS
+from tendara_ai_challenge.etl.processor import Analyzer, DataProcessorService
+from tendara_ai_challenge.etl.transformer import DataTransformService, JSONDataTransformStrategy
+from tendara_ai_challenge.matching.app import app as matching_app
+from tendara_ai_challenge.matching.dto import NoticeModel
+from tendara_ai_challenge.matching.entity import Category, Location
+from tendara_ai_challenge.metrics import MetricsRegistry, metrics, serve_metrics, timed_stream
+from tendara_ai_challenge.profile.app import app as profile_app
+
+
+class StubAnalyzer(Analyzer):
+    def fetch_related_ids(self, categories: List[Category], locations: List[Location], notice: NoticeModel) -> Optional[RelatedIds]:
+        return RelatedIds(categoryIds=[1], locationIds=[1])
+
+
+@pytest.fixture(name="session")
+def session_fixture():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.exec(text("INSERT INTO category (id, name) VALUES (1, 'Construction')"))
+        session.exec(text("INSERT INTO location (id, city, country) VALUES (1, 'Munich', 'Germany')"))
+        yield session
+
+
+@pytest.fixture(name="enabled_metrics")
+def enabled_metrics_fixture():
+    metrics.enabled = True
+    metrics.clear()
+    yield metrics
+    metrics.enabled = False
+    metrics.clear()
+
+
+def test_registry_renders_prometheus_text_format():
+    registry = MetricsRegistry(enabled=True)
+    requests = registry.counter("requests_total", "Handled requests.", ["path"])
+    latency = registry.histogram("latency_seconds", "Request latency.", buckets=(0.1, 1.0))
+
+    requests.inc(path="/a")
+    requests.inc(2, path='/b"c')
+    for value in (0.05, 0.5, 5):
+        latency.observe(value)
+
+    assert registry.render() == "\n".join([
+        "# HELP requests_total Handled requests.",
+        "# TYPE requests_total counter",
+        'requests_total{path="/a"} 1',
+        'requests_total{path="/b\\"c"} 2',
+        "# HELP latency_seconds Request latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{le="0.1"} 1',
+        'latency_seconds_bucket{le="1"} 2',
+        'latency_seconds_bucket{le="+Inf"} 3',
+        "latency_seconds_sum 5.55",
+        "latency_seconds_count 3",
+    ]) + "\n"
+    assert registry.counter("requests_total", "Handled requests.", ["path"]) is requests
+    with pytest.raises(ValueError):
+        registry.histogram("requests_total", "Handled requests.", ["path"])
+    with pytest.raises(ValueError):
+        requests.inc()
+
+
+def test_disabled_registry_records_nothing():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Handled requests.")
+    latency = registry.histogram("latency_seconds", "Request latency.")
+    items = iter([1, 2])
+
+    requests.inc()
+    with latency.time():
+        pass
+
+    assert requests.value() == 0
+    assert latency.count() == 0
+    assert timed_stream(lambda data: data, items, latency) is items
+
+
+def test_timed_stream_excludes_upstream_time():
+    registry = MetricsRegistry(enabled=True)
+    latency = registry.histogram("stage_seconds", "Stage latency.")
+
+    def slow_source():
+        for number in range(3):
+            time.sleep(0.05)
+            yield number
+
+    assert list(timed_stream(lambda numbers: (number * 2 for number in numbers), slow_source(), latency)) == [0, 2, 4]
+    assert latency.count() == 3
+    assert latency.sum() < 0.05
+
+
+def test_etl_stages_are_instrumented(enabled_metrics: MetricsRegistry, session: Session):
+    records = DataExtractService(StreamingJSONDataExtractStrategy()).stream("data/notices.json")
+    notices = DataTransformService(JSONDataTransformStrategy()).transform_stream(records)
+    DataProcessorService(StubAnalyzer(session), batch_size=10).process(notices)
+
+    for stage in ("extract", "transform", "analyze", "persist"):
+        assert ETL_RECORDS.value(stage=stage) == 2
+    assert ETL_RECORD_SECONDS.count(stage="extract") == 2
+    assert ETL_RECORD_SECONDS.count(stage="transform") == 2
+    assert ETL_BATCH_SECONDS.count(stage="analyze") == 1
+    assert ETL_BATCH_SECONDS.count(stage="persist") == 1
+    assert 'etl_records_total{stage="persist"} 2' in enabled_metrics.render()
+
+
+@pytest.mark.parametrize("app", [matching_app, profile_app])
+def test_apps_expose_metrics(enabled_metrics: MetricsRegistry, app):
+    ETL_RECORDS.inc(3, stage="extract")
+
+    response = TestClient(app).get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'etl_records_total{stage="extract"} 3' in response.text
+    assert "# TYPE match_query_seconds histogram" in response.text
+
+
+
+def test_processes_without_app_serve_their_metrics():
+    registry = MetricsRegistry(enabled=True)
+    registry.counter("etl_tasks_total", "Tasks run.").inc()
+    server = serve_metrics(0, registry, host="127.0.0.1")
+    try:
+        response = httpx.get(f"http://127.0.0.1:{server.server_address[1]}/metrics")
+    finally:
+        server.shutdown()
+
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "etl_tasks_total 1" in response.text
@@ -0,0 +1,147 @@
+from datetime import date, datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+from tendara_ai_challenge.etl.dto import RelatedIds
+from tendara_ai_challenge.etl.listeners import PercolatorListener
+from tendara_ai_challenge.etl.processor import Analyzer, DataProcessorService
+from tendara_ai_challenge.matching.aho_corasick import AhoCorasick
+from tendara_ai_challenge.matching.dto import NoticeModel
+from tendara_ai_challenge.matching.entity import Profile, ProfileMatch
+from tendara_ai_challenge.matching.matching import score_relevant_notices
+from tendara_ai_challenge.matching.percolator import ProfilePercolator
+from tendara_ai_challenge.matching.utils import load_notices
+from tendara_ai_challenge.matching.versions import PROFILES_VERSION_ID, bump_version
+
+
+class StubAnalyzer(Analyzer):
+    """Links every notice to the first category and location, without calling an LLM."""
+
+    def fetch_related_ids(self, categories, locations, notice):
+        return RelatedIds(categoryIds=[1], locationIds=[1])
+
+
+class SupplyOrOtherAnalyzer(Analyzer):
+    """Puts supply notices in category 2 (Munich), everything else in category 1 (Dublin)."""
+
+    def fetch_related_ids(self, categories, locations, notice):
+        if "supply" in notice.title.lower():
+            return RelatedIds(categoryIds=[2], locationIds=[1])
+        return RelatedIds(categoryIds=[1], locationIds=[2])
+
+
+def test_aho_corasick_finds_overlapping_keywords():
+    automaton = AhoCorasick()
+    for keyword in ("he", "she", "his", "hers"):
+        automaton.add(keyword, keyword)
+
+    assert list(automaton.iter("ushers")) == [(1, 4, "she"), (2, 4, "he"), (2, 6, "hers")]
+
+
+def test_percolator_matches_buckets_and_whole_token_keywords():
+    percolator = ProfilePercolator([
+        Profile(id=1, category_id=1, location_id=1, tags="Solar Panels,Energy"),
+        Profile(id=2, category_id=1, location_id=1, tags="Python"),
+        Profile(id=3, category_id=2, location_id=1, tags="Solar"),
+    ])
+    notice = solar_notice()
+
+    assert percolator.match(notice, [1], [1]) == [(1, 2.0), (2, 0.0)]
+    assert percolator.match(notice, [1, 2], [1]) == [(1, 2.0), (2, 0.0), (3, 2.0)]
+    assert percolator.match(notice, [3], [1]) == []
+
+
+def test_percolator_applies_the_other_criteria_of_profiles():
+    percolator = ProfilePercolator([
+        Profile(id=1, category_id=1, location_id=1, category_ids="2", tags="Solar", min_volume=100_000),
+        Profile(id=2, category_id=1, location_id=1, tags="Solar", cpv_prefixes="0933", published_before=date(2024, 12, 31)),
+        Profile(id=3, category_id=1, location_id=1, tags="Solar", cpv_prefixes="45", submission_after=date(2025, 1, 1)),
+    ])
+
+    assert percolator.match(solar_notice(), [2], [1]) == [(1, 2.0)]
+    assert percolator.match(solar_notice(), [1], [1]) == [(1, 2.0), (2, 2.0)]
+    assert percolator.match(solar_notice(volume=99_999), [1], [1]) == [(2, 2.0)]
+    assert percolator.match(solar_notice(publication_deadline=datetime(2025, 1, 1)), [1], [1]) == [(1, 2.0)]
+
+
+def solar_notice(**update) -> NoticeModel:
+    return NoticeModel(
+        title="Solar panels and solar-energy storage",
+        description="no photovoltaics",
+        location="Munich, Germany",
+        buyer="City of Munich",
+        volume=100_000,
+        cpv_codes=["09331200-0"],
+        publication_deadline=datetime(2024, 11, 1),
+        submission_deadline=datetime(2024, 12, 1),
+    ).model_copy(update=update)
+
+
+def test_ingest_fills_profile_inbox(client: TestClient, session: Session):
+    session.exec(text("INSERT INTO category (id, name) VALUES (1, 'Construction')"))
+    session.exec(text("INSERT INTO category (id, name) VALUES (2, 'Solar Panels')"))
+    session.exec(text("INSERT INTO location (id, city, country) VALUES (1, 'Munich', 'Germany')"))
+    session.exec(text("INSERT INTO location (id, city, country) VALUES (2, 'Dublin', 'Ireland')"))
+    session.exec(text("INSERT INTO profile (id, category_id, location_id, tags) VALUES (1, 2, 1, 'photovoltaic')"))
+    session.exec(text("INSERT INTO profile (id, category_id, location_id, tags) VALUES (2, 3, 3, 'anything')"))
+
+    notices = load_notices()[:10]
+    DataProcessorService(
+        SupplyOrOtherAnalyzer(session), batch_size=4, listeners=[PercolatorListener()]
+    ).process(notices)
+
+    supply_titles = [notice.title for notice in notices if "supply" in notice.title.lower()]
+    assert len(supply_titles) > 1
+    response = client.get("profiles/1/inbox", params={"limit": 1, "fields": "title"})
+    assert response.status_code == 200
+    first_page = response.json()
+    assert [notice["title"] for notice in first_page["notices"]] == supply_titles[:1]
+    assert first_page["notices"][0]["match_score"] > 0  # "photovoltaic solar panels"
+
+    response = client.get("profiles/1/inbox", params={"cursor": first_page["next_cursor"]})
+    assert [notice["title"] for notice in response.json()["notices"]] == supply_titles[1:]
+
+    assert client.get("profiles/2/inbox").json()["notices"] == []
+    assert client.get("profiles/3/inbox").status_code == 404
+
+
+def test_percolator_listener_sees_profiles_changed_by_other_processes(session: Session):
+    session.exec(text("INSERT INTO category (id, name) VALUES (1, 'Construction')"))
+    session.exec(text("INSERT INTO category (id, name) VALUES (2, 'Solar Panels')"))
+    session.exec(text("INSERT INTO location (id, city, country) VALUES (1, 'Munich', 'Germany')"))
+    session.exec(text("INSERT INTO location (id, city, country) VALUES (2, 'Dublin', 'Ireland')"))
+    notices = [notice for notice in load_notices() if "supply" in notice.title.lower()][:2]
+    processor = DataProcessorService(SupplyOrOtherAnalyzer(session), listeners=[PercolatorListener()])
+    processor.persist_batch(notices[:1], [RelatedIds(categoryIds=[2], locationIds=[1])])
+
+    # The profile API creates a profile and bumps the profiles version in its transaction.
+    session.add(Profile(id=1, category_id=2, location_id=1, tags="photovoltaic"))
+    bump_version(session, PROFILES_VERSION_ID)
+    session.commit()
+    processor.persist_batch(notices[1:], [RelatedIds(categoryIds=[2], locationIds=[1])])
+
+    assert [(match.profile_id, match.notice_id) for match in session.exec(select(ProfileMatch)).all()] == [(1, 2)]
+
+
+def test_reingested_changed_notice_replaces_its_inbox_entries(session: Session):
+    session.exec(text("INSERT INTO category (id, name) VALUES (1, 'Construction')"))
+    session.exec(text("INSERT INTO location (id, city, country) VALUES (1, 'Munich', 'Germany')"))
+    session.exec(text("INSERT INTO profile (id, category_id, location_id, tags) VALUES (1, 1, 1, 'photovoltaic')"))
+    session.exec(text("INSERT INTO profile (id, category_id, location_id, tags) VALUES (2, 1, 1, 'library')"))
+    notice = load_notices()[0]
+    processor = DataProcessorService(StubAnalyzer(session), listeners=[PercolatorListener()], incremental=True)
+    processor.process([notice])
+    assert len(session.exec(select(ProfileMatch)).all()) == 2
+
+    changed = notice.model_copy(update={"description": "A library with photovoltaic panels and a photovoltaic carport."})
+    processor.process([changed])
+
+    matches = session.exec(select(ProfileMatch.profile_id, ProfileMatch.notice_id, ProfileMatch.match_score)).all()
+    # Scored like the matches API, against a corpus made of the new version alone.
+    expected = [score_relevant_notices(session.get(Profile, profile_id), session) for profile_id in (1, 2)]
+    assert [(profile_id, notice_id) for profile_id, notice_id, _ in sorted(matches)] == [(1, 1), (2, 1)]
+    assert [score for _, _, score in sorted(matches)] == pytest.approx([scores[0][1] for scores in expected])
+    assert expected[0][0][1] > expected[1][0][1] > 0
@@ -1,31 +1,8 @@
-import pytest
 from fastapi.testclient import TestClient
-from sqlmodel import Session, SQLModel, create_engine
-from sqlmodel.pool import StaticPool
+from sqlmodel import Session, select
 
-from tendara_ai_challenge.matching.entity import Profile, get_session
-from tendara_ai_challenge.profile.app import app
-
-
-@pytest.fixture(name="session")
-def session_fixture():
-    engine = create_engine(
-        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
-    )
-    SQLModel.metadata.create_all(engine)
-    with Session(engine) as session:
-        yield session
-
-
-@pytest.fixture(name="client")
-def client_fixture(session: Session):
-    def get_session_override():
-        return session
-
-    app.dependency_overrides[get_session] = get_session_override
-    client = TestClient(app)
-    yield client
-    app.dependency_overrides.clear()
+from tendara_ai_challenge.matching.entity import DigestMatch, Profile, ProfileMatch
+from tendara_ai_challenge.matching.versions import PROFILES_VERSION_ID, read_version
 
 
 def test_create_profile_should_return_profile(client: TestClient):
@@ -79,7 +56,72 @@ def test_delete_profile_should_return_200(client: TestClient, session: Session):
     assert profile is None
 
 
+def test_delete_profile_should_delete_its_matches(client: TestClient, session: Session):
+    profile_id = client.post("/profiles", json={"location_id": 1, "category_id": 1, "tags": ["1"]}).json()["id"]
+    session.add(ProfileMatch(profile_id=profile_id, notice_id=1, match_score=1.0))
+    session.add(DigestMatch(profile_id=profile_id, notice_id=1, rank=1, match_score=1.0))
+
+    assert client.delete(f"/profiles/{profile_id}").status_code == 200
+
+    session.expire_all()
+    assert session.exec(select(ProfileMatch)).all() == []
+    assert session.exec(select(DigestMatch)).all() == []
+
+
+def test_profile_changes_bump_the_profiles_version(client: TestClient, session: Session):
+    profile = {"location_id": 1, "category_id": 1, "tags": ["1"]}
+    profile_id = client.post("/profiles", json=profile).json()["id"]
+    client.put(f"/profiles/{profile_id}", json=profile)
+    client.delete(f"/profiles/{profile_id}")
+
+    session.commit()
+    assert read_version(session, PROFILES_VERSION_ID) == 3
+
+
 def test_delete_profile_should_return_404_when_profile_not_found(client: TestClient):
     response = client.delete("/profiles/1")
     assert response.status_code == 404
     assert response.json()["detail"] == "Profile not found"
+
+
+def test_update_profile_should_replace_criteria(client: TestClient):
+    profile = {
+        "location_id": 1,
+        "category_id": 1,
+        "tags": ["1", "2", "3"],
+    }
+    response = client.post("/profiles", json=profile)
+    profile_id = response.json()["id"]
+
+    updated = {**profile, "category_id": 2, "tags": ["Python", "C++"]}
+    response = client.put(f"/profiles/{profile_id}", json=updated)
+    assert response.status_code == 200
+    assert response.json()["category_id"] == 2
+    assert response.json()["tags"] == ["Python", "C++"]
+
+    assert client.get(f"/profiles/{profile_id}").json()["tags"] == ["Python", "C++"]
+    assert client.put("/profiles/999", json=updated).status_code == 404
+
+
+def test_profile_should_store_structured_criteria(client: TestClient):
+    profile = {
+        "location_id": 1,
+        "category_id": 1,
+        "tags": ["software"],
+        "category_ids": [2, 3],
+        "location_ids": [4],
+        "cpv_prefixes": ["722", "48"],
+        "min_volume": 100000,
+        "published_after": "2024-01-01",
+        "submission_before": "2025-06-30",
+    }
+    profile_id = client.post("/profiles", json=profile).json()["id"]
+
+    stored = client.get(f"/profiles/{profile_id}").json()
+    assert stored["category_ids"] == [2, 3]
+    assert stored["location_ids"] == [4]
+    assert stored["cpv_prefixes"] == ["722", "48"]
+    assert stored["min_volume"] == 100000
+    assert stored["max_volume"] is None
+    assert stored["published_after"] == "2024-01-01"
+    assert stored["submission_before"] == "2025-06-30"
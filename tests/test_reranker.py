@@ -0,0 +1,152 @@
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+from tendara_ai_challenge.etl.dto import RelatedIds
+from tendara_ai_challenge.etl.processor import Analyzer, DataProcessorService
+from tendara_ai_challenge.matching.bitmap import NoticeBitmapIndex
+from tendara_ai_challenge.matching.dto import NoticeModel
+from tendara_ai_challenge.matching.entity import Category, Feedback, Location, Notice, Profile, RerankerModel
+from tendara_ai_challenge.matching.reranker import (
+    FEATURES, PRIOR_WEIGHTS, NoticeTextFeatures, Reranker, fit_logistic, load_reranker, probability, train_rerankers
+)
+from tendara_ai_challenge.matching.versions import CORPUS_VERSION_ID, read_version
+
+
+class StubAnalyzer(Analyzer):
+    """Links every notice to the first category and location, without calling an LLM."""
+
+    def fetch_related_ids(self, categories: List[Category], locations: List[Location], notice: NoticeModel) -> Optional[RelatedIds]:
+        return RelatedIds(categoryIds=[categories[0].id], locationIds=[locations[0].id])
+
+
+@pytest.fixture(name="session")
+def session_fixture(session: Session):
+    session.exec(text("INSERT INTO category (id, name) VALUES (1, 'Energy')"))
+    session.exec(text("INSERT INTO location (id, city, country) VALUES (1, 'Munich', 'Germany')"))
+    session.exec(text("INSERT INTO profile (id, category_id, location_id, tags) VALUES (1, 1, 1, 'solar')"))
+    session.commit()
+    return session
+
+
+def store_notices(session: Session):
+    """Stores solar farm notices, which mention the tag thrice, and solar roof notices, which mention it once."""
+    notices = [
+        NoticeModel(
+            title=f"Solar {kind} {number}",
+            description="Solar farm with solar trackers on open land" if kind == "farm" else "Panels on school roofs and gyms",
+            location="Munich, Germany",
+            buyer="City of Munich",
+            volume=100_000,
+            cpv_codes=["09331000-8"],
+            publication_deadline=datetime(2030, 1, 1),
+            submission_deadline=datetime(2030, 3, 1),
+        )
+        for number in range(3) for kind in ("farm", "roof")
+    ]
+    DataProcessorService(StubAnalyzer(session), batch_size=10).process(notices)
+
+
+def match_titles(client: TestClient) -> List[str]:
+    response = client.get("/profiles/1/matches", params={"fields": "title"})
+    assert response.status_code == 200
+    return [notice["title"] for notice in response.json()["notices"]]
+
+
+def test_fit_logistic_keeps_prior_without_feedback_and_learns_with_it():
+    assert np.array_equal(fit_logistic(np.empty((0, len(FEATURES))), np.empty(0)), PRIOR_WEIGHTS)
+
+    rng = np.random.default_rng(0)
+    features = rng.normal(size=(400, 3))
+    labels = features @ np.array([2.0, -3.0, 0.0]) > 0
+    weights = fit_logistic(features, labels, prior=np.zeros(3), l2=0.1)
+
+    assert np.mean((features @ weights > 0) == labels) > 0.97
+    assert weights[0] > 0 > weights[1]
+
+
+def test_feedback_replaces_earlier_rating(client: TestClient, session: Session):
+    store_notices(session)
+
+    assert client.post("/profiles/1/feedback", json={"notice_id": 1, "feedback_rating": 1}).status_code == 200
+    response = client.post("/profiles/1/feedback", json={"notice_id": 1, "feedback_rating": -1, "feedback_text": "Not roofs"})
+
+    assert response.status_code == 200
+    assert response.json() == {"feedback_id": 1, "profile_id": 1, "notice_id": 1, "feedback_rating": -1, "feedback_text": "Not roofs"}
+    assert [(feedback.notice_id, feedback.feedback_rating) for feedback in session.exec(select(Feedback)).all()] == [(1, -1)]
+    assert client.post("/profiles/2/feedback", json={"notice_id": 1, "feedback_rating": 1}).status_code == 404
+    assert client.post("/profiles/1/feedback", json={"notice_id": 99, "feedback_rating": 1}).status_code == 404
+    assert client.post("/profiles/1/feedback", json={"notice_id": 1, "feedback_rating": 0}).status_code == 422
+
+
+def test_trained_reranker_promotes_liked_notices(client: TestClient, session: Session):
+    store_notices(session)
+    assert [title.split()[1] for title in match_titles(client)] == ["farm"] * 3 + ["roof"] * 3
+
+    # Rate one notice of each kind, so the other notices are ranked from what the model learned.
+    for notice_id, rating in ((1, -1), (2, 1)):
+        client.post("/profiles/1/feedback", json={"notice_id": notice_id, "feedback_rating": rating})
+    session.commit()
+    version = read_version(session, CORPUS_VERSION_ID)
+    stats = train_rerankers(session, min_feedback=2)
+
+    assert (stats.profiles, stats.feedback) == (1, 2)
+    assert read_version(session, CORPUS_VERSION_ID) == version + 1  # Invalidates the rankings of every API process.
+    assert len(np.frombuffer(session.get(RerankerModel, 1).weights)) == len(FEATURES)
+    assert [title.split()[1] for title in match_titles(client)] == ["roof"] * 3 + ["farm"] * 3
+    scores = [notice["match_score"] for notice in client.get("/profiles/1/matches").json()["notices"]]
+    assert all(0 < score < 1 for score in scores)
+
+
+def test_reranker_scores_notices_stored_after_its_refresh(session: Session):
+    store_notices(session)
+    bitmaps, text_features = NoticeBitmapIndex(), NoticeTextFeatures()
+    bitmaps.refresh(session)
+    text_features.refresh(session)
+    reranker = Reranker(session.get(Profile, 1), PRIOR_WEIGHTS, bitmaps, text_features)
+
+    scores = reranker.score(np.array([1, 2, 1000], dtype=np.int64), np.array([2.0, 1.0, 3.0]), np.array([1, 1, 1]))
+
+    assert scores[2] > scores[0] > scores[1]
+    assert text_features.count == 6
+    assert np.allclose(np.linalg.norm(text_features.rows(np.array([1, 6])), axis=1), 1.0)
+
+
+def test_reranker_ranks_by_unsaturated_log_odds(session: Session):
+    store_notices(session)
+    bitmaps, text_features = NoticeBitmapIndex(), NoticeTextFeatures()
+    bitmaps.refresh(session)
+    text_features.refresh(session)
+    reranker = Reranker(session.get(Profile, 1), PRIOR_WEIGHTS * 50, bitmaps, text_features)
+
+    scores = reranker.score(np.array([1, 2], dtype=np.int64), np.array([2.0, 1.0]), np.array([1, 1]))
+
+    assert scores[0] > scores[1]
+    assert np.array_equal(probability(scores), [1.0, 1.0])
+    assert load_reranker(session, Profile(category_id=1, location_id=1, tags="solar")) is None
+
+
+def test_text_features_refresh_notices_updated_in_place(session: Session):
+    store_notices(session)
+    text_features = NoticeTextFeatures()
+    text_features.refresh(session)
+    published = text_features.current
+    before = text_features.rows(np.array([1])).copy()
+
+    notice = session.get(Notice, 1)
+    DataProcessorService(StubAnalyzer(session), incremental=True).process([NoticeModel(
+        title="Wind park", description="Turbines on open land", location="Munich, Germany", buyer=notice.buyer,
+        volume=100_000, cpv_codes=["09331000-8"], publication_deadline=datetime(2030, 1, 1),
+        submission_deadline=datetime(2030, 3, 1), external_id=notice.external_id,
+    )])
+
+    assert text_features.refresh(session) == 1
+    assert text_features.count == 6
+    assert not np.array_equal(text_features.rows(np.array([1])), before)
+    # Readers of the state published before the refresh keep seeing it unchanged.
+    assert np.array_equal(published.rows(np.array([1])), before)
@@ -0,0 +1,183 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.pool import StaticPool
+
+from tendara_ai_challenge.etl.dto import RelatedIds
+from tendara_ai_challenge.etl.listeners import VectorIndexListener
+from tendara_ai_challenge.etl.processor import Analyzer, DataProcessorService
+from tendara_ai_challenge.matching.app import app, get_vector_index
+from tendara_ai_challenge.matching.embedding import HashingEmbedder
+from tendara_ai_challenge.matching.entity import Profile, get_session
+from tendara_ai_challenge.matching.matching import rank_semantic_notices
+from tendara_ai_challenge.matching.utils import load_notices
+from tendara_ai_challenge.matching.vector_index import VectorIndex
+
+
+class FirstCategoryAnalyzer(Analyzer):
+    def fetch_related_ids(self, categories, locations, notice):
+        return RelatedIds(categoryIds=[1], locationIds=[1])
+
+
+@pytest.fixture(name="session")
+def session_fixture():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+
+def random_unit_vectors(count: int, dimension: int, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_hashing_embedder_is_deterministic_and_normalized():
+    embedder = HashingEmbedder(dimension=64)
+
+    vectors = embedder.embed(["Citizen-facing chatbots", "citizen facing chatbot", ""])
+
+    assert vectors.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vectors[:2], axis=1), 1.0)
+    assert np.array_equal(vectors, embedder.embed(["Citizen-facing chatbots", "citizen facing chatbot", ""]))
+    assert vectors[0] @ vectors[1] > 0.5
+    assert not vectors[2].any()
+
+
+def test_vector_index_search_is_exact_and_persistent(tmp_path):
+    vectors = random_unit_vectors(1000, 32)
+    index = VectorIndex(str(tmp_path), 32, chunk_size=128)
+    index.add(np.arange(1, 501), vectors[:500])
+    index.add(np.arange(501, 1001), vectors[500:])
+
+    reopened = VectorIndex(str(tmp_path), 32)
+    results = reopened.search(vectors[[10, 900]], k=3)
+
+    assert [result[0][0] for result in results] == [11, 901]
+    assert results[0][0][1] == pytest.approx(1.0)
+    expected = np.argsort(-(vectors @ vectors[10]))[:3] + 1
+    assert [notice_id for notice_id, _ in results[0]] == list(expected)
+
+    restricted = reopened.search(vectors[10], k=2, candidate_ids=np.array([5, 6]))
+    assert {notice_id for notice_id, _ in restricted[0]} == {5, 6}
+
+
+def test_vector_index_partitions_probe_the_closest_clusters(tmp_path):
+    vectors = random_unit_vectors(2000, 16, seed=1)
+    index = VectorIndex(str(tmp_path), 16)
+    index.add(np.arange(1500), vectors[:1500])
+    index.build_partitions(n_lists=8, iterations=5)
+    index.add(np.arange(1500, 2000), vectors[1500:])
+
+    exact = index.search(vectors[1700], k=5)[0]
+    probed_everything = index.search(vectors[1700], k=5, n_probe=8)[0]
+    probed_one = index.search(vectors[1700], k=5, n_probe=1)[0]
+
+    assert probed_everything == exact
+    assert probed_one[0][0] == 1700
+
+
+def test_vector_index_ignores_and_overwrites_a_torn_batch(tmp_path):
+    vectors = random_unit_vectors(30, 8, seed=2)
+    index = VectorIndex(str(tmp_path), 8)
+    index.add(np.arange(1, 11), vectors[:10])
+
+    # A crash after writing the vectors of a batch, but before its ids and count.
+    with open(tmp_path / "vectors.f32", "ab") as f:
+        f.write(vectors[10:20].tobytes())
+    assert len(VectorIndex(str(tmp_path), 8)) == 10
+
+    index.add(np.arange(21, 31), vectors[20:])
+    assert len(index) == 20
+    assert np.array_equal(index.ids, np.r_[1:11, 21:31])
+    assert index.search(vectors[25], k=1)[0][0][0] == 26
+
+
+def test_vector_index_with_fewer_vectors_than_lists_gets_one_per_vector(tmp_path):
+    index = VectorIndex(str(tmp_path), 8)
+    index.build_partitions(n_lists=4)
+    assert index.centroids is None
+
+    index.add(np.arange(1, 4), random_unit_vectors(3, 8, seed=3))
+    index.build_partitions(n_lists=4)
+
+    assert index.centroids.shape == (3, 8)
+    assert index.centroids is index.centroids
+    assert [result[0][0] for result in index.search(index.vectors, k=1, n_probe=1)] == [1, 2, 3]
+
+
+def test_semantic_matching_uses_vectors_built_at_ingest(tmp_path, session: Session):
+    session.exec(text("INSERT INTO category (id, name) VALUES (1, 'IT')"))
+    session.exec(text("INSERT INTO location (id, city, country) VALUES (1, 'Berlin', 'Germany')"))
+    embedder = HashingEmbedder()
+    index = VectorIndex(str(tmp_path), embedder.dimension)
+    notices = load_notices()[:20]
+
+    DataProcessorService(
+        FirstCategoryAnalyzer(session), batch_size=8, listeners=[VectorIndexListener(index, embedder)]
+    ).process(notices)
+    assert len(index) == 20
+
+    profile = Profile(category_id=1, location_id=1, tags=notices[4].title)
+    results = rank_semantic_notices(profile, session, index, embedder, limit=3)
+
+    assert results[0][0] == 5
+    assert rank_semantic_notices(Profile(category_id=2, location_id=1, tags="IT"), session, index, embedder) == []
+
+
+def test_reingested_changed_notice_overwrites_its_vector(tmp_path, session: Session):
+    session.exec(text("INSERT INTO category (id, name) VALUES (1, 'IT')"))
+    session.exec(text("INSERT INTO location (id, city, country) VALUES (1, 'Berlin', 'Germany')"))
+    embedder = HashingEmbedder()
+    index = VectorIndex(str(tmp_path), embedder.dimension)
+    index.add(np.arange(100, 120), random_unit_vectors(20, embedder.dimension))
+    index.build_partitions(n_lists=4)
+    notices = load_notices()[:3]
+    processor = DataProcessorService(
+        FirstCategoryAnalyzer(session), batch_size=3, listeners=[VectorIndexListener(index, embedder)], incremental=True
+    )
+    processor.process(notices)
+
+    changed = notices[1].model_copy(update={"description": "Citizen-facing chatbot for the city portal."})
+    processor.process([notices[0], changed])
+
+    assert len(index) == 23
+    assert sorted(index.ids[20:].tolist()) == [1, 2, 3]
+    query = embedder.embed([f"{changed.title} {changed.description}"])
+    assert index.search(query, k=1, n_probe=1)[0][0] == (2, pytest.approx(1.0))
+
+
+def test_semantic_matches_endpoint_ranks_by_similarity(tmp_path, session: Session):
+    session.exec(text("INSERT INTO category (id, name) VALUES (1, 'IT')"))
+    session.exec(text("INSERT INTO location (id, city, country) VALUES (1, 'Berlin', 'Germany')"))
+    embedder = HashingEmbedder()
+    index = VectorIndex(str(tmp_path), embedder.dimension)
+    notices = load_notices()[:20]
+    DataProcessorService(
+        FirstCategoryAnalyzer(session), batch_size=8, listeners=[VectorIndexListener(index, embedder)]
+    ).process(notices)
+    session.add(Profile(id=1, category_id=1, location_id=1, tags=notices[4].title))
+    session.commit()
+
+    app.dependency_overrides[get_session] = lambda: session
+    app.dependency_overrides[get_vector_index] = lambda: None
+    try:
+        client = TestClient(app)
+        assert client.get("/profiles/1/semantic-matches").status_code == 503
+
+        app.dependency_overrides[get_vector_index] = lambda: index
+        response = client.get("/profiles/1/semantic-matches", params={"limit": 3, "fields": "title"})
+        assert client.get("/profiles/2/semantic-matches").status_code == 404
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    matches = response.json()["notices"]
+    assert len(matches) == 3
+    assert matches[0]["id"] == 5
+    assert matches[0]["title"] == notices[4].title
+    assert matches[0]["match_score"] >= matches[1]["match_score"]